@@ -1,19 +1,39 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from typing import List
 import os
 import shutil
 from pathlib import Path
 import uuid
+import json
+import logging
+import re
+import time
 
-from services.orf_prediction import predict_orfs
-from services.ml_prediction import predict_vf_ml
-from services.blast_service import run_blast_vfdb
-from services.signalp_service import predict_signal_peptide
-from services.scoring import calculate_vf_score, classify_vf
+from Bio.Seq import Seq
+
+from services.orf_prediction import orf_result, predict_orf_table, stream_orfs_ndjson
+from services.orf_parallel import predict_orf_table_parallel, shutdown_pool
+from services.ml_prediction import load_model
+from services.vf_pipeline import score_orf_columns, score_records
+from services.job_queue import submit_job, get_job, get_job_results, cancel_job
+from services.genome_pipeline import submit_pipeline, get_sequences, ensure_store
+from services.result_store import query_orfs, run_stats, InvalidQuery
+from services.result_cache import entry_dir, evict_uploads
+from services.genome_store import STORE_SUFFIX, open_store, pack_fasta
+from services.genome_ingest import GenomeIngest, multipart_files, save_upload
+from services.fasta_stream import genome_filename
+from services.serialization import encoded_response
+from services import metrics
 from services.alignment_service import run_alignment
+from services.remote_client import close_session
+from services.pairwise_identity import fasta_identity_matrix
 
 app = FastAPI(title="VF Detector API", version="1.0.0")
+logger = logging.getLogger(__name__)
 
 # CORS middleware
 app.add_middleware(
@@ -29,30 +49,309 @@ UPLOAD_DIR = Path("temp/uploads")
 RESULTS_DIR = Path("temp/results")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+MAX_REGION_LENGTH = 1_000_000
+# Sequences per /api/identity_matrix request (the work grows with the square)
+MAX_IDENTITY_SEQUENCES = 2000
+
+class PipelineRequest(BaseModel):
+    """Body of /api/pipeline"""
+    file_id: str
+    min_length: int = Field(100, ge=1)
+    parallel: bool = True
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Count and time requests; ?timing=1 or an X-Timing header adds a Server-Timing breakdown"""
+    timings = metrics.start_request_timing()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    
+    route = request.scope.get('route')
+    path = route.path if route is not None else 'unmatched'
+    metrics.observe('http_request_seconds', elapsed, method=request.method, route=path)
+    metrics.inc('http_requests_total', method=request.method, route=path, status=response.status_code)
+    
+    if request.query_params.get('timing') or request.headers.get('x-timing'):
+        timings['total'] = elapsed
+        response.headers['Server-Timing'] = metrics.server_timing_header(timings)
+    return response
+
+@app.on_event("startup")
+def load_ml_model():
+    # Deserialize the Random Forest once instead of per request
+    try:
+        load_model()
+    except Exception as e:
+        # Counted in model_load_failures_total; predictions fall back to the heuristic
+        logger.warning("ML model failed to load: %s", e)
+
+@app.on_event("shutdown")
+def shutdown_workers():
+    shutdown_pool()
+
+@app.on_event("shutdown")
+async def close_remote_client():
+    await close_session()
 
 @app.get("/")
 def read_root():
     return {"message": "VF Detector API is running", "version": "1.0.0"}
 
+@app.get("/metrics")
+def prometheus_metrics():
+    """Stage timers and counters in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def find_upload(file_id):
+    """Path of a genome saved by /api/upload_genome (marking it as recently used), or None"""
+    if not re.fullmatch(r"[0-9a-f]{64}", file_id or ""):
+        return None
+    path = next(UPLOAD_DIR.glob(f"{file_id}_*"), None)
+    if path is not None:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+    return path
+
+def ensure_genome_store(file_id):
+    """
+    Path of the .2bit store of an uploaded genome, converting the FASTA on first use.
+    
+    None when the upload does not exist or holds ambiguity codes other than N
+    (those genomes are read from the FASTA instead). A failed conversion is
+    recorded next to the upload, so the FASTA is not parsed again per request.
+    """
+    fasta_path = find_upload(file_id)
+    if fasta_path is None:
+        return None
+    
+    store_path = UPLOAD_DIR / f"{file_id}{STORE_SUFFIX}"
+    if store_path.exists():
+        return store_path
+    if store_failure_path(file_id).exists():
+        return None
+    try:
+        pack_fasta(fasta_path, store_path)
+    except ValueError as e:
+        store_failure_path(file_id).write_text(str(e))
+        metrics.inc('genome_store_failures_total')
+        return None
+    return store_path
+
+def store_failure_path(file_id):
+    """Marker holding the reason an upload could not be packed into a 2-bit store"""
+    return UPLOAD_DIR / f"{file_id}{STORE_SUFFIX}.failed"
+
+def new_ingest(**kwargs):
+    return GenomeIngest(UPLOAD_DIR / f"upload_{uuid.uuid4()}.part", **kwargs)
+
+def store_upload(ingest, filename):
+    """Save a finished upload under its file ID and pack its 2-bit store; returns the file ID"""
+    file_id = save_upload(ingest, UPLOAD_DIR, filename)
+    ensure_genome_store(file_id)
+    # Uploads are content-addressed like the cached runs and age out the same way
+    evict_uploads(UPLOAD_DIR, keep=file_id)
+    return file_id
+
+def upload_filename(filename):
+    """Stored FASTA name of an upload (400 unless it is .fasta/.fa/.fna, optionally .gz/.bgz)"""
+    stored_name = genome_filename(filename)
+    if stored_name is None:
+        raise HTTPException(status_code=400, detail=f"Invalid file format: {filename}. Please upload a FASTA file (optionally gzipped).")
+    return stored_name
+
 @app.post("/api/upload_genome")
-async def upload_genome(file: UploadFile = File(...)):
-    """Upload genome FASTA file"""
-    if not file.filename.endswith(('.fasta', '.fa', '.fna')):
-        raise HTTPException(status_code=400, detail="Invalid file format. Please upload a FASTA file.")
+async def upload_genome(request: Request):
+    """Upload genome FASTA file (plain, gzip or bgzip)"""
+    # The multipart body is read as it arrives (not spooled first by
+    # UploadFile), so decompressing, hashing and parsing overlap the upload.
+    # The file ID is the SHA-256 of the FASTA, so uploading the same genome
+    # again (plain or compressed) reuses the stored file and results
+    uploaded = None
+    async for filename, ingest, file_id in stream_uploads(request, max_files=1):
+        uploaded = {"message": "File uploaded successfully", "file_id": file_id, "filename": filename}
     
-    # Generate unique file ID
-    file_id = str(uuid.uuid4())
-    file_path = UPLOAD_DIR / f"{file_id}_{file.filename}"
+    if uploaded is None:
+        raise HTTPException(status_code=400, detail="No file uploaded")
+    return uploaded
+
+async def stream_uploads(request, max_files=None, **ingest_options):
+    """
+    Process the genome files of a multipart request while they stream in.
     
-    # Save uploaded file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    Yields (filename, ingest, file_id) as each file completes; the ingest is
+    already saved under its file ID. A request with more than max_files
+    files is rejected (400) as soon as the next one starts.
+    """
+    ingest = None
+    num_files = 0
+    try:
+        async for event, value in multipart_files(request):
+            if event == 'start':
+                num_files += 1
+                if max_files is not None and num_files > max_files:
+                    raise HTTPException(status_code=400, detail=f"At most {max_files} file(s) per request")
+                stored_name = upload_filename(value)
+                ingest = new_ingest(**ingest_options)
+            elif event == 'data':
+                await run_in_threadpool(ingest.feed, value)
+            else:
+                finished, ingest = ingest, None
+                try:
+                    file_id = await run_in_threadpool(store_upload, finished, stored_name)
+                except Exception:
+                    # e.g. "No FASTA records found": drop the part file too
+                    finished.abort()
+                    raise
+                yield value, finished, file_id
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        if ingest is not None:
+            ingest.abort()
+
+@app.post("/api/upload_genomes")
+async def upload_genomes(request: Request):
+    """Upload several genome FASTA files (plain, gzip or bgzip) in one multipart request"""
+    uploaded = []
+    async for filename, ingest, file_id in stream_uploads(request):
+        uploaded.append({"file_id": file_id, "filename": filename, "num_contigs": ingest.num_contigs})
+    
+    if not uploaded:
+        raise HTTPException(status_code=400, detail="No files uploaded")
+    return {"message": f"{len(uploaded)} files uploaded successfully", "files": uploaded}
+
+@app.post("/api/pipeline/stream", status_code=202)
+async def stream_genome_pipeline(request: Request, min_length: int = 100):
+    """
+    Upload a genome and run the pipeline on it in one request.
+    
+    ORFs are called on each contig as soon as it has arrived, so ORF
+    prediction overlaps the upload; scoring starts when the upload ends.
+    """
+    upload = None
+    async for filename, ingest, file_id in stream_uploads(request, max_files=1, min_length=min_length,
+                                                          call_orfs=True):
+        upload = (ingest, file_id)
+    
+    if upload is None:
+        raise HTTPException(status_code=400, detail="No file uploaded")
+    ingest, file_id = upload
+    
+    genome_path = await run_in_threadpool(ensure_genome_store, file_id) or find_upload(file_id)
+    orf_table = await run_in_threadpool(ingest.orf_table, find_upload(file_id))
+    run_id, cached = await run_in_threadpool(submit_pipeline, genome_path, file_id, min_length, True, orf_table)
+    job = get_job(run_id)
+    return {'file_id': file_id, 'job_id': run_id, 'run_id': run_id, 'status': job['status'], 'cached': cached}
+
+@app.post("/api/pipeline", status_code=202)
+async def run_genome_pipeline(data: PipelineRequest):
+    """Run ORF prediction and VF scoring on an uploaded genome as a background job"""
+    file_id = data.file_id
+    genome_path = await run_in_threadpool(ensure_genome_store, file_id) or find_upload(file_id)
+    
+    if genome_path is None:
+        raise HTTPException(status_code=404, detail="Uploaded genome not found")
+    
+    # Runs are cached by genome hash (the file ID), versions and parameters
+    run_id, cached = await run_in_threadpool(
+        submit_pipeline, genome_path, file_id, data.min_length, data.parallel)
+    job = get_job(run_id)
+    return {'job_id': run_id, 'run_id': run_id, 'status': job['status'], 'cached': cached}
+
+def genome_store_or_404(file_id):
+    if find_upload(file_id) is None:
+        raise HTTPException(status_code=404, detail="Uploaded genome not found")
+    store_path = ensure_genome_store(file_id)
+    if store_path is None:
+        failure_path = store_failure_path(file_id)
+        reason = failure_path.read_text() if failure_path.exists() else "conversion failed"
+        raise HTTPException(status_code=409, detail=f"Genome has no 2-bit store: {reason}")
+    return open_store(str(store_path))
+
+@app.get("/api/genome/{file_id}/contigs")
+def genome_contigs(file_id: str):
+    """Contig names and lengths of an uploaded genome"""
+    lengths = genome_store_or_404(file_id).lengths
+    return {
+        'file_id': file_id,
+        'contigs': [{'id': name, 'length': length} for name, length in lengths.items()],
+        'total_length': sum(lengths.values())
+    }
+
+@app.get("/api/genome/{file_id}/region")
+def genome_region(file_id: str, contig: str, start: int = 0, end: int = None, strand: int = 1):
+    """DNA of a contig region (0-based, end-exclusive, forward-strand coordinates)"""
+    store = genome_store_or_404(file_id)
+    if contig not in store:
+        raise HTTPException(status_code=404, detail=f"Contig {contig} not found")
+    
+    length = store.lengths[contig]
+    end = length if end is None else end
+    if not 0 <= start <= end <= length or strand not in (1, -1):
+        raise HTTPException(status_code=400, detail=f"Invalid region for contig of length {length}")
+    if end - start > MAX_REGION_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Regions are limited to {MAX_REGION_LENGTH} bp")
+    
+    sequence = store.sequence(contig, start, end)
+    if strand == -1:
+        sequence = str(Seq(sequence).reverse_complement())
+    return {'contig': contig, 'start': start, 'end': end, 'strand': strand, 'sequence': sequence}
+
+def finished_run_dir(run_id):
+    """Cache directory of a finished pipeline run (404/409 otherwise)"""
+    if not re.fullmatch(r"[0-9a-f]{64}", run_id):
+        raise HTTPException(status_code=404, detail="Run not found")
+    
+    job = get_job(run_id)
+    if job is not None and job['status'] in ('queued', 'running'):
+        raise HTTPException(status_code=409, detail=f"Run is {job['status']}")
+    
+    run_dir = entry_dir(run_id)
+    ensure_store(run_dir)
+    return run_dir
+
+@app.get("/api/pipeline/{run_id}/orfs")
+def pipeline_orfs(run_id: str, request: Request, sort: str = "vf_score", order: str = "desc",
+                  classification: str = None, min_score: int = None, max_score: int = None,
+                  contig: str = None, min_length: int = None, max_length: int = None,
+                  limit: int = 50, cursor: str = None):
+    """One page of a run's scored ORFs, sorted and filtered on the server (cursor pagination)"""
+    try:
+        page = query_orfs(finished_run_dir(run_id), sort, order, limit, cursor,
+                          classification=classification, min_score=min_score, max_score=max_score,
+                          contig=contig, min_length=min_length, max_length=max_length)
+    except InvalidQuery as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return {"message": "File uploaded successfully", "file_id": file_id, "filename": file.filename}
+    if page is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return encoded_response(page, request.headers)
+
+@app.get("/api/pipeline/{run_id}/stats")
+def pipeline_stats(run_id: str):
+    """ORF counts per classification for a finished run"""
+    stats = run_stats(finished_run_dir(run_id))
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return stats
+
+@app.get("/api/pipeline/{run_id}/sequences")
+def pipeline_sequences(run_id: str, ids: str):
+    """Protein sequences of scored ORFs, fetched on demand (ids is comma-separated)"""
+    if not re.fullmatch(r"[0-9a-f]{64}", run_id):
+        raise HTTPException(status_code=404, detail="Run not found")
+    
+    sequences = get_sequences(entry_dir(run_id), [orf_id for orf_id in ids.split(',') if orf_id])
+    if sequences is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return {'run_id': run_id, 'sequences': sequences}
 
 @app.post("/api/predict_orfs")
-async def predict_orfs_endpoint(file: UploadFile = File(...)):
-    """Predict ORFs from genome file"""
+async def predict_orfs_endpoint(request: Request, file: UploadFile = File(...), parallel: bool = False):
+    """Predict ORFs from genome file (parallel=true spreads contigs over a process pool)"""
     try:
         # Save temp file
         file_id = str(uuid.uuid4())
@@ -61,19 +360,42 @@ async def predict_orfs_endpoint(file: UploadFile = File(...)):
         with open(file_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
         
-        # Predict ORFs
-        orfs_result = predict_orfs(str(file_path))
+        # Predict ORFs off the event loop, as columns
+        predictor = predict_orf_table_parallel if parallel else predict_orf_table
+        table = await run_in_threadpool(predictor, str(file_path))
         
         # Clean up
         os.remove(file_path)
-        
-        return orfs_result
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"ORF prediction failed: {str(e)}")
+    
+    # JSON, Arrow or MessagePack (optionally compressed) depending on the headers;
+    # ORF dicts are only built here, for the response
+    return await run_in_threadpool(lambda: encoded_response(orf_result(table), request.headers))
+
+@app.post("/api/predict_orfs/stream")
+async def predict_orfs_stream_endpoint(file: UploadFile = File(...), min_length: int = 100):
+    """Stream predicted ORFs as NDJSON, contig by contig, ending with summary stats"""
+    file_id = str(uuid.uuid4())
+    file_path = UPLOAD_DIR / f"{file_id}.fasta"
+    
+    with open(file_path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+    
+    def generate():
+        try:
+            yield from stream_orfs_ndjson(str(file_path), min_length)
+        except Exception as e:
+            # Headers are already sent, so report the failure in-band
+            yield json.dumps({'type': 'error', 'detail': f"ORF prediction failed: {str(e)}"}) + "\n"
+        finally:
+            os.remove(file_path)
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
 
 @app.post("/api/vf_score")
-async def calculate_vf_scores(data: dict):
+async def calculate_vf_scores(data: dict, request: Request):
     """Calculate VF scores for predicted ORFs"""
     try:
         orfs = data.get('orfs', [])
@@ -81,44 +403,56 @@ async def calculate_vf_scores(data: dict):
         if not orfs:
             raise HTTPException(status_code=400, detail="No ORFs provided")
         
-        results = []
-        
-        for orf in orfs:
-            orf_id = orf['orf_id']
-            sequence = orf['sequence']
-            
-            # ML Prediction
-            ml_result = predict_vf_ml(sequence)
-            ml_score = 2 if ml_result['probability'] >= 0.7 else (1 if ml_result['probability'] >= 0.5 else 0)
-            
-            # BLAST (simulated for now - you'll need VFDB setup)
-            blast_result = run_blast_vfdb(sequence)
-            blast_score = blast_result['score']
-            
-            # SignalP
-            signalp_result = predict_signal_peptide(sequence)
-            signalp_score = 1 if signalp_result['has_signal'] else 0
-            
-            # Calculate total VF score
-            vf_score = ml_score + blast_score + signalp_score
-            classification = classify_vf(vf_score)
-            
-            results.append({
-                'orf_id': orf_id,
-                'vf_score': vf_score,
-                'classification': classification,
-                'ml_score': ml_score,
-                'ml_probability': ml_result['probability'],
-                'blast_score': blast_score,
-                'blast_identity': blast_result.get('identity', 0),
-                'signalp_score': signalp_score,
-                'length': len(sequence)
-            })
-        
-        return {'orfs': results, 'total': len(results)}
+        # ML, BLAST and SignalP run as batched stages off the event loop
+        columns = await run_in_threadpool(score_orf_columns, orfs)
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"VF scoring failed: {str(e)}")
+    
+    def respond():
+        results = score_records(columns)
+        return encoded_response({'orfs': results, 'total': len(results)}, request.headers)
+    
+    return await run_in_threadpool(respond)
+
+@app.post("/api/vf_score/jobs", status_code=202)
+async def submit_vf_score_job(data: dict):
+    """Queue VF scoring as a background job and return its id immediately"""
+    orfs = data.get('orfs', [])
+    
+    if not orfs:
+        raise HTTPException(status_code=400, detail="No ORFs provided")
+    
+    job_id = submit_job(orfs)
+    return {'job_id': job_id, 'status': 'queued', 'total': len(orfs)}
+
+@app.get("/api/jobs/{job_id}")
+def job_status(job_id: str):
+    """Job progress: status, current stage and ORFs done/total"""
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/api/jobs/{job_id}/results")
+def job_results(job_id: str, request: Request, offset: int = 0, limit: int = 100):
+    """One page of a finished job's scored ORFs"""
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job['status'] != 'done':
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    page = get_job_results(job_id, max(offset, 0), min(max(limit, 1), 1000))
+    return encoded_response(page, request.headers)
+
+@app.delete("/api/jobs/{job_id}")
+def cancel_vf_score_job(job_id: str):
+    """Cancel a queued or running job"""
+    if not cancel_job(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return get_job(job_id)
 
 @app.post("/api/align")
 async def align_sequences(file1: UploadFile = File(...), file2: UploadFile = File(...), alignment_type: str = "clustalo"):
@@ -149,11 +483,32 @@ async def align_sequences(file1: UploadFile = File(...), file2: UploadFile = Fil
         # Fallback to local alignment if API fails
         try:
             from services.alignment_service import run_alignment as run_local_alignment
-            result = run_local_alignment(str(file1_path), str(file2_path), alignment_type)
+            result = await run_local_alignment(str(file1_path), str(file2_path), alignment_type)
             return result
         except:
             raise HTTPException(status_code=500, detail=f"Alignment failed: {str(e)}")
 
+@app.post("/api/identity_matrix")
+async def identity_matrix_endpoint(files: List[UploadFile] = File(...)):
+    """Percent identity of every pair of sequences across one or more multi-FASTA files"""
+    paths = []
+    try:
+        for file in files:
+            path = UPLOAD_DIR / f"identity_{uuid.uuid4()}.fasta"
+            paths.append(path)
+            with open(path, "wb") as buffer:
+                shutil.copyfileobj(file.file, buffer)
+        
+        ids, matrix = await run_in_threadpool(fasta_identity_matrix, *paths,
+                                              max_sequences=MAX_IDENTITY_SEQUENCES)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        for path in paths:
+            path.unlink(missing_ok=True)
+    
+    return {'ids': ids, 'matrix': matrix.astype(float).round(2).tolist()}
+
 @app.post("/api/chatbot")
 async def chatbot_response(data: dict):
     """Universal AI chatbot assistant - can answer ANY question"""
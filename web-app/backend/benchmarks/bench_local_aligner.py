@@ -0,0 +1,89 @@
+"""
+Throughput of the NumPy Smith-Waterman fallback against blastp
+
+Both engines search the same fixed ORF set against VFDB; the report gives
+ORFs per second for each and how often they agree on hits and top subjects.
+
+Usage (from web-app/backend):
+    python -m benchmarks.bench_local_aligner [--genome FASTA | --proteins FASTA] [--limit N]
+"""
+
+import argparse
+import json
+import shutil
+import time
+
+from Bio import SeqIO
+
+from services import blast_service, local_aligner, vfdb_prefilter
+from services.orf_prediction import predict_orf_table
+
+
+def load_orfs(genome=None, proteins=None, limit=None):
+    """Fixed benchmark ORF set: proteins from a FASTA, or ORFs called from a genome"""
+    if proteins:
+        sequences = [str(rec.seq) for rec in SeqIO.parse(proteins, 'fasta')]
+    else:
+        sequences = predict_orf_table(genome).sequences()
+    return sequences[:limit] if limit else sequences
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def run(sequences, band=local_aligner.BAND):
+    """Benchmark report for one ORF set"""
+    report = {'num_orfs': len(sequences), 'band': band}
+
+    # Build (or load) the prefilter index outside the timed region
+    _, report['index_load_seconds'] = timed(vfdb_prefilter.load_index)
+
+    local, seconds = timed(local_aligner.search_vfdb, sequences, band)
+    report['local'] = {
+        'seconds': round(seconds, 3),
+        'orfs_per_second': round(len(sequences) / seconds, 2) if seconds else None,
+        'hits': sum(r['has_hit'] for r in local)
+    }
+
+    if shutil.which('blastp'):
+        queries = {f"q{i}": seq for i, seq in enumerate(sequences)}
+        hits, seconds = timed(blast_service._run_blastp, queries, None, None)
+        blast = [hits.get(f"q{i}", blast_service.no_hit_result()) for i in range(len(sequences))]
+        both = [(b, l) for b, l in zip(blast, local) if b['has_hit']]
+        report['blastp'] = {
+            'seconds': round(seconds, 3),
+            'orfs_per_second': round(len(sequences) / seconds, 2) if seconds else None,
+            'hits': len(both)
+        }
+        report['agreement'] = {
+            'hit_recall': round(sum(l['has_hit'] for _, l in both) / len(both), 4) if both else None,
+            'same_top_hit': sum(b['top_hit'] == l['top_hit'] for b, l in both),
+            'same_score': sum(b['score'] == l['score'] for b, l in zip(blast, local))
+        }
+    else:
+        report['blastp'] = None
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local aligner vs blastp throughput")
+    parser.add_argument('--genome', default='sample_genome.fasta')
+    parser.add_argument('--proteins')
+    parser.add_argument('--limit', type=int)
+    parser.add_argument('--band', type=int, default=local_aligner.BAND,
+                        help="Diagonal band of the local aligner (default: %(default)s)")
+    args = parser.parse_args()
+
+    if not blast_service.VFDB_PATH.exists():
+        parser.error(f"VFDB not found at {blast_service.VFDB_PATH}")
+
+    sequences = load_orfs(args.genome, args.proteins, args.limit)
+    print(json.dumps(run(sequences, args.band), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+"""
+Per-stage timings of the ORF and VF scoring pipeline on a synthetic genome
+
+Generates a seeded synthetic genome and VFDB (see benchmarks.synthetic),
+points the BLAST, prefilter and cache modules at a scratch directory, then
+times every stage on its own (best of --repeat runs) and the whole
+/api/vf_score request through FastAPI's TestClient. The JSON report holds
+seconds, items and items per second for each stage plus the parameters,
+commit and package versions of the run.
+
+With --compare BASELINE.json the run is checked against an earlier report:
+stages more than --threshold slower (and at least --min-delta seconds
+slower) are listed and the exit status is 1.
+
+Usage (from web-app/backend):
+    python -m benchmarks.bench_pipeline [--size MB] [--gc GC] [--contigs N] [--seed S]
+        [--vfdb-size N] [--repeat N] [--output FILE] [--compare FILE] [--threshold 0.2]
+"""
+
+import argparse
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from Bio import SeqIO
+
+from benchmarks.synthetic import synthetic_genome, synthetic_vfdb, write_fasta
+from services import blast_cache, blast_service, ml_prediction, vfdb_prefilter
+from services.orf_parallel import predict_orfs_parallel, shutdown_pool
+from services.orf_prediction import find_orfs, predict_orfs
+from services.signalp_service import predict_signal_peptides
+from services.vf_pipeline import combine_scores, score_orfs
+
+REPORT_FORMAT = 1
+
+
+def best_time(func, repeat, setup=None):
+    """Fastest of repeat runs (seconds) and the last result; setup() runs untimed before each"""
+    best = result = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def stage_report(seconds, items):
+    return {
+        'seconds': round(seconds, 6),
+        'items': items,
+        'items_per_second': round(items / seconds, 1) if seconds else None
+    }
+
+
+def use_scratch_vfdb(workdir, vfdb_records):
+    """Write the synthetic VFDB and point the BLAST, prefilter and cache modules at it"""
+    vfdb_path = write_fasta(vfdb_records, workdir / 'vfdb.fas')
+    blast_service.VFDB_PATH = vfdb_path
+    vfdb_prefilter.VFDB_PATH = vfdb_path
+    vfdb_prefilter.INDEX_DIR = workdir / 'prefilter'
+    blast_cache.CACHE_PATH = workdir / 'blast_hits.sqlite'
+    if shutil.which('makeblastdb'):
+        subprocess.run(['makeblastdb', '-in', str(vfdb_path), '-dbtype', 'prot'],
+                       check=True, capture_output=True)
+    return vfdb_path
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def package_versions():
+    import Bio
+    import numpy
+
+    return {'numpy': numpy.__version__, 'biopython': Bio.__version__}
+
+
+def run(args, workdir):
+    """Benchmark report for one synthetic genome"""
+    contigs, proteins = synthetic_genome(int(args.size * 1_000_000), args.gc, args.contigs, args.seed)
+    genome_path = write_fasta(contigs, workdir / 'genome.fasta')
+    use_scratch_vfdb(workdir, synthetic_vfdb(proteins, args.vfdb_size, seed=args.seed))
+    genome_bp = sum(len(sequence) for _, sequence in contigs)
+    records = [rec.seq for rec in SeqIO.parse(str(genome_path), 'fasta')]
+
+    stages = {}
+    repeat = args.repeat
+
+    seconds, _ = best_time(lambda: [find_orfs(seq, args.min_length) for seq in records], repeat)
+    stages['find_orfs'] = stage_report(seconds, genome_bp)
+
+    seconds, orf_result = best_time(lambda: predict_orfs(str(genome_path), args.min_length), repeat)
+    stages['predict_orfs'] = stage_report(seconds, genome_bp)
+
+    seconds, _ = best_time(lambda: predict_orfs_parallel(str(genome_path), args.min_length), repeat)
+    stages['predict_orfs_parallel'] = stage_report(seconds, genome_bp)
+    shutdown_pool()
+
+    orfs = orf_result['orfs']
+    sequences = [orf['sequence'] for orf in orfs]
+    sample = sequences[:args.per_sequence_limit]
+
+    seconds, _ = best_time(lambda: [ml_prediction.calculate_features(seq) for seq in sample], repeat)
+    stages['calculate_features'] = stage_report(seconds, len(sample))
+
+    seconds, _ = best_time(lambda: ml_prediction.batch_features(sequences), repeat)
+    stages['batch_features'] = stage_report(seconds, len(sequences))
+
+    seconds, ml_results = best_time(lambda: ml_prediction.predict_vf_ml_batch(sequences), repeat)
+    stages['predict_vf_ml_batch'] = stage_report(seconds, len(sequences))
+
+    seconds, _ = best_time(vfdb_prefilter.build_index, repeat)
+    stages['prefilter_index'] = stage_report(seconds, args.vfdb_size)
+
+    seconds, _ = best_time(lambda: vfdb_prefilter.prefilter(sequences), repeat)
+    stages['prefilter'] = stage_report(seconds, len(sequences))
+
+    seconds, _ = best_time(lambda: [blast_service.run_blast_vfdb(seq) for seq in sample[:args.blast_single]],
+                           repeat, setup=blast_cache.clear)
+    stages['run_blast_vfdb'] = stage_report(seconds, len(sample[:args.blast_single]))
+
+    seconds, blast_results = best_time(lambda: blast_service.run_blast_vfdb_batch(sequences), repeat,
+                                       setup=blast_cache.clear)
+    stages['run_blast_vfdb_batch'] = stage_report(seconds, len(sequences))
+
+    if shutil.which('blastp'):
+        # Only blastp results go into the BLAST cache
+        seconds, _ = best_time(lambda: blast_service.run_blast_vfdb_batch(sequences), repeat)
+        stages['run_blast_vfdb_batch_cached'] = stage_report(seconds, len(sequences))
+
+    seconds, signalp_results = best_time(lambda: predict_signal_peptides(sequences), repeat)
+    stages['predict_signal_peptides'] = stage_report(seconds, len(sequences))
+
+    seconds, _ = best_time(lambda: combine_scores(orfs, ml_results, blast_results, signalp_results), repeat)
+    stages['combine_scores'] = stage_report(seconds, len(sequences))
+
+    seconds, _ = best_time(lambda: score_orfs(orfs), repeat, setup=blast_cache.clear)
+    stages['score_orfs'] = stage_report(seconds, len(sequences))
+
+    if not args.no_api:
+        from fastapi.testclient import TestClient
+
+        from app import app
+
+        client = TestClient(app)
+
+        def post_vf_score():
+            response = client.post('/api/vf_score', json={'orfs': orfs})
+            response.raise_for_status()
+            return response
+
+        seconds, _ = best_time(post_vf_score, repeat, setup=blast_cache.clear)
+        stages['api_vf_score'] = stage_report(seconds, len(sequences))
+
+    hits = sum(result['has_hit'] for result in blast_results)
+    return {
+        'format': REPORT_FORMAT,
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'packages': package_versions(),
+            'blast_engine': 'blastp' if shutil.which('blastp') else 'local',
+            'model': ml_prediction.model_version(),
+            'params': {
+                'size_mb': args.size, 'gc': args.gc, 'contigs': args.contigs, 'seed': args.seed,
+                'vfdb_size': args.vfdb_size, 'min_length': args.min_length, 'repeat': repeat
+            },
+            'genome_bp': genome_bp,
+            'num_orfs': len(orfs),
+            'vfdb_hits': hits
+        },
+        'stages': stages
+    }
+
+
+def compare(baseline, report, threshold, min_delta):
+    """[(stage, baseline seconds, seconds, ratio)] of stages that got slower than the threshold allows"""
+    regressions = []
+    for stage, current in report['stages'].items():
+        previous = baseline.get('stages', {}).get(stage)
+        if not previous or not previous['seconds']:
+            continue
+        ratio = current['seconds'] / previous['seconds']
+        if ratio > 1 + threshold and current['seconds'] - previous['seconds'] >= min_delta:
+            regressions.append((stage, previous['seconds'], current['seconds'], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipeline stage benchmark on a synthetic genome")
+    parser.add_argument('--size', type=float, default=1.0, help="genome size in Mb")
+    parser.add_argument('--gc', type=float, default=0.5, help="GC fraction")
+    parser.add_argument('--contigs', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--vfdb-size', type=int, default=200, help="synthetic VFDB entries")
+    parser.add_argument('--min-length', type=int, default=100, help="minimum ORF length (bp)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--per-sequence-limit', type=int, default=2000,
+                        help="ORFs used by the one-sequence-at-a-time stages")
+    parser.add_argument('--blast-single', type=int, default=20,
+                        help="ORFs searched one blastp call at a time")
+    parser.add_argument('--no-api', action='store_true', help="skip the TestClient /api/vf_score run")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    parser.add_argument('--compare', help="baseline report to check for regressions")
+    parser.add_argument('--threshold', type=float, default=0.2, help="allowed slowdown (0.2 = 20%%)")
+    parser.add_argument('--min-delta', type=float, default=0.005,
+                        help="ignore slowdowns smaller than this many seconds")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='vf_bench_') as workdir:
+        report = run(args, Path(workdir))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if baseline.get('meta', {}).get('params') != report['meta']['params']:
+            print("warning: baseline was run with different parameters", file=sys.stderr)
+        regressions = compare(baseline, report, args.threshold, args.min_delta)
+        for stage, before, after, ratio in regressions:
+            print(f"REGRESSION {stage}: {before:.4f}s -> {after:.4f}s ({ratio:.2f}x)", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"No stage more than {args.threshold:.0%} slower than {args.compare}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
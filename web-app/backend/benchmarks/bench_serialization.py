@@ -0,0 +1,91 @@
+"""
+Serialization cost of ORF and VF score payloads
+
+Encodes the /api/predict_orfs and /api/vf_score payloads of a reference
+genome in every response format the server can negotiate, and reports
+encode/decode time and body size for each. "fastapi_json" is the default
+path before content negotiation (jsonable_encoder + JSONResponse).
+
+Usage (from web-app/backend):
+    python -m benchmarks.bench_serialization [--genome FASTA] [--repeat N] [--no-scores]
+"""
+
+import argparse
+import gzip
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from services import serialization
+from services.orf_prediction import predict_orfs
+from services.vf_pipeline import score_orfs
+
+
+def best_time(func, repeat):
+    """Fastest of repeat runs (seconds) and the last result"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def formats():
+    """(name, encode, decode) for every available format"""
+    json_decode = json.loads
+    entries = [
+        ('fastapi_json', lambda p: JSONResponse(jsonable_encoder(p)).body, json_decode),
+        ('json', serialization.encode_json, json_decode),
+        ('json+gzip', lambda p: serialization.compress(serialization.encode_json(p), 'gzip'),
+         lambda b: json.loads(gzip.decompress(b)))
+    ]
+    available = serialization.available_encodings()
+    media_types = serialization.available_media_types()
+    if 'zstd' in available:
+        import zstandard
+
+        entries.append(('json+zstd', lambda p: serialization.compress(serialization.encode_json(p), 'zstd'),
+                        lambda b: json.loads(zstandard.ZstdDecompressor().decompress(b))))
+    if serialization.MSGPACK in media_types:
+        import msgpack
+
+        entries.append(('msgpack', serialization.encode_msgpack, msgpack.unpackb))
+    if serialization.ARROW_STREAM in media_types:
+        entries.append(('arrow', serialization.encode_arrow, serialization.decode_arrow))
+    return entries
+
+
+def bench_payload(payload, repeat):
+    report = {'rows': len(payload['orfs'])}
+    for name, encode, decode in formats():
+        encode_seconds, body = best_time(lambda: encode(payload), repeat)
+        decode_seconds, _ = best_time(lambda: decode(body), repeat)
+        report[name] = {
+            'bytes': len(body),
+            'encode_ms': round(encode_seconds * 1000, 2),
+            'decode_ms': round(decode_seconds * 1000, 2)
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Response serialization benchmark")
+    parser.add_argument('--genome', default='sample_genome.fasta')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--no-scores', action='store_true', help="skip the /api/vf_score payload")
+    args = parser.parse_args()
+
+    orf_payload = predict_orfs(args.genome)
+    report = {'genome': args.genome, 'predict_orfs': bench_payload(orf_payload, args.repeat)}
+    if not args.no_scores:
+        scores = score_orfs(orf_payload['orfs'])
+        report['vf_score'] = bench_payload({'orfs': scores, 'total': len(scores)}, args.repeat)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Local stand-in for the EBI and NCBI alignment job services
+
+Emulates the job protocol services.alignment_service_api speaks, so the
+remote client can be exercised without network access or rate limits:
+
+    EBI   POST {base}/ebi/{tool}/run               -> job id
+          GET  {base}/ebi/{tool}/status/{job}      -> RUNNING | FINISHED | NOT_FOUND
+          GET  {base}/ebi/{tool}/result/{job}/aln-clustal_num
+    NCBI  POST {base}/ncbi/Blast.cgi  CMD=Put      -> page with "RID = ..."
+          GET  {base}/ncbi/Blast.cgi  CMD=Get&RID  -> "Status=WAITING" or XML
+
+Jobs finish --delay seconds after submission. GET /stats returns the
+number of submissions and polls received, to check deduplication and
+backoff. Alignments are not computed: the submitted sequences are padded
+to a common length.
+
+Usage (from web-app/backend):
+    python -m benchmarks.mock_remote_services [--port 8765] [--delay 2]
+    EBI_BASE_URL=http://127.0.0.1:8765/ebi NCBI_BLAST_URL=http://127.0.0.1:8765/ncbi/Blast.cgi \\
+        uvicorn app:app
+"""
+
+import argparse
+import itertools
+import time
+
+from aiohttp import web
+
+
+def clustal_text(fasta_text):
+    """CLUSTAL-format text of the submitted sequences, padded with gaps to one length"""
+    records = []
+    for block in fasta_text.split('>')[1:]:
+        header, _, sequence = block.partition('\n')
+        records.append((header.split()[0] if header.split() else 'seq', sequence.replace('\n', '').strip()))
+    width = max((len(sequence) for _, sequence in records), default=0)
+    lines = ['CLUSTAL O(1.2.4) multiple sequence alignment (mock)', '']
+    lines += [f"{name:<16}{sequence.ljust(width, '-')}" for name, sequence in records]
+    return '\n'.join(lines) + '\n'
+
+
+def make_app(delay=2.0):
+    """aiohttp application emulating both services; jobs finish after delay seconds"""
+    jobs = {}
+    stats = {'ebi_submissions': 0, 'ebi_polls': 0, 'ncbi_submissions': 0, 'ncbi_polls': 0}
+    job_ids = itertools.count(1)
+
+    def finished(job):
+        return time.monotonic() - job['submitted'] >= delay
+
+    async def ebi_run(request):
+        form = await request.post()
+        if not form.get('email') or not form.get('sequence'):
+            return web.Response(status=400, text="email and sequence are required")
+        job_id = f"{request.match_info['tool']}-R{next(job_ids):06d}-p1m"
+        jobs[job_id] = {'submitted': time.monotonic(), 'sequence': form['sequence']}
+        stats['ebi_submissions'] += 1
+        return web.Response(text=job_id)
+
+    async def ebi_status(request):
+        stats['ebi_polls'] += 1
+        job = jobs.get(request.match_info['job'])
+        if job is None:
+            return web.Response(text='NOT_FOUND')
+        return web.Response(text='FINISHED' if finished(job) else 'RUNNING')
+
+    async def ebi_result(request):
+        job = jobs.get(request.match_info['job'])
+        if job is None or not finished(job):
+            return web.Response(status=400, text="Job not finished")
+        return web.Response(text=clustal_text(job['sequence']))
+
+    async def ncbi_put(request):
+        form = await request.post()
+        if form.get('CMD') != 'Put' or not form.get('QUERY'):
+            return web.Response(status=400, text="CMD=Put and QUERY are required")
+        rid = f"MOCK{next(job_ids):08d}"
+        jobs[rid] = {'submitted': time.monotonic(), 'program': form.get('PROGRAM', 'blastn')}
+        stats['ncbi_submissions'] += 1
+        return web.Response(text=f"<!--QBlastInfoBegin\n    RID = {rid}\n    RTOE = 1\nQBlastInfoEnd-->")
+
+    async def ncbi_get(request):
+        stats['ncbi_polls'] += 1
+        job = jobs.get(request.query.get('RID'))
+        if job is None:
+            return web.Response(text="<!--QBlastInfoBegin\n    Status=UNKNOWN\nQBlastInfoEnd-->")
+        if not finished(job):
+            return web.Response(text="<!--QBlastInfoBegin\n    Status=WAITING\nQBlastInfoEnd-->")
+        return web.Response(content_type='text/xml', text=(
+            '<?xml version="1.0"?>\n<BlastOutput>\n'
+            f"  <BlastOutput_program>{job['program']}</BlastOutput_program>\n"
+            '  <BlastOutput_iterations/>\n</BlastOutput>\n'))
+
+    async def get_stats(request):
+        return web.json_response(stats)
+
+    app = web.Application()
+    app.add_routes([
+        web.post('/ebi/{tool}/run', ebi_run),
+        web.get('/ebi/{tool}/status/{job}', ebi_status),
+        web.get('/ebi/{tool}/result/{job}/{result_type}', ebi_result),
+        web.post('/ncbi/Blast.cgi', ncbi_put),
+        web.get('/ncbi/Blast.cgi', ncbi_get),
+        web.get('/stats', get_stats)
+    ])
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock EBI/NCBI alignment job services")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=2.0, help="seconds until a submitted job finishes")
+    args = parser.parse_args()
+    web.run_app(make_app(args.delay), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
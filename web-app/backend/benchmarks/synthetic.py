@@ -0,0 +1,125 @@
+"""
+Seeded synthetic genomes and VFDB for the benchmarks
+
+A genome is a set of contigs densely packed with planted genes (ATG, sense
+codons drawn with the requested GC content, a stop codon) on both strands,
+separated by random intergenic spacers, roughly like a bacterial chromosome.
+The synthetic VFDB mixes mutated copies of some planted proteins (so BLAST
+and the prefilter find real hits at a spread of identities) with random
+proteins. The same parameters and seed always give the same sequences.
+"""
+
+import numpy as np
+from Bio.Data.CodonTable import standard_dna_table
+
+BASES = np.frombuffer(b'ACGT', dtype=np.uint8)
+COMPLEMENT = np.zeros(256, dtype=np.uint8)
+COMPLEMENT[BASES] = np.frombuffer(b'TGCA', dtype=np.uint8)
+
+SENSE_CODONS = sorted(standard_dna_table.forward_table)
+STOP_CODONS = standard_dna_table.stop_codons
+AMINO_ACIDS = 'ACDEFGHIKLMNPQRSTVWY'
+
+CODING_DENSITY = 0.88
+MEAN_GENE_CODONS = 320
+MIN_GENE_CODONS = 60
+
+
+def base_weights(gc):
+    """A, C, G, T probabilities for a GC fraction"""
+    return np.array([(1 - gc) / 2, gc / 2, gc / 2, (1 - gc) / 2])
+
+
+def _codon_weights(codons, gc):
+    weights = base_weights(gc)
+    lookup = dict(zip('ACGT', weights))
+    probs = np.array([np.prod([lookup[base] for base in codon]) for codon in codons])
+    return probs / probs.sum()
+
+
+def _contig_lengths(rng, size, contigs):
+    """Split size bp over contigs (uneven, like an assembly), each at least 1 kb"""
+    shares = rng.dirichlet(np.full(contigs, 2.0))
+    lengths = np.maximum((shares * size).astype(np.int64), 1000)
+    lengths[np.argmax(lengths)] += size - lengths.sum()
+    return lengths.tolist()
+
+
+def _planted_gene(rng, codon_table, codon_probs, stop_table, translate):
+    """(DNA uint8 array, protein) of one gene on the forward strand"""
+    num_codons = max(int(rng.gamma(2.0, MEAN_GENE_CODONS / 2)), MIN_GENE_CODONS)
+    body = rng.choice(len(codon_table), num_codons - 1, p=codon_probs)
+    stop = rng.integers(len(stop_table))
+    dna = np.concatenate((codon_table[SENSE_CODONS.index('ATG')], codon_table[body].ravel(), stop_table[stop]))
+    protein = 'M' + ''.join(translate[index] for index in body.tolist())
+    return dna, protein
+
+
+def synthetic_genome(size=1_000_000, gc=0.5, contigs=1, seed=0):
+    """
+    Contigs of a synthetic genome and the proteins planted in it.
+
+    Returns ([(contig_id, sequence)], proteins); size is the total length in
+    bp and gc the GC fraction of coding and intergenic DNA alike.
+    """
+    rng = np.random.default_rng(seed)
+    codon_table = np.array([np.frombuffer(codon.encode(), dtype=np.uint8) for codon in SENSE_CODONS])
+    stop_table = np.array([np.frombuffer(codon.encode(), dtype=np.uint8) for codon in STOP_CODONS])
+    codon_probs = _codon_weights(SENSE_CODONS, gc)
+    translate = [standard_dna_table.forward_table[codon] for codon in SENSE_CODONS]
+    spacer_mean = MEAN_GENE_CODONS * 3 * (1 - CODING_DENSITY) / CODING_DENSITY
+    spacer_probs = base_weights(gc)
+
+    records, proteins = [], []
+    for number, length in enumerate(_contig_lengths(rng, size, contigs), start=1):
+        parts, filled = [], 0
+        while filled < length:
+            spacer = BASES[rng.choice(4, int(rng.exponential(spacer_mean)) + 1, p=spacer_probs)]
+            gene, protein = _planted_gene(rng, codon_table, codon_probs, stop_table, translate)
+            if rng.random() < 0.5:
+                gene = COMPLEMENT[gene[::-1]]
+            parts.extend((spacer, gene))
+            proteins.append(protein)
+            filled += len(spacer) + len(gene)
+        sequence = np.concatenate(parts)[:length].tobytes().decode('ascii')
+        records.append((f"contig_{number}", sequence))
+    return records, proteins
+
+
+def mutate_protein(rng, protein, identity):
+    """Copy of a protein with about (1 - identity) of its residues substituted"""
+    residues = np.frombuffer(protein.encode(), dtype=np.uint8).copy()
+    mask = rng.random(len(residues)) > identity
+    mask[0] = False
+    alphabet = np.frombuffer(AMINO_ACIDS.encode(), dtype=np.uint8)
+    residues[mask] = alphabet[rng.integers(len(alphabet), size=int(mask.sum()))]
+    return residues.tobytes().decode('ascii')
+
+
+def synthetic_vfdb(proteins, size=200, planted_fraction=0.5, seed=0):
+    """
+    [(record_id, protein)] of a small VFDB-like database.
+
+    planted_fraction of the entries are planted proteins mutated to 30-100%
+    identity; the rest are random proteins of similar lengths.
+    """
+    rng = np.random.default_rng(seed + 1)
+    num_planted = min(int(size * planted_fraction), len(proteins))
+    chosen = rng.choice(len(proteins), num_planted, replace=False) if num_planted else []
+    alphabet = np.frombuffer(AMINO_ACIDS.encode(), dtype=np.uint8)
+
+    entries = [mutate_protein(rng, proteins[index], rng.uniform(0.3, 1.0)) for index in chosen]
+    for _ in range(size - num_planted):
+        length = max(int(rng.gamma(2.0, MEAN_GENE_CODONS / 2)), MIN_GENE_CODONS)
+        entries.append('M' + alphabet[rng.integers(len(alphabet), size=length - 1)].tobytes().decode('ascii'))
+    return [(f"VFG{number:06d}(synthetic)", protein) for number, protein in enumerate(entries, start=1)]
+
+
+def write_fasta(records, path, width=80):
+    """Write [(record_id, sequence)] as FASTA"""
+    with open(path, 'w') as handle:
+        for record_id, sequence in records:
+            handle.write(f">{record_id}\n")
+            for start in range(0, len(sequence), width):
+                handle.write(sequence[start:start + width] + '\n')
+    return path
@@ -5,19 +5,30 @@ Supports:
 1. EBI EMBL-EBI Web Services (EMBOSS, Clustal Omega, MAFFT)
 2. NCBI BLAST API
 3. Local BLAST (if installed)
+
+Requests go through the shared client in services.remote_client: one
+pooled session, exponential-backoff polling, and identical submissions
+answered from the in-flight job or the persistent result cache. The
+service URLs can be overridden with the EBI_BASE_URL and NCBI_BLAST_URL
+environment variables (e.g. to point at benchmarks.mock_remote_services).
 """
 
-import requests
-import aiohttp
 import asyncio
-import time
-from pathlib import Path
+import os
+import re
 from Bio import SeqIO
 from typing import Dict, List, Optional
 
+from services import remote_client
+from services.remote_client import PollTimeout, cached_job, get_session, poll
+
 # API endpoints
-EBI_BASE_URL = "https://www.ebi.ac.uk/Tools/services/rest"
-NCBI_BLAST_URL = "https://blast.ncbi.nlm.nih.gov/Blast.cgi"
+EBI_BASE_URL = os.getenv('EBI_BASE_URL', "https://www.ebi.ac.uk/Tools/services/rest")
+NCBI_BLAST_URL = os.getenv('NCBI_BLAST_URL', "https://blast.ncbi.nlm.nih.gov/Blast.cgi")
+
+# Polling: first check after initial delay, then backing off up to max delay (seconds)
+EBI_POLL = {'initial_delay': 1.0, 'max_delay': 10.0, 'timeout': 60.0}
+NCBI_POLL = {'initial_delay': 5.0, 'max_delay': 30.0, 'timeout': 150.0}
 
 
 async def run_alignment(file1_path: str, file2_path: str, alignment_type: str = "clustalo") -> Dict:
@@ -44,9 +55,6 @@ async def run_alignment(file1_path: str, file2_path: str, alignment_type: str =
             'alignment_type': alignment_type
         }
     
-    # Determine if protein or nucleotide
-    is_protein = alignment_type in ['blastp', 'clustalo']
-    
     # Route to appropriate alignment method
     if alignment_type in ['clustalo', 'mafft']:
         return await run_ebi_msa(seq1, seq2, alignment_type)
@@ -67,74 +75,91 @@ async def run_ebi_msa(seq1: List, seq2: List, tool: str = "clustalo") -> Dict:
     Uses Clustal Omega or MAFFT via EBI REST API
     """
     
+    # Combine sequences
+    all_seqs = seq1 + seq2
+    
+    # Format sequences
+    sequences = "\n".join([f">{s.id}\n{str(s.seq)}" for s in all_seqs])
+    
+    params = {
+        'stype': 'protein' if tool == 'clustalo' else 'dna',
+        'outfmt': 'clustal'
+    }
+    
+    async def submit():
+        return await _run_ebi_job(tool, sequences, params, len(all_seqs))
+    
+    return await cached_job(tool, dict(params, url=EBI_BASE_URL), sequences, submit)
+
+
+async def _run_ebi_job(tool: str, sequences: str, params: Dict, num_sequences: int) -> Dict:
+    """Submit one EBI job and wait for its alignment"""
+    job_id = None
     try:
-        # Combine sequences
-        all_seqs = seq1 + seq2
-        
-        # Format sequences
-        sequences = "\\n".join([f">{s.id}\\n{str(s.seq)}" for s in all_seqs])
+        session = await get_session()
         
         # Submit job to EBI
         submit_url = f"{EBI_BASE_URL}/{tool}/run"
         
-        data = {
-            'email': 'vfdetector@example.com',  # Required by EBI
-            'sequence': sequences,
-            'stype': 'protein' if tool == 'clustalo' else 'dna',
-            'outfmt': 'clustal'
-        }
+        data = dict(params, email='vfdetector@example.com', sequence=sequences)  # email is required by EBI
         
-        async with aiohttp.ClientSession() as session:
-            # Submit job
-            async with session.post(submit_url, data=data) as response:
-                if response.status != 200:
-                    return {
-                        'success': False,
-                        'error': f"EBI API submission failed: {response.status}",
-                        'alignment_type': tool
-                    }
-                
-                job_id = await response.text()
-            
-            # Poll for results (max 60 seconds)
-            status_url = f"{EBI_BASE_URL}/{tool}/status/{job_id}"
-            result_url = f"{EBI_BASE_URL}/{tool}/result/{job_id}/aln-clustal_num"
+        async with session.post(submit_url, data=data) as response:
+            if response.status != 200:
+                return {
+                    'success': False,
+                    'error': f"EBI API submission failed: {response.status}",
+                    'alignment_type': tool
+                }
             
-            for i in range(30):  # Poll for 60 seconds
-                await asyncio.sleep(2)
-                
-                async with session.get(status_url) as status_response:
-                    status = await status_response.text()
-                    
-                    if status == 'FINISHED':
-                        # Get results
-                        async with session.get(result_url) as result_response:
-                            alignment_text = await result_response.text()
-                            
-                            return {
-                                'success': True,
-                                'alignment_type': tool,
-                                'alignment': alignment_text,
-                                'identity': calculate_identity_from_alignment(alignment_text),
-                                'num_sequences': len(all_seqs),
-                                'job_id': job_id
-                            }
-                    
-                    elif status == 'FAILURE' or status == 'ERROR':
-                        return {
-                            'success': False,
-                            'error': f"EBI job failed with status: {status}",
-                            'alignment_type': tool,
-                            'job_id': job_id
-                        }
-            
-            # Timeout
+            job_id = (await response.text()).strip()
+        
+        status_url = f"{EBI_BASE_URL}/{tool}/status/{job_id}"
+        result_url = f"{EBI_BASE_URL}/{tool}/result/{job_id}/aln-clustal_num"
+        
+        async def check_status():
+            async with session.get(status_url) as status_response:
+                status = (await status_response.text()).strip()
+            return status if status in ('FINISHED', 'FAILURE', 'ERROR', 'NOT_FOUND') else None
+        
+        status = await poll(check_status, **EBI_POLL)
+        
+        if status != 'FINISHED':
             return {
                 'success': False,
-                'error': "Alignment timeout (>60 seconds)",
+                'error': f"EBI job failed with status: {status}",
                 'alignment_type': tool,
                 'job_id': job_id
             }
+        
+        # Get results
+        async with session.get(result_url) as result_response:
+            alignment_text = await result_response.text()
+        
+        return {
+            'success': True,
+            'alignment_type': tool,
+            'alignment': alignment_text,
+            'identity': calculate_identity_from_alignment(alignment_text),
+            'num_sequences': num_sequences,
+            'job_id': job_id
+        }
+    
+    except PollTimeout:
+        return {
+            'success': False,
+            'error': f"Alignment timeout (>{EBI_POLL['timeout']:g} seconds)",
+            'alignment_type': tool,
+            'job_id': job_id
+        }
+    
+    except asyncio.TimeoutError:
+        # One request to EBI timed out (aiohttp's ServerTimeoutError included)
+        return {
+            'success': False,
+            'error': f"EBI request timed out (>{remote_client.REQUEST_TIMEOUT:g} seconds)",
+            'alignment_type': tool,
+            'job_id': job_id
+        }
     
     except Exception as e:
         return {
@@ -151,72 +176,95 @@ async def run_ncbi_blast_api(seq1: List, seq2: List, blast_type: str = "blastn")
     Note: NCBI API has rate limits and may be slow
     """
     
+    if not seq1:
+        return {
+            'success': False,
+            'error': "No query sequence in the first FASTA file",
+            'alignment_type': blast_type
+        }
+    
+    query_seq = str(seq1[0].seq)
+    params = {
+        'PROGRAM': blast_type,
+        'DATABASE': 'nt' if blast_type == 'blastn' else 'nr',
+        'FORMAT_TYPE': 'XML'
+    }
+    
+    async def submit():
+        return await _run_ncbi_job(blast_type, query_seq, params)
+    
+    return await cached_job(blast_type, dict(params, url=NCBI_BLAST_URL), query_seq, submit)
+
+
+async def _run_ncbi_job(blast_type: str, query_seq: str, params: Dict) -> Dict:
+    """Submit one NCBI BLAST search and wait for its results"""
+    rid = None
     try:
-        query_seq = str(seq1[0].seq)
+        session = await get_session()
         
         # Submit BLAST search
-        params = {
-            'CMD': 'Put',
-            'PROGRAM': blast_type,
-            'DATABASE': 'nt' if blast_type == 'blastn' else 'nr',
-            'QUERY': query_seq,
-            'FORMAT_TYPE': 'XML'
-        }
+        async with session.post(NCBI_BLAST_URL, data=dict(params, CMD='Put', QUERY=query_seq)) as response:
+            result_text = await response.text()
         
-        async with aiohttp.ClientSession() as session:
-            # Submit job
-            async with session.post(NCBI_BLAST_URL, data=params) as response:
-                result_text = await response.text()
-                
-                # Extract RID (request ID)
-                import re
-                rid_match = re.search(r'RID = ([A-Z0-9]+)', result_text)
-                if not rid_match:
-                    return {
-                        'success': False,
-                        'error': "Failed to get BLAST job ID",
-                        'alignment_type': blast_type
-                    }
-                
-                rid = rid_match.group(1)
-            
-            # Wait for results
-            check_params = {
-                'CMD': 'Get',
-                'FORMAT_TYPE': 'XML',
-                'RID': rid
+        # Extract RID (request ID)
+        rid_match = re.search(r'RID = ([A-Z0-9]+)', result_text)
+        if not rid_match:
+            return {
+                'success': False,
+                'error': "Failed to get BLAST job ID",
+                'alignment_type': blast_type
             }
-            
-            for i in range(30):  # Poll for results
-                await asyncio.sleep(5)
-                
-                async with session.get(NCBI_BLAST_URL, params=check_params) as check_response:
-                    result = await check_response.text()
-                    
-                    if 'Status=READY' in result:
-                        # Parse results
-                        return {
-                            'success': True,
-                            'alignment_type': blast_type,
-                            'results': result,
-                            'identity': 'See BLAST output',
-                            'rid': rid
-                        }
-                    
-                    elif 'Status=FAILURE' in result:
-                        return {
-                            'success': False,
-                            'error': "BLAST search failed",
-                            'alignment_type': blast_type,
-                            'rid': rid
-                        }
-            
+        
+        rid = rid_match.group(1)
+        
+        # Wait for results
+        check_params = {
+            'CMD': 'Get',
+            'FORMAT_TYPE': 'XML',
+            'RID': rid
+        }
+        
+        async def check_results():
+            async with session.get(NCBI_BLAST_URL, params=check_params) as check_response:
+                result = await check_response.text()
+            if 'Status=WAITING' in result:
+                return None
+            return result
+        
+        result = await poll(check_results, **NCBI_POLL)
+        
+        if 'Status=FAILURE' in result or 'Status=UNKNOWN' in result:
             return {
                 'success': False,
-                'error': "BLAST timeout",
+                'error': "BLAST search failed",
                 'alignment_type': blast_type,
                 'rid': rid
             }
+        
+        return {
+            'success': True,
+            'alignment_type': blast_type,
+            'results': result,
+            'identity': 'See BLAST output',
+            'rid': rid
+        }
+    
+    except PollTimeout:
+        return {
+            'success': False,
+            'error': f"BLAST timeout (>{NCBI_POLL['timeout']:g} seconds)",
+            'alignment_type': blast_type,
+            'rid': rid
+        }
+    
+    except asyncio.TimeoutError:
+        # One request to NCBI timed out (aiohttp's ServerTimeoutError included)
+        return {
+            'success': False,
+            'error': f"NCBI request timed out (>{remote_client.REQUEST_TIMEOUT:g} seconds)",
+            'alignment_type': blast_type,
+            'rid': rid
+        }
     
     except Exception as e:
         return {
@@ -231,7 +279,7 @@ def calculate_identity_from_alignment(alignment_text: str) -> float:
     Calculate percent identity from Clustal alignment
     """
     try:
-        lines = alignment_text.split('\\n')
+        lines = alignment_text.split('\n')
         
         # Find alignment lines (skip header)
         seq_lines = {}
@@ -273,34 +321,26 @@ def calculate_identity_from_alignment(alignment_text: str) -> float:
 # Fallback: Simple pairwise alignment (if APIs fail)
 def simple_pairwise_alignment(seq1: str, seq2: str) -> Dict:
     """
-    Simple local alignment fallback using built-in tools
+    Simple global alignment fallback using built-in tools
+    
+    Scored like pairwise2's globalxx, but only the first optimal alignment
+    is built (see services.pairwise_identity).
     """
-    from Bio import pairwise2
-    from Bio.pairwise2 import format_alignment
+    from services.pairwise_identity import best_alignment
     
     try:
-        # Perform alignment
-        alignments = pairwise2.align.globalxx(seq1, seq2)
-        
-        if not alignments:
-            return {
-                'success': False,
-                'error': "No alignment found"
-            }
-        
-        best = alignments[0]
+        best = best_alignment(seq1, seq2)
         
-        # Calculate identity
-        matches = sum(1 for a, b in zip(best.seqA, best.seqB) if a == b and a != '-')
-        length = len(best.seqA.replace('-', ''))
-        identity = (matches / length * 100) if length > 0 else 0
+        # Identical positions: the score, since only matches are scored
+        length = len(seq1)
+        identity = (best.score / length * 100) if length > 0 else 0
         
         return {
             'success': True,
             'alignment_type': 'pairwise',
             'identity': round(identity, 2),
             'score': best.score,
-            'alignment': format_alignment(*best)
+            'alignment': format(best)
         }
     
     except Exception as e:
@@ -0,0 +1,286 @@
+"""
+Headless batch scoring of many genomes
+
+Runs the same stages as the web pipeline (ORFs -> ML -> BLAST -> SignalP ->
+scoring) over a directory or manifest of FASTA files, without the API.
+Genomes are spread over a process pool; the core budget (--cores) is split
+between genome workers and blastp threads, so workers x threads stays within
+it. Each genome gets a TSV and/or Parquet table of its scored ORFs and a
+<name>.done.json marker written last; a rerun skips genomes whose marker
+matches the input file and settings, so an interrupted batch resumes where
+it stopped. summary.tsv lists every genome of the batch.
+
+Usage (from web-app/backend):
+    python -m services.batch_runner GENOMES_DIR_OR_MANIFEST... --output DIR
+        [--cores N] [--genome-workers N] [--blast-threads N] [--format tsv|parquet|both]
+        [--min-length 100] [--force]
+
+A manifest is a text file with one FASTA path per line, or "name<TAB>path";
+relative paths are resolved against the manifest's directory.
+"""
+
+import argparse
+import csv
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from services.blast_cache import database_version
+from services.blast_service import VFDB_PATH, run_blast_vfdb_batch
+from services.fasta_stream import FASTA_SUFFIXES, GZIP_SUFFIXES, genome_filename
+from services.ml_prediction import model_version, predict_vf_ml_batch
+from services.orf_prediction import predict_orf_table, table_summary
+from services.orf_table import ORF_FIELDS
+from services.scoring import classify_vf
+from services.signalp_service import predict_signal_peptides
+from services.vf_pipeline import score_columns
+
+SUMMARY_FILE = 'summary.tsv'
+DONE_SUFFIX = '.done.json'
+FORMATS = ('tsv', 'parquet', 'both')
+# blastp threads per genome worker when only the total core budget is given
+DEFAULT_BLAST_THREADS = 2
+# Summary columns: ORF counts per classification, most confident first
+CLASSIFICATIONS = tuple(classify_vf(score) for score in (6, 3, 1, 0))
+
+
+def genome_name(path):
+    """Output name of a FASTA path: the file name without FASTA/compression suffixes"""
+    name = genome_filename(Path(path).name) or Path(path).name
+    for suffix in FASTA_SUFFIXES:
+        if name.lower().endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def read_manifest(path):
+    """[(name, path)] from a manifest file"""
+    genomes = []
+    base = Path(path).parent
+    with open(path) as handle:
+        for line in handle:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            fields = line.split('\t')
+            name, genome_path = (fields[0], fields[1]) if len(fields) > 1 else (None, fields[0])
+            genome_path = base / genome_path
+            genomes.append((name or genome_name(genome_path), genome_path))
+    return genomes
+
+
+def collect_genomes(inputs):
+    """[(name, path)] of every genome named by the inputs (directories, FASTA files, manifests)"""
+    genomes = []
+    for item in map(Path, inputs):
+        if item.is_dir():
+            genomes.extend((genome_name(path), path) for path in sorted(item.iterdir())
+                           if path.is_file() and genome_filename(path.name))
+        elif genome_filename(item.name):
+            genomes.append((genome_name(item), item))
+        elif item.is_file():
+            genomes.extend(read_manifest(item))
+        else:
+            raise ValueError(f"No such genome, directory or manifest: {item}")
+
+    seen = {}
+    for name, path in genomes:
+        if name in seen and seen[name] != path:
+            raise ValueError(f"Two genomes would both be written as {name}: {seen[name]}, {path}")
+        seen[name] = path
+    return list(seen.items())
+
+
+def split_cores(cores, num_genomes, genome_workers=None, blast_threads=None):
+    """(genome workers, blastp threads per worker) within a core budget"""
+    cores = max(cores, 1)
+    if genome_workers and blast_threads:
+        return genome_workers, blast_threads
+    if genome_workers:
+        return genome_workers, max(cores // genome_workers, 1)
+    if blast_threads:
+        return max(min(cores // blast_threads, num_genomes), 1), blast_threads
+
+    workers = max(min(cores // min(DEFAULT_BLAST_THREADS, cores), num_genomes), 1)
+    # With fewer genomes than worker slots, the spare cores go to blastp
+    return workers, max(cores // workers, 1)
+
+
+def fingerprint(path, min_length):
+    """What a finished genome's outputs depend on: the input file and the scoring settings"""
+    stat = Path(path).stat()
+    return {
+        'input': str(Path(path).resolve()),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'min_length': min_length,
+        'model': model_version(),
+        'vfdb': database_version(VFDB_PATH) if VFDB_PATH.exists() else None
+    }
+
+
+def is_finished(output_dir, name, expected):
+    marker = output_dir / f"{name}{DONE_SUFFIX}"
+    if not marker.exists():
+        return False
+    try:
+        return json.loads(marker.read_text())['fingerprint'] == expected
+    except (ValueError, KeyError):
+        return False
+
+
+def write_tsv(table, path):
+    """The table's rows as TSV, with the same columns as its Parquet export"""
+    fields = list(ORF_FIELDS) + table.score_columns
+    columns = [table.field_values(field) for field in fields]
+    with open(path, 'w', newline='') as handle:
+        writer = csv.writer(handle, delimiter='\t', lineterminator='\n')
+        writer.writerow(fields)
+        writer.writerows(zip(*columns))
+
+
+def _replace_atomically(write, path):
+    tmp_path = path.with_name(path.name + '.tmp')
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _fasta_path(path, workdir):
+    """Plain FASTA path for a genome, decompressing gzip/bgzip input into workdir"""
+    if not path.name.lower().endswith(GZIP_SUFFIXES):
+        return path
+    plain = Path(workdir) / 'genome.fasta'
+    with gzip.open(path, 'rb') as source, open(plain, 'wb') as target:
+        shutil.copyfileobj(source, target)
+    return plain
+
+
+def score_genome(name, path, output_dir, min_length, blast_threads, formats, expected):
+    """Worker: score one genome, write its tables and done marker; returns its summary row"""
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix='vf_batch_') as workdir:
+        table = predict_orf_table(str(_fasta_path(Path(path), workdir)), min_length)
+
+    summary = table_summary(table)
+    sequences = table.sequences()
+    columns = score_columns(predict_vf_ml_batch(sequences),
+                            run_blast_vfdb_batch(sequences, num_threads=blast_threads),
+                            predict_signal_peptides(sequences))
+    for column, values in columns.items():
+        table.set_column(column, values)
+
+    if 'tsv' in formats:
+        _replace_atomically(lambda tmp: write_tsv(table, tmp), output_dir / f"{name}.tsv")
+    if 'parquet' in formats:
+        _replace_atomically(table.to_parquet, output_dir / f"{name}.parquet")
+
+    classifications = table.field_values('classification') if len(table) else []
+    row = {
+        'genome': name,
+        'path': str(path),
+        'status': 'done',
+        'num_contigs': summary['num_contigs'],
+        'num_orfs': summary['num_orfs'],
+        'avg_orf_length': summary['avg_orf_length'],
+        **{label: classifications.count(label) for label in CLASSIFICATIONS},
+        'seconds': round(time.perf_counter() - start, 2),
+        'error': ''
+    }
+    # The marker goes last: a genome only counts as finished once its tables exist
+    _replace_atomically(lambda tmp: tmp.write_text(json.dumps({'fingerprint': expected, 'summary': row})),
+                        output_dir / f"{name}{DONE_SUFFIX}")
+    return row
+
+
+def write_summary(output_dir, genomes, rows):
+    """summary.tsv with one row per genome of the batch, in input order"""
+    fields = ['genome', 'path', 'status', 'num_contigs', 'num_orfs', 'avg_orf_length',
+              *CLASSIFICATIONS, 'seconds', 'error']
+    with open(output_dir / SUMMARY_FILE, 'w', newline='') as handle:
+        writer = csv.DictWriter(handle, fields, delimiter='\t', lineterminator='\n')
+        writer.writeheader()
+        for name, _ in genomes:
+            writer.writerow(rows[name])
+
+
+def run_batch(genomes, output_dir, cores=None, genome_workers=None, blast_threads=None,
+              formats=('tsv',), min_length=100, force=False, log=print):
+    """Score every genome not already finished; returns {name: summary row} for the whole batch"""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if 'parquet' in formats:
+        # Fail before any work rather than after the first genome
+        from services.orf_table import _require_pyarrow
+        _require_pyarrow()
+
+    rows = {}
+    pending = []
+    for name, path in genomes:
+        expected = fingerprint(path, min_length)
+        if not force and is_finished(output_dir, name, expected):
+            rows[name] = json.loads((output_dir / f"{name}{DONE_SUFFIX}").read_text())['summary']
+        else:
+            pending.append((name, path, expected))
+
+    workers, threads = split_cores(cores or os.cpu_count() or 1, len(pending) or 1,
+                                   genome_workers, blast_threads)
+    log(f"{len(genomes)} genomes: {len(rows)} already finished, {len(pending)} to score "
+        f"with {workers} workers x {threads} blastp threads")
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(score_genome, name, path, output_dir, min_length, threads,
+                                   formats, expected): (name, path)
+                       for name, path, expected in pending}
+            for done, future in enumerate(as_completed(futures), start=1):
+                name, path = futures[future]
+                try:
+                    rows[name] = future.result()
+                    log(f"[{done}/{len(pending)}] {name}: {rows[name]['num_orfs']} ORFs "
+                        f"in {rows[name]['seconds']}s")
+                except Exception as e:
+                    error = (str(e).strip().splitlines() or [type(e).__name__])[0]
+                    rows[name] = {'genome': name, 'path': str(path), 'status': 'failed', 'error': error}
+                    log(f"[{done}/{len(pending)}] {name}: failed: {error}")
+
+    write_summary(output_dir, genomes, rows)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a batch of genomes for virulence factors")
+    parser.add_argument('inputs', nargs='+', help="directories of FASTA files, FASTA files or manifests")
+    parser.add_argument('--output', '-o', required=True, help="directory for the per-genome tables")
+    parser.add_argument('--cores', type=int, default=os.cpu_count(), help="total core budget")
+    parser.add_argument('--genome-workers', type=int, help="genomes scored at the same time")
+    parser.add_argument('--blast-threads', type=int, help="blastp threads per genome")
+    parser.add_argument('--format', choices=FORMATS, default='tsv')
+    parser.add_argument('--min-length', type=int, default=100, help="minimum ORF length (bp)")
+    parser.add_argument('--force', action='store_true', help="rescore genomes that are already finished")
+    args = parser.parse_args()
+
+    try:
+        genomes = collect_genomes(args.inputs)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if not genomes:
+        parser.error("No FASTA files found")
+
+    formats = ('tsv', 'parquet') if args.format == 'both' else (args.format,)
+    rows = run_batch(genomes, args.output, args.cores, args.genome_workers, args.blast_threads,
+                     formats, args.min_length, args.force, log=lambda message: print(message, file=sys.stderr))
+    failed = [name for name, row in rows.items() if row['status'] == 'failed']
+    print(f"Summary written to {Path(args.output) / SUMMARY_FILE}", file=sys.stderr)
+    if failed:
+        print(f"{len(failed)} genomes failed: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
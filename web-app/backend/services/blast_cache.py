@@ -0,0 +1,120 @@
+"""
+Persistent cache of VFDB BLAST results
+
+Results are stored in a local SQLite file keyed by a SHA-256 of the protein
+sequence, the VFDB version (file size and mtime) and the BLAST parameters,
+so a rebuilt database or changed search settings never return stale hits.
+The least recently used entries are evicted beyond MAX_ENTRIES.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+CACHE_PATH = Path(__file__).parent.parent / 'temp' / 'cache' / 'blast_hits.sqlite'
+MAX_ENTRIES = 500_000
+
+_lock = threading.Lock()
+_connections = {}
+_counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+
+def _connect(path):
+    """Open (once per process) the cache database at path"""
+    path = path or CACHE_PATH
+    # Connections must not be shared with forked worker processes
+    key = (os.getpid(), str(path))
+    if key not in _connections:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS blast_hits (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS blast_hits_last_used ON blast_hits (last_used)")
+        conn.commit()
+        _connections[key] = conn
+    return _connections[key]
+
+
+def database_version(db_path):
+    """Version string of a BLAST database file (size and modification time)"""
+    stat = Path(db_path).stat()
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def cache_key(sequence, db_version, params):
+    """Cache key for one protein under a database version and BLAST parameters"""
+    text = f"{db_version}|{json.dumps(params, sort_keys=True)}|{sequence}"
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def lookup(keys, path=None):
+    """Cached results for the given keys (missing keys are left out)"""
+    keys = list(keys)
+    found = {}
+    with _lock:
+        conn = _connect(path)
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = conn.execute(
+                f"SELECT key, result FROM blast_hits WHERE key IN ({placeholders})", chunk
+            ).fetchall()
+            found.update((key, json.loads(result)) for key, result in rows)
+
+        if found:
+            now = time.time()
+            conn.executemany("UPDATE blast_hits SET last_used = ? WHERE key = ?",
+                             [(now, key) for key in found])
+            conn.commit()
+
+        _counters['hits'] += len(found)
+        _counters['misses'] += len(keys) - len(found)
+    return found
+
+
+def store(results, path=None, max_entries=None):
+    """Save {key: result} and evict least recently used entries over max_entries"""
+    if not results:
+        return
+    max_entries = max_entries or MAX_ENTRIES
+    with _lock:
+        conn = _connect(path)
+        now = time.time()
+        conn.executemany(
+            "INSERT OR REPLACE INTO blast_hits (key, result, last_used) VALUES (?, ?, ?)",
+            [(key, json.dumps(result), now) for key, result in results.items()]
+        )
+        (count,) = conn.execute("SELECT COUNT(*) FROM blast_hits").fetchone()
+        if count > max_entries:
+            excess = count - max_entries
+            conn.execute(
+                "DELETE FROM blast_hits WHERE key IN "
+                "(SELECT key FROM blast_hits ORDER BY last_used LIMIT ?)", (excess,)
+            )
+            _counters['evictions'] += excess
+        conn.commit()
+
+
+def cache_stats(path=None):
+    """Hit/miss/eviction counters of this process and the number of cached entries"""
+    with _lock:
+        (entries,) = _connect(path).execute("SELECT COUNT(*) FROM blast_hits").fetchone()
+        return dict(_counters, entries=entries)
+
+
+def clear(path=None):
+    """Remove every cached result"""
+    with _lock:
+        conn = _connect(path)
+        conn.execute("DELETE FROM blast_hits")
+        conn.commit()
@@ -1,100 +1,163 @@
-import subprocess
-import tempfile
+import os
+import shutil
 from pathlib import Path
-from Bio import SeqIO
-from Bio.Seq import Seq
-from Bio.SeqRecord import SeqRecord
 
-def run_blast_vfdb(sequence):
-    """Run BLAST against VFDB database"""
-    # Check if VFDB database exists
-    db_path = Path(__file__).parent.parent / 'databases' / 'vfdb' / 'VFDB_setB_pro.fas'
-    
-    if not db_path.exists():
-        # If database doesn't exist, return dummy result
+from services import blast_cache, local_aligner, metrics, vfdb_prefilter
+from services.tool_executor import run_tool_sync
+
+VFDB_PATH = Path(__file__).parent.parent / 'databases' / 'vfdb' / 'VFDB_setB_pro.fas'
+BLAST_OUTFMT = '6 qseqid sseqid pident length evalue bitscore'
+BLAST_EVALUE = '1e-5'
+BLAST_PARAMS = {'outfmt': BLAST_OUTFMT, 'evalue': BLAST_EVALUE, 'max_target_seqs': 1}
+
+# blastp time budget: base seconds per call plus seconds per query in a batch
+BLAST_TIMEOUT = 30
+BLAST_TIMEOUT_PER_QUERY = 2
+
+def no_hit_result(error=None):
+    """BLAST result for a query without a VFDB hit"""
+    result = {
+        'has_hit': False,
+        'identity': 0,
+        'evalue': 1.0,
+        'score': 0,
+        'top_hit': None
+    }
+    if error is not None:
+        result['error'] = error
+    return result
+
+def identity_score(identity):
+    """BLAST score (0-3) from percent identity of the best hit"""
+    if identity >= 80:
+        return 3
+    elif identity >= 60:
+        return 2
+    elif identity >= 40:
+        return 1
+    else:
+        return 0
+
+def parse_hit(parts):
+    """BLAST result from one tabular (outfmt 6) hit line split on tabs"""
+    identity = float(parts[2])
+
+    return {
+        'has_hit': True,
+        'identity': identity,
+        'evalue': float(parts[4]),
+        'bitscore': float(parts[5]),
+        'score': identity_score(identity),
+        'top_hit': parts[1]
+    }
+
+def _run_blastp(queries, num_threads, timeout):
+    """
+    Run one blastp process over {query_id: sequence} and stream its output.
+
+    Queries are written to blastp's stdin and hits are parsed from stdout
+    as blastp writes them. Returns {query_id: result} for queries with a
+    hit. Raises ToolError for any non-zero exit, even after some hits: the
+    queries without one may never have been searched, so their "no hit"
+    must not be reported or cached.
+    """
+    num_threads = num_threads or os.cpu_count() or 1
+    cmd = [
+        'blastp',
+        '-query', '-',
+        '-db', str(VFDB_PATH),
+        '-outfmt', BLAST_OUTFMT,
+        '-evalue', BLAST_EVALUE,
+        '-max_target_seqs', '1',
+        '-num_threads', str(num_threads)
+    ]
+
+    if timeout is None:
+        timeout = BLAST_TIMEOUT + BLAST_TIMEOUT_PER_QUERY * len(queries)
+
+    hits = {}
+
+    def parse_line(line):
+        # The first line per query is its best hit
+        parts = line.split('\t')
+        if len(parts) >= 6 and parts[0] not in hits:
+            hits[parts[0]] = parse_hit(parts)
+
+    query_fasta = ''.join(f">{query_id}\n{sequence}\n" for query_id, sequence in queries.items())
+    run_tool_sync(cmd, stdin=query_fasta, on_line=parse_line, threads=num_threads, timeout=timeout)
+    return hits
+
+@metrics.timed('blast')
+def run_blast_vfdb_batch(sequences, num_threads=None, timeout=None, use_cache=True,
+                         use_prefilter=True):
+    """
+    Run BLAST against VFDB for many sequences with a single blastp process.
+
+    All queries go into one multi-FASTA file and the tabular output is read
+    as a stream; the first line per query is its best hit. Proteins found
+    in the persistent BLAST cache are not searched again, and proteins the
+    VFDB k-mer prefilter rules out are reported as no hit without a search.
+    Returns one result dict per input sequence, in order.
+    """
+    if not VFDB_PATH.exists():
+        # If database doesn't exist, return dummy results
         # You'll set up VFDB later
-        return {
-            'has_hit': False,
-            'identity': 0,
-            'evalue': 1.0,
-            'score': 0,
-            'top_hit': None
-        }
-    
+        return [no_hit_result() for _ in sequences]
+
+    # Identical proteins are only searched once
+    unique = list(dict.fromkeys(seq for seq in sequences if seq))
+    found = {}
+
+    # Without BLAST+ installed, fall back to the built-in aligner
+    engine = 'blastp' if shutil.which('blastp') else 'local'
+
     try:
-        # Create temporary FASTA file for query
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.fasta', delete=False) as query_file:
-            record = SeqRecord(Seq(sequence), id="query", description="")
-            SeqIO.write(record, query_file, "fasta")
-            query_path = query_file.name
-        
-        # Run BLASTP
-        output_file = tempfile.NamedTemporaryFile(delete=False, suffix='.txt')
-        output_path = output_file.name
-        output_file.close()
-        
-        cmd = [
-            'blastp',
-            '-query', query_path,
-            '-db', str(db_path),
-            '-out', output_path,
-            '-outfmt', '6 qseqid sseqid pident length evalue bitscore',
-            '-evalue', '1e-5',
-            '-max_target_seqs', '1'
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        
-        # Parse results
-        with open(output_path, 'r') as f:
-            lines = f.readlines()
-        
-        # Clean up temp files
-        Path(query_path).unlink()
-        Path(output_path).unlink()
-        
-        if lines:
-            # Parse first hit
-            parts = lines[0].strip().split('\t')
-            identity = float(parts[2])
-            evalue = float(parts[4])
-            bitscore = float(parts[5])
-            
-            # Score based on identity
-            if identity >= 80:
-                score = 3
-            elif identity >= 60:
-                score = 2
-            elif identity >= 40:
-                score = 1
-            else:
-                score = 0
-            
-            return {
-                'has_hit': True,
-                'identity': identity,
-                'evalue': evalue,
-                'bitscore': bitscore,
-                'score': score,
-                'top_hit': parts[1]
-            }
-        else:
-            return {
-                'has_hit': False,
-                'identity': 0,
-                'evalue': 1.0,
-                'score': 0,
-                'top_hit': None
-            }
-    
+        keys = {}
+        if use_cache:
+            version = blast_cache.database_version(VFDB_PATH)
+            params = dict(BLAST_PARAMS, engine=engine)
+            keys = {seq: blast_cache.cache_key(seq, version, params) for seq in unique}
+            cached = blast_cache.lookup(keys.values())
+            found = {seq: cached[key] for seq, key in keys.items() if key in cached}
+            metrics.inc('blast_cache_hits_total', len(found))
+            metrics.inc('blast_cache_misses_total', len(unique) - len(found))
+
+        pending = [seq for seq in unique if seq not in found]
+        if use_prefilter and pending:
+            keep = vfdb_prefilter.prefilter(pending)
+            if keep is not None:
+                # Rejections are cheap to recompute, so they are not cached
+                for seq, kept in zip(pending, keep):
+                    if not kept:
+                        found[seq] = no_hit_result()
+                metrics.inc('blast_prefiltered_total', len(pending) - sum(keep))
+                pending = [seq for seq, kept in zip(pending, keep) if kept]
+
+        queries = {f"q{i}": seq for i, seq in enumerate(pending)}
+        if queries and engine == 'local':
+            with metrics.timer('local_aligner', len(pending)):
+                searched = dict(zip(pending, local_aligner.search_vfdb(pending, local_aligner.BAND)))
+            found.update(searched)
+        elif queries:
+            with metrics.timer('blastp', len(queries)):
+                hits = _run_blastp(queries, num_threads, timeout)
+            searched = {seq: hits.get(query_id, no_hit_result()) for query_id, seq in queries.items()}
+            found.update(searched)
+            if use_cache:
+                blast_cache.store({keys[seq]: result for seq, result in searched.items()})
+
+        results = []
+        for sequence in sequences:
+            hit = found.get(sequence)
+            results.append(dict(hit) if hit else no_hit_result())
+        return results
+
     except Exception as e:
-        # Fallback: return dummy score
+        # Fallback: return dummy scores
         print(f"BLAST failed: {e}")
-        return {
-            'has_hit': False,
-            'identity': 0,
-            'evalue': 1.0,
-            'score': 0,
-            'top_hit': None,
-            'error': str(e)
-        }
+        metrics.inc('stage_errors_total', stage='blast')
+        return [no_hit_result(error=str(e)) for _ in sequences]
+
+def run_blast_vfdb(sequence):
+    """Run BLAST against VFDB database"""
+    return run_blast_vfdb_batch([sequence], num_threads=1, timeout=BLAST_TIMEOUT)[0]
@@ -0,0 +1,145 @@
+"""
+On-disk cache of BLAST databases built from alignment subjects
+
+makeblastdb output is stored in one directory per subject, named by a
+SHA-256 over the subject file content and the database type, so comparing
+many queries against the same reference builds its database only once.
+A database is built in a private temporary directory and renamed into
+place when complete; concurrent requests for the same subject in this
+process wait for one build (run through services.tool_executor), and a
+build that loses the rename race to another process is simply discarded. Databases are held while a search
+uses them and only the least recently used idle ones are evicted once the
+cache exceeds MAX_BYTES.
+"""
+
+import asyncio
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from services import metrics
+from services.result_cache import file_digest
+from services.tool_executor import run_tool
+
+CACHE_DIR = Path(__file__).parent.parent / 'temp' / 'cache' / 'blastdb'
+MAX_BYTES = 1024 ** 3
+DB_NAME = 'db'
+MAKEBLASTDB_TIMEOUT = 30
+# Databases used this recently may be searched by another process and are not evicted
+BUSY_SECONDS = 300
+
+_lock = threading.Lock()
+# Build locks per key, dropped when the key has no holders or waiters left
+_key_locks = {}
+_in_use = Counter()
+
+
+def database_key(subject_path, dbtype):
+    """Cache key of the database built from a subject file"""
+    with open(subject_path, 'rb') as handle:
+        digest = file_digest(handle)
+    return hashlib.sha256(f"{dbtype}|{digest}".encode()).hexdigest()
+
+
+def _key_lock(key):
+    with _lock:
+        return _key_locks.setdefault(key, asyncio.Lock())
+
+
+async def _build(subject_path, dbtype, entry, queue_timeout=None):
+    """Run makeblastdb into a temporary directory, then rename it to entry"""
+    tmp_dir = entry.with_name(f"{entry.name}.{os.getpid()}.tmp")
+    tmp_dir.mkdir(parents=True)
+    try:
+        with metrics.timer('makeblastdb'):
+            await run_tool(['makeblastdb', '-in', subject_path, '-dbtype', dbtype,
+                            '-out', tmp_dir / DB_NAME],
+                           timeout=MAKEBLASTDB_TIMEOUT, queue_timeout=queue_timeout)
+        try:
+            os.rename(tmp_dir, entry)
+        except OSError:
+            # Another process finished the same database first
+            if not entry.exists():
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+@asynccontextmanager
+async def subject_database(subject_path, dbtype, cache_dir=None, queue_timeout=None):
+    """
+    Path of a BLAST database for subject_path ('nucl' or 'prot').
+
+    The database is built on the first request for this content and reused
+    afterwards; it is not evicted while the block runs.
+    """
+    cache_dir = Path(cache_dir or CACHE_DIR)
+    key = await asyncio.to_thread(database_key, subject_path, dbtype)
+    entry = cache_dir / key
+    with _lock:
+        _in_use[key] += 1
+    try:
+        built = False
+        async with _key_lock(key):
+            if entry.exists():
+                metrics.inc('blastdb_cache_hits_total')
+            else:
+                metrics.inc('blastdb_cache_misses_total')
+                await _build(subject_path, dbtype, entry, queue_timeout)
+                built = True
+        os.utime(entry)
+        if built:
+            await asyncio.to_thread(evict, cache_dir)
+        yield str(entry / DB_NAME)
+    finally:
+        with _lock:
+            _in_use[key] -= 1
+            if not _in_use[key]:
+                del _in_use[key]
+                _key_locks.pop(key, None)
+
+
+def _entry_size(entry):
+    return sum(path.stat().st_size for path in entry.iterdir() if path.is_file())
+
+
+def evict(cache_dir=None, max_bytes=None):
+    """Remove idle least recently used databases beyond max_bytes, and abandoned builds"""
+    cache_dir = Path(cache_dir or CACHE_DIR)
+    max_bytes = max_bytes or MAX_BYTES
+    if not cache_dir.exists():
+        return 0
+
+    now = time.time()
+    entries = []
+    for entry in cache_dir.iterdir():
+        try:
+            used = entry.stat().st_mtime
+            if entry.suffix == '.tmp':
+                if now - used > MAKEBLASTDB_TIMEOUT * 10:
+                    shutil.rmtree(entry, ignore_errors=True)
+                continue
+            entries.append((used, _entry_size(entry), entry))
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+    entries.sort(key=lambda entry: entry[0])
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for used, size, entry in entries:
+        if total <= max_bytes:
+            break
+        with _lock:
+            busy = entry.name in _in_use
+        if busy or now - used < BUSY_SECONDS:
+            continue
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+        removed += 1
+    metrics.inc('blastdb_cache_evictions_total', removed)
+    return removed
@@ -0,0 +1,127 @@
+"""
+Incremental decoding and parsing of uploaded FASTA
+
+Upload bytes are fed in as they arrive: GenomeDecoder recognises gzip by its
+magic bytes and inflates every member in turn (so bgzip files, which are a
+series of small gzip members, work too), and FastaStreamParser hands back
+each contig as soon as the header of the next one (or the end of input)
+shows it is complete. Contig ids and sequences match SeqIO.parse(..., 'fasta').
+"""
+
+import zlib
+
+GZIP_MAGIC = b'\x1f\x8b'
+GZIP_SUFFIXES = ('.gz', '.bgz')
+FASTA_SUFFIXES = ('.fasta', '.fa', '.fna')
+
+
+def genome_filename(filename):
+    """Stored name of an uploaded genome (compression suffix dropped), or None if not FASTA"""
+    name = filename or ''
+    for suffix in GZIP_SUFFIXES:
+        if name.lower().endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    return name if name.lower().endswith(FASTA_SUFFIXES) else None
+
+
+class GenomeDecoder:
+    """Turns upload chunks into FASTA bytes, inflating gzip/bgzip members as they complete"""
+
+    def __init__(self):
+        self.compressed = None
+        self._head = b''
+        self._inflater = None
+        self._member_data = False
+
+    def feed(self, chunk):
+        if self.compressed is None:
+            self._head += chunk
+            if len(self._head) < len(GZIP_MAGIC):
+                return b''
+            self.compressed = self._head.startswith(GZIP_MAGIC)
+            chunk, self._head = self._head, b''
+        if not self.compressed:
+            return chunk
+
+        output = []
+        while chunk:
+            if self._inflater is None:
+                self._inflater = zlib.decompressobj(wbits=31)
+                self._member_data = False
+            try:
+                output.append(self._inflater.decompress(chunk))
+            except zlib.error as e:
+                raise ValueError(f"Corrupt gzip data: {e}")
+            self._member_data = True
+            if not self._inflater.eof:
+                break
+            # Next member (bgzip blocks, or files concatenated with cat)
+            chunk = self._inflater.unused_data
+            self._inflater = None
+        return b''.join(output)
+
+    def finish(self):
+        """Remaining bytes; raises ValueError for a truncated gzip stream"""
+        if self.compressed is None:
+            self.compressed = False
+            head, self._head = self._head, b''
+            return head
+        if self._inflater is not None and self._member_data:
+            raise ValueError("Truncated gzip data")
+        return b''
+
+
+class FastaStreamParser:
+    """
+    Incremental FASTA parser.
+
+    feed() and finish() return the [(contig_id, sequence)] completed so far.
+    Raises ValueError when text other than blank lines precedes the first
+    header.
+    """
+
+    def __init__(self):
+        self._partial = []
+        self._title = None
+        self._lines = []
+        self.num_contigs = 0
+
+    def feed(self, data):
+        if b'\n' not in data:
+            # Long unwrapped lines arrive in pieces; join them once
+            self._partial.append(data)
+            return []
+        lines = data.split(b'\n')
+        lines[0] = b''.join(self._partial) + lines[0]
+        self._partial = [lines.pop()]
+        return self._consume(lines)
+
+    def finish(self):
+        contigs = self._consume([b''.join(self._partial)])
+        self._partial = []
+        if self._title is not None:
+            contigs.append(self._contig())
+            self._title = None
+        if not self.num_contigs:
+            raise ValueError("No FASTA records found")
+        return contigs
+
+    def _consume(self, lines):
+        contigs = []
+        for line in lines:
+            if line.startswith(b'>'):
+                if self._title is not None:
+                    contigs.append(self._contig())
+                self._title = line[1:].rstrip()
+                self._lines = []
+            elif self._title is not None:
+                self._lines.append(line.rstrip().replace(b' ', b''))
+            elif line.strip():
+                raise ValueError("Not a FASTA file: expected a '>' header line")
+        return contigs
+
+    def _contig(self):
+        self.num_contigs += 1
+        contig_id = (self._title.split(None, 1) or [b''])[0].decode('ascii', errors='replace')
+        return contig_id, b''.join(self._lines).decode('ascii', errors='replace')
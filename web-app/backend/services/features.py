@@ -0,0 +1,86 @@
+"""
+Protein feature extraction shared by the web service and the training notebooks
+
+A batch of proteins is packed into one flat uint8 buffer plus an offsets
+array, and residue counts for the whole batch come from a single
+np.bincount, so composition, length and hydrophobic fraction are computed
+without a Python loop over residues. FEATURE_COLUMNS is the one column
+layout: the ML predictor and the training table (feature_frame) both use it,
+so a model trained in the notebooks can be served as is.
+"""
+
+import numpy as np
+
+# 20 standard amino acids (feature column order)
+AMINO_ACIDS = 'ACDEFGHIKLMNPQRSTVWY'
+HYDROPHOBIC = 'AILMFWYV'
+# Notebook training order: composition, length, hydrophobic fraction
+FEATURE_COLUMNS = [*AMINO_ACIDS, 'length', 'hydrophobic_frac']
+
+_OTHER = len(AMINO_ACIDS)
+_RESIDUE_INDEX = np.full(256, _OTHER, dtype=np.intp)
+for _idx, _aa in enumerate(AMINO_ACIDS):
+    _RESIDUE_INDEX[ord(_aa)] = _idx
+    _RESIDUE_INDEX[ord(_aa.lower())] = _idx
+
+_HYDROPHOBIC_COLUMNS = [AMINO_ACIDS.index(aa) for aa in HYDROPHOBIC]
+
+
+def pack_sequences(sequences):
+    """Concatenate sequences into one uint8 buffer with (N + 1) offsets"""
+    data = ''.join(sequences).encode('ascii', errors='replace')
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+    np.cumsum([len(seq) for seq in sequences], out=offsets[1:])
+    return buffer, offsets
+
+
+def residue_codes(buffer):
+    """Residue index (0-19 in AMINO_ACIDS order, 20 for anything else) per byte"""
+    return _RESIDUE_INDEX[buffer]
+
+
+def residue_counts(buffer, offsets):
+    """Per-sequence counts of the 20 amino acids plus non-standard residues, (N, 21)"""
+    n = len(offsets) - 1
+    rows = np.repeat(np.arange(n), np.diff(offsets))
+    flat = rows * (_OTHER + 1) + residue_codes(buffer)
+    return np.bincount(flat, minlength=n * (_OTHER + 1)).reshape(n, _OTHER + 1)
+
+
+def composition_features(sequences):
+    """
+    Feature matrix (N, 22) used by the ML predictor, in FEATURE_COLUMNS order.
+
+    Columns are the 20 amino-acid fractions in AMINO_ACIDS order, the
+    length in residues and the hydrophobic fraction; empty sequences give a
+    row of zeros.
+    """
+    buffer, offsets = pack_sequences(sequences)
+    counts = residue_counts(buffer, offsets)
+    lengths = np.diff(offsets).astype(float)
+    safe_lengths = np.where(lengths > 0, lengths, 1.0)[:, None]
+
+    features = np.empty((len(sequences), len(FEATURE_COLUMNS)))
+    features[:, :_OTHER] = counts[:, :_OTHER] / safe_lengths
+    features[:, _OTHER] = lengths
+    features[:, -1] = counts[:, _HYDROPHOBIC_COLUMNS].sum(axis=1) / safe_lengths[:, 0]
+    return features
+
+
+def feature_frame(sequences, ids=None):
+    """
+    Training table as a pandas DataFrame (one row per protein).
+
+    The columns are exactly composition_features() under FEATURE_COLUMNS
+    names, so every column of the frame is a model input.
+    """
+    import pandas as pd
+
+    features = composition_features(sequences)
+    if features.shape[1] != len(FEATURE_COLUMNS):
+        raise ValueError(f"{features.shape[1]} features for {len(FEATURE_COLUMNS)} columns")
+    frame = pd.DataFrame(features, columns=FEATURE_COLUMNS, index=ids)
+    if ids is not None:
+        frame.index.name = 'id'
+    return frame
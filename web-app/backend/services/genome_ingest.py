@@ -0,0 +1,203 @@
+"""
+Streaming genome uploads
+
+GenomeIngest takes the bytes of one uploaded genome as they arrive: they are
+decoded (plain, gzip or bgzip), hashed, written to a part file and parsed.
+With call_orfs, every finished contig is sent to the shared ORF process pool
+straight away, so ORF calling overlaps the rest of the upload instead of
+waiting for it. The file ID is the SHA-256 of the FASTA content, so a plain
+and a gzipped copy of a genome share their stored file and cached runs.
+
+multipart_files() reads a multipart/form-data body incrementally with the
+callback parser of python-multipart (the parser FastAPI itself uses), so the
+files of a batch upload are processed while they stream in rather than
+after the whole body has been spooled.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+
+from Bio import SeqIO
+
+from services import metrics
+from services.fasta_stream import FastaStreamParser, GenomeDecoder
+from services.orf_parallel import _contig_batch_orfs, get_pool
+from services.orf_prediction import find_orf_arrays
+from services.orf_table import OrfTable
+
+# Contig bases sent to a pool worker at a time while an upload streams in
+BATCH_SIZE = 1_000_000
+# Bytes of file data gathered before each decode/parse step
+CHUNK_SIZE = 1024 * 1024
+
+
+class GenomeIngest:
+    """One genome upload being decoded, hashed, stored and parsed as it arrives"""
+
+    def __init__(self, part_path, min_length=100, call_orfs=False):
+        self.path = Path(part_path)
+        self.min_length = min_length
+        self.call_orfs = call_orfs
+        self.bytes_received = 0
+        self._digest = hashlib.sha256()
+        self._decoder = GenomeDecoder()
+        self._parser = FastaStreamParser()
+        self._handle = open(self.path, 'wb')
+        self._contig_ids = []
+        # ([contig ids], future) per batch handed to the pool
+        self._batches = []
+        self._batch = []
+        self._batch_size = 0
+
+    def feed(self, chunk):
+        """Process the next bytes of the upload; raises ValueError for invalid input"""
+        self.bytes_received += len(chunk)
+        self._write(self._decoder.feed(chunk))
+
+    def _write(self, data):
+        if data:
+            self._digest.update(data)
+            self._handle.write(data)
+            self._add_contigs(self._parser.feed(data))
+
+    def _add_contigs(self, contigs):
+        for contig_id, sequence in contigs:
+            self._contig_ids.append(contig_id)
+            if self.call_orfs:
+                self._batch.append((contig_id, sequence))
+                self._batch_size += len(sequence)
+                if self._batch_size >= BATCH_SIZE:
+                    self._flush_batch()
+
+    def _flush_batch(self):
+        if self._batch:
+            future = get_pool().submit(_contig_batch_orfs, [sequence for _, sequence in self._batch],
+                                       self.min_length)
+            self._batches.append(([contig_id for contig_id, _ in self._batch], future))
+            self._batch, self._batch_size = [], 0
+
+    def finish(self):
+        """Complete the upload and return its file ID (the SHA-256 of the FASTA)"""
+        self._write(self._decoder.finish())
+        self._add_contigs(self._parser.finish())
+        self._flush_batch()
+        self._handle.close()
+        encoding = 'gzip' if self._decoder.compressed else 'identity'
+        metrics.inc('upload_bytes_total', self.bytes_received, encoding=encoding)
+        return self._digest.hexdigest()
+
+    def abort(self):
+        """Drop a failed upload: pending ORF batches and the part file"""
+        for _, future in self._batches:
+            future.cancel()
+        self._handle.close()
+        self.path.unlink(missing_ok=True)
+
+    @property
+    def num_contigs(self):
+        return len(self._contig_ids)
+
+    def orf_table(self, fasta_path):
+        """OrfTable of the finished upload, as predict_orf_table returns it (needs call_orfs)"""
+        with metrics.timer('orf_prediction', executor='stream') as timing:
+            table = OrfTable.from_contig_orfs(self._contig_orfs(fasta_path))
+            timing['items'] = len(table)
+        return table
+
+    def _contig_orfs(self, fasta_path):
+        index = None
+        for contig_ids, future in self._batches:
+            for contig_id, orfs in zip(contig_ids, future.result()):
+                if orfs is None:
+                    # Non-IUPAC symbols: same Biopython path as predict_orfs
+                    index = index or SeqIO.index(str(fasta_path), 'fasta')
+                    orfs = find_orf_arrays(index[contig_id].seq, self.min_length)
+                yield contig_id, orfs
+
+
+def _multipart_parser():
+    try:
+        from python_multipart.multipart import MultipartParser, parse_options_header
+    except ImportError:
+        from multipart.multipart import MultipartParser, parse_options_header
+    return MultipartParser, parse_options_header
+
+
+async def multipart_files(request, chunk_size=CHUNK_SIZE):
+    """
+    Files of a multipart/form-data request as they stream in.
+
+    Yields ('start', filename), then ('data', bytes) in pieces of about
+    chunk_size, then ('end', filename) for each file part; fields without
+    a filename are skipped. Raises ValueError for a non-multipart body.
+    """
+    MultipartParser, parse_options_header = _multipart_parser()
+    content_type, params = parse_options_header(request.headers.get('content-type', ''))
+    boundary = params.get(b'boundary')
+    if content_type != b'multipart/form-data' or not boundary:
+        raise ValueError("Expected a multipart/form-data upload")
+
+    events = []
+    part = {}
+
+    def on_part_begin():
+        part.update(headers={}, field=b'', value=b'', filename=None, buffer=[], size=0)
+
+    def on_header_field(data, start, end):
+        part['field'] += data[start:end]
+
+    def on_header_value(data, start, end):
+        part['value'] += data[start:end]
+
+    def on_header_end():
+        part['headers'][part['field'].lower()] = part['value']
+        part['field'], part['value'] = b'', b''
+
+    def on_headers_finished():
+        _, options = parse_options_header(part['headers'].get(b'content-disposition', b''))
+        filename = options.get(b'filename')
+        if filename is not None:
+            part['filename'] = filename.decode('utf-8', errors='replace')
+            events.append(('start', part['filename']))
+
+    def on_part_data(data, start, end):
+        if part['filename'] is not None:
+            part['buffer'].append(data[start:end])
+            part['size'] += end - start
+            if part['size'] >= chunk_size:
+                events.append(('data', b''.join(part['buffer'])))
+                part['buffer'], part['size'] = [], 0
+
+    def on_part_end():
+        if part['filename'] is not None:
+            if part['buffer']:
+                events.append(('data', b''.join(part['buffer'])))
+            events.append(('end', part['filename']))
+
+    parser = MultipartParser(boundary, {
+        'on_part_begin': on_part_begin,
+        'on_header_field': on_header_field,
+        'on_header_value': on_header_value,
+        'on_header_end': on_header_end,
+        'on_headers_finished': on_headers_finished,
+        'on_part_data': on_part_data,
+        'on_part_end': on_part_end
+    })
+    async for chunk in request.stream():
+        parser.write(chunk)
+        while events:
+            yield events.pop(0)
+    parser.finalize()
+    while events:
+        yield events.pop(0)
+
+
+def save_upload(ingest, upload_dir, filename):
+    """Finish an upload and move it to upload_dir as {file_id}_{filename}; returns the file ID"""
+    file_id = ingest.finish()
+    if next(Path(upload_dir).glob(f"{file_id}_*"), None) is None:
+        os.replace(ingest.path, Path(upload_dir) / f"{file_id}_{Path(filename).name}")
+    else:
+        ingest.path.unlink()
+    return file_id
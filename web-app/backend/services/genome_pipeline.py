@@ -0,0 +1,141 @@
+"""
+Server-side genome pipeline
+
+Runs ORF calling -> ML -> BLAST -> SignalP -> scoring on an uploaded genome
+as one background job, so ORF sequences never travel to the browser and
+back. The job result is the scored table only; the protein sequences are
+written to the run directory as FASTA with an on-disk index and can be
+fetched by ORF id when needed.
+
+Runs are cached on disk by genome hash, pipeline/model/VFDB versions and
+parameters (see result_cache), so resubmitting a genome returns the stored
+table without running anything.
+"""
+
+import threading
+
+from Bio import SeqIO
+
+from services import result_cache
+from services.blast_cache import database_version
+from services.blast_service import VFDB_PATH
+from services.ml_prediction import model_version
+from services.orf_prediction import predict_orf_table, table_summary
+from services.orf_parallel import predict_orf_table_parallel
+from services.orf_table import OrfTable
+from services.result_store import build_store, store_path
+from services.vf_pipeline import SCORE_FIELDS, score_columns
+from services.job_queue import SCORE_STAGES, get_job, record_finished, run_stages, submit
+
+# Bump when a change to the pipeline alters its results (invalidates cached runs)
+PIPELINE_VERSION = 3
+PIPELINE_STAGES = ['orfs'] + SCORE_STAGES
+SEQUENCES_FILE = 'orfs.faa'
+SEQUENCE_INDEX_FILE = 'orfs.idx'
+TABLE_FILE = 'table.npz'
+
+# Fields of a scored table row: /api/vf_score's plus the ORF coordinates
+SCORED_FIELDS = SCORE_FIELDS + ('contig', 'start', 'end', 'strand', 'frame')
+
+_submit_lock = threading.Lock()
+
+
+def write_sequences(run_dir, table):
+    """Write ORF proteins as FASTA and build its SQLite index for lookups by id"""
+    fasta_path = run_dir / SEQUENCES_FILE
+    index_path = run_dir / SEQUENCE_INDEX_FILE
+    # An index left by an interrupted run would not match the new FASTA
+    index_path.unlink(missing_ok=True)
+    with open(fasta_path, 'w') as handle:
+        for orf_id, sequence in zip(table.orf_ids(), table.sequences()):
+            handle.write(f">{orf_id}\n{sequence}\n")
+    index = SeqIO.index_db(str(index_path), str(fasta_path), 'fasta')
+    index.close()
+
+
+def get_sequences(run_dir, orf_ids):
+    """Protein sequences of the given ORFs in a finished run (missing ids are left out)"""
+    index_path = run_dir / SEQUENCE_INDEX_FILE
+    if not index_path.exists():
+        return None
+    index = SeqIO.index_db(str(index_path))
+    try:
+        return {orf_id: str(index[orf_id].seq) for orf_id in orf_ids if orf_id in index}
+    finally:
+        index.close()
+
+
+def run_pipeline(progress, genome_path, run_dir, min_length=100, parallel=True, orf_table=None):
+    """
+    Job runner: predict ORFs in the genome, score them and return the table.
+
+    orf_table skips ORF calling when the ORFs were already predicted (e.g.
+    while the genome was being uploaded).
+    """
+    progress(stage='orfs')
+    table = orf_table
+    if table is None:
+        # ORFs go straight into columns, never one dict each
+        predictor = predict_orf_table_parallel if parallel else predict_orf_table
+        table = predictor(str(genome_path), min_length)
+
+    run_dir.mkdir(parents=True, exist_ok=True)
+    write_sequences(run_dir, table)
+    summary = table_summary(table)
+    progress(orfs_total=len(table), summary=summary, fields=SCORED_FIELDS)
+
+    stage_results = run_stages(progress, table.sequences())
+    for name, values in score_columns(*stage_results).items():
+        table.set_column(name, values)
+    table.save(run_dir / TABLE_FILE)
+    build_store(run_dir, table)
+    result_cache.save(run_dir, {'summary': summary})
+    return table
+
+
+def ensure_store(run_dir):
+    """Build the query store of a finished run that was cached without one"""
+    if store_path(run_dir).exists() or result_cache.load(run_dir) is None:
+        return
+    build_store(run_dir, OrfTable.load(run_dir / TABLE_FILE))
+
+
+def pipeline_key(genome_hash, min_length=100):
+    """Cache key of a pipeline run over a genome with the current code, model and VFDB"""
+    return result_cache.run_key(
+        genome=genome_hash,
+        pipeline=PIPELINE_VERSION,
+        model=model_version(),
+        vfdb=database_version(VFDB_PATH) if VFDB_PATH.exists() else None,
+        min_length=min_length
+    )
+
+
+def submit_pipeline(genome_path, genome_hash, min_length=100, parallel=True, orf_table=None):
+    """
+    Start (or reuse) the pipeline run for an uploaded genome.
+
+    orf_table holds ORFs already predicted with min_length, if any (see
+    run_pipeline). Returns (run_id, cached). A run already in the cache is registered as a
+    finished job straight away, and an identical run still in progress is
+    shared instead of started twice.
+    """
+    run_id = pipeline_key(genome_hash, min_length)
+    run_dir = result_cache.entry_dir(run_id)
+    with _submit_lock:
+        job = get_job(run_id)
+        if job is not None and job['status'] in ('queued', 'running'):
+            return run_id, False
+        if job is not None and job['status'] == 'done':
+            # Finished earlier in this process: served from its results
+            return run_id, True
+
+        cached = result_cache.load(run_dir)
+        if cached is not None:
+            record_finished(run_id, OrfTable.load(run_dir / TABLE_FILE), kind='pipeline',
+                            stages=PIPELINE_STAGES, summary=cached['summary'], fields=SCORED_FIELDS)
+            return run_id, True
+
+        submit(run_pipeline, genome_path, run_dir, min_length, parallel, orf_table,
+               kind='pipeline', stages=PIPELINE_STAGES, job_id=run_id)
+        return run_id, False
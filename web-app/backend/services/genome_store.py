@@ -0,0 +1,261 @@
+"""
+Memory-mapped 2-bit genome store
+
+Uploaded assemblies are converted once into the UCSC .2bit layout: a header,
+an index of contig names and file offsets, then per contig its length, the
+runs of N, the runs of soft-masked (lowercase) bases and the bases packed
+four per byte (T=0, C=1, A=2, G=3). GenomeStore maps the file read-only and
+unpacks only the bytes covering a requested slice, so ORF calling and region
+lookups never parse FASTA text or load the whole genome.
+
+The layout can only hold A, C, G, T and N; assemblies with other IUPAC
+ambiguity codes are rejected by pack_fasta() and stay FASTA-only.
+"""
+
+import os
+import struct
+from collections import namedtuple
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+from Bio.SeqIO.FastaIO import SimpleFastaParser
+
+from services.orf_engine import IUPAC, reverse_complement_codes
+
+STORE_SUFFIX = '.2bit'
+SIGNATURE = 0x1A412743
+MAX_NAME_BYTES = 255
+
+# Byte -> 2-bit code (T, C, A, G order); 4 marks N, 255 anything else
+_PACK = np.full(256, 255, dtype=np.uint8)
+for _code, _base in enumerate('TCAG'):
+    _PACK[ord(_base)] = _PACK[ord(_base.lower())] = _code
+_PACK[ord('N')] = _PACK[ord('n')] = 4
+
+# Packed byte -> its four bases as orf_engine IUPAC codes
+_TWO_BIT_CODES = np.array([IUPAC.index(base) for base in 'TCAG'], dtype=np.uint8)
+_UNPACK = _TWO_BIT_CODES[(np.arange(256)[:, None] >> np.array([6, 4, 2, 0])) & 3]
+_N_CODE = IUPAC.index('N')
+_LETTERS = np.frombuffer(IUPAC.encode(), dtype=np.uint8)
+
+# A contig slice that worker processes can read from the store by path
+StoreSlice = namedtuple('StoreSlice', 'path contig start end strand')
+
+_Contig = namedtuple('_Contig', 'length n_starts n_sizes mask_starts mask_sizes offset')
+
+
+def _runs(mask):
+    """(starts, sizes) of the runs of True in a boolean array"""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.view(np.int8), [0]))))
+    return edges[::2], edges[1::2] - edges[::2]
+
+
+def _pack_contig(sequence):
+    """Record bytes (length, N runs, mask runs, packed bases) of one contig"""
+    raw = np.frombuffer(sequence.encode('ascii', errors='replace'), dtype=np.uint8)
+    codes = _PACK[raw]
+    if codes.size and codes.max() == 255:
+        raise ValueError("Only A, C, G, T and N can be stored in 2-bit form")
+
+    n_starts, n_sizes = _runs(codes == 4)
+    mask_starts, mask_sizes = _runs(raw >= ord('a'))
+    codes[codes == 4] = 0
+    padded = np.zeros(-(-len(codes) // 4) * 4, dtype=np.uint8)
+    padded[:len(codes)] = codes
+    quads = padded.reshape(-1, 4)
+    packed = (quads[:, 0] << 6) | (quads[:, 1] << 4) | (quads[:, 2] << 2) | quads[:, 3]
+
+    parts = [struct.pack('<II', len(raw), len(n_starts)),
+             n_starts.astype('<u4').tobytes(), n_sizes.astype('<u4').tobytes(),
+             struct.pack('<I', len(mask_starts)),
+             mask_starts.astype('<u4').tobytes(), mask_sizes.astype('<u4').tobytes(),
+             struct.pack('<I', 0), packed.astype(np.uint8).tobytes()]
+    return b''.join(parts)
+
+
+def pack_fasta(fasta_path, store_path):
+    """
+    Convert a FASTA file into a .2bit store (written atomically).
+
+    Contig names are the first word of each header, like SeqIO record ids.
+    Raises ValueError for sequence other than A/C/G/T/N or over-long names.
+    """
+    store_path = Path(store_path)
+    data_path = store_path.with_name(store_path.name + '.data')
+    tmp_path = store_path.with_name(store_path.name + '.tmp')
+    names, sizes = [], []
+    try:
+        # Contig records go to a side file first, since the index that
+        # precedes them needs every name
+        with open(fasta_path) as handle, open(data_path, 'wb') as data:
+            for title, sequence in SimpleFastaParser(handle):
+                name = (title.split(None, 1) or [''])[0].encode()
+                if len(name) > MAX_NAME_BYTES:
+                    raise ValueError(f"Contig name too long for 2-bit: {name[:40]!r}...")
+                try:
+                    record = _pack_contig(sequence)
+                except ValueError as e:
+                    raise ValueError(f"{e} (contig {name.decode()})")
+                data.write(record)
+                names.append(name)
+                sizes.append(len(record))
+
+        index_size = sum(1 + len(name) + 4 for name in names)
+        offset = 16 + index_size
+        if offset + sum(sizes) >= 2 ** 32:
+            raise ValueError("Genome too large for the 2-bit format")
+
+        with open(tmp_path, 'wb') as out, open(data_path, 'rb') as data:
+            out.write(struct.pack('<IIII', SIGNATURE, 0, len(names), 0))
+            for name, size in zip(names, sizes):
+                out.write(struct.pack('<B', len(name)) + name + struct.pack('<I', offset))
+                offset += size
+            while chunk := data.read(1024 * 1024):
+                out.write(chunk)
+        os.replace(tmp_path, store_path)
+    finally:
+        data_path.unlink(missing_ok=True)
+        tmp_path.unlink(missing_ok=True)
+    return store_path
+
+
+def is_store(path):
+    return Path(path).suffix == STORE_SUFFIX
+
+
+class GenomeStore:
+    """Read-only view of a .2bit file; sequence is unpacked per requested slice"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.data = np.memmap(self.path, dtype=np.uint8, mode='r')
+        signature = int(self.data[:4].view('<u4')[0])
+        if signature == SIGNATURE:
+            self._order = '<'
+        elif int(self.data[:4].view('>u4')[0]) == SIGNATURE:
+            self._order = '>'
+        else:
+            raise ValueError(f"{path} is not a 2-bit file")
+        _, count, _ = self._uint32(4, 3)
+
+        self._contigs = {}
+        position = 16
+        for _ in range(count):
+            name_size = int(self.data[position])
+            name = self.data[position + 1:position + 1 + name_size].tobytes().decode()
+            offset = int(self._uint32(position + 1 + name_size, 1)[0])
+            self._contigs[name] = self._read_contig(offset)
+            position += 1 + name_size + 4
+
+    def _uint32(self, position, count):
+        return self.data[position:position + 4 * count].view(self._order + 'u4').astype(np.int64)
+
+    def _read_contig(self, offset):
+        length, n_count = self._uint32(offset, 2)
+        n_blocks = self._uint32(offset + 8, 2 * n_count)
+        position = offset + 8 + 8 * n_count
+        mask_count = self._uint32(position, 1)[0]
+        mask_blocks = self._uint32(position + 4, 2 * mask_count)
+        packed_offset = position + 4 + 8 * mask_count + 4
+        return _Contig(int(length), n_blocks[:n_count], n_blocks[n_count:],
+                       mask_blocks[:mask_count], mask_blocks[mask_count:], int(packed_offset))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.data = None
+
+    def __len__(self):
+        return len(self._contigs)
+
+    def __contains__(self, name):
+        return name in self._contigs
+
+    @property
+    def contigs(self):
+        return list(self._contigs)
+
+    @property
+    def lengths(self):
+        """{contig: length in bp}"""
+        return {name: contig.length for name, contig in self._contigs.items()}
+
+    def _bounds(self, name, start, end):
+        if name not in self._contigs:
+            raise KeyError(name)
+        length = self._contigs[name].length
+        start, end, _ = slice(start, end).indices(length)
+        return self._contigs[name], start, max(start, end)
+
+    def codes(self, name, start=0, end=None):
+        """Bases [start, end) of a contig as orf_engine IUPAC codes"""
+        contig, start, end = self._bounds(name, start, end)
+        first, last = start // 4, -(-end // 4)
+        packed = self.data[contig.offset + first:contig.offset + last]
+        codes = _UNPACK[packed].ravel()[start - first * 4:end - first * 4]
+        for block_start, block_size in _overlapping(contig.n_starts, contig.n_sizes, start, end):
+            codes[max(block_start - start, 0):block_start + block_size - start] = _N_CODE
+        return codes
+
+    def sequence(self, name, start=0, end=None):
+        """Bases [start, end) of a contig as a string, soft-masked runs in lowercase"""
+        contig, start, end = self._bounds(name, start, end)
+        letters = _LETTERS[self.codes(name, start, end)]
+        for block_start, block_size in _overlapping(contig.mask_starts, contig.mask_sizes, start, end):
+            block = slice(max(block_start - start, 0), block_start + block_size - start)
+            letters[block] = letters[block] | 0x20
+        return letters.tobytes().decode('ascii')
+
+    def slice(self, name, start=0, end=None, strand=1):
+        """StoreSlice of a contig region for another process to read"""
+        _, start, end = self._bounds(name, start, end)
+        return StoreSlice(self.path, name, start, end, strand)
+
+
+def _overlapping(starts, sizes, start, end):
+    """(start, size) of the blocks overlapping [start, end)"""
+    first = np.searchsorted(starts + sizes, start, side='right')
+    last = np.searchsorted(starts, end, side='left')
+    return zip(starts[first:last].tolist(), sizes[first:last].tolist())
+
+
+@lru_cache(maxsize=8)
+def open_store(path):
+    """GenomeStore shared by the callers in this process (stores are never rewritten in place)"""
+    return GenomeStore(path)
+
+
+def slice_codes(store_slice):
+    """IUPAC codes of a StoreSlice, reverse-complemented for strand -1"""
+    path, name, start, end, strand = store_slice
+    codes = open_store(path).codes(name, start, end)
+    return codes if strand == 1 else reverse_complement_codes(codes)
+
+
+class StrandView:
+    """
+    One strand of a stored contig, sliced like a sequence string.
+
+    Slicing returns StoreSlice objects rather than bases, so chunks of a
+    large contig can be handed to pool workers without copying sequence.
+    Reverse-strand coordinates count from the contig end, as in the
+    reverse complement string.
+    """
+
+    def __init__(self, path, name, length, strand=1):
+        self.path, self.name, self.length, self.strand = str(path), name, length, strand
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, key):
+        start, end, _ = key.indices(self.length)
+        end = max(start, end)
+        if self.strand == -1:
+            start, end = self.length - end, self.length - start
+        return StoreSlice(self.path, self.name, start, end, self.strand)
@@ -0,0 +1,203 @@
+"""
+In-process job queue for VF scoring
+
+Submitting a job returns its id immediately. A small coordinator thread pool
+runs queued jobs stage by stage (see vf_pipeline.STAGES), splitting each
+stage into batches: the Python-heavy stages go to the shared process pool,
+while BLAST runs from the coordinator thread since blastp is already a
+multi-threaded subprocess. Progress (stage, ORFs done/total) is updated as
+batches finish and results can be read back in pages. No external broker is
+needed; jobs live in memory until they expire.
+
+A runner is called as runner(progress, *args); progress(**fields) updates
+the job record and raises JobCancelled once the job has been cancelled.
+"""
+
+import functools
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from services import metrics
+from services.orf_parallel import get_pool
+from services.vf_pipeline import STAGES, combine_scores
+
+# Jobs run at the same time (each one fans out over the process pool)
+MAX_RUNNING_JOBS = 2
+BATCH_SIZE = 500
+# Finished jobs are kept this long (seconds) for polling and result paging
+JOB_TTL = 3600
+
+# Stages executed in the coordinator thread instead of the process pool
+THREAD_STAGES = {'blast'}
+# Stage names reported by scoring jobs, in order
+SCORE_STAGES = [name for name, _ in STAGES] + ['scoring']
+
+_jobs = {}
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=MAX_RUNNING_JOBS, thread_name_prefix='vf-job')
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _purge_expired():
+    now = time.time()
+    for job_id in [job_id for job_id, job in _jobs.items()
+                   if job['finished'] and now - job['finished'] > JOB_TTL]:
+        del _jobs[job_id]
+
+
+def _update(job_id, **fields):
+    with _lock:
+        job = _jobs[job_id]
+        if job['cancelled'] and fields.get('status') not in ('cancelled', 'failed'):
+            raise JobCancelled()
+        job.update(fields)
+
+
+def _run_job(job_id, runner, args):
+    """Coordinator: run the job's stages and record progress"""
+    progress = functools.partial(_update, job_id)
+    try:
+        progress(status='running', started=time.time())
+        result = runner(progress, *args)
+        progress(status='done', stage='done', results=result, finished=time.time())
+    except JobCancelled:
+        with _lock:
+            _jobs[job_id].update(status='cancelled', finished=time.time())
+    except Exception as e:
+        with _lock:
+            _jobs[job_id].update(status='failed', error=str(e), finished=time.time())
+
+
+def run_stages(progress, sequences):
+    """Run every scoring stage over the sequences in batches; returns one result list per stage"""
+    batches = [sequences[i:i + BATCH_SIZE] for i in range(0, len(sequences), BATCH_SIZE)]
+    stage_results = []
+
+    for name, run in STAGES:
+        progress(stage=name, orfs_done=0)
+        results = []
+        if name in THREAD_STAGES:
+            for batch in batches:
+                results.extend(run(batch))
+                progress(orfs_done=len(results))
+        else:
+            # Worker processes keep their own metrics, so pool stages are timed here
+            with metrics.timer(name, len(sequences), executor='pool'):
+                pool = get_pool()
+                futures = [pool.submit(run, batch) for batch in batches]
+                done = 0
+                for future in futures:
+                    batch_results = future.result()
+                    results.extend(batch_results)
+                    done += len(batch_results)
+                    progress(orfs_done=done)
+        stage_results.append(results)
+
+    progress(stage='scoring')
+    return stage_results
+
+
+def score_stages(progress, orfs):
+    """Runner for VF scoring jobs"""
+    stage_results = run_stages(progress, [orf['sequence'] for orf in orfs])
+    return combine_scores(orfs, *stage_results)
+
+
+def submit(runner, *args, kind='vf_score', stages=None, total=0, job_id=None):
+    """Queue runner(progress, *args) as a job and return its id"""
+    job_id = job_id or str(uuid.uuid4())
+    with _lock:
+        _purge_expired()
+        _jobs[job_id] = {
+            'job_id': job_id,
+            'kind': kind,
+            'status': 'queued',
+            'stage': 'queued',
+            'stages': stages or SCORE_STAGES,
+            'orfs_done': 0,
+            'orfs_total': total,
+            'created': time.time(),
+            'started': None,
+            'finished': None,
+            'error': None,
+            'cancelled': False,
+            'results': None
+        }
+    _executor.submit(_run_job, job_id, runner, args)
+    return job_id
+
+
+def record_finished(job_id, results, kind='vf_score', stages=None, **fields):
+    """Register an already finished job (e.g. a cached run) so its results can be paged"""
+    now = time.time()
+    with _lock:
+        _purge_expired()
+        _jobs[job_id] = dict({
+            'job_id': job_id,
+            'kind': kind,
+            'status': 'done',
+            'stage': 'done',
+            'stages': stages or SCORE_STAGES,
+            'orfs_done': len(results),
+            'orfs_total': len(results),
+            'created': now,
+            'started': now,
+            'finished': now,
+            'error': None,
+            'cancelled': False,
+            'results': results
+        }, **fields)
+    return job_id
+
+
+def submit_job(orfs):
+    """Queue VF scoring of ORFs and return the job id"""
+    return submit(score_stages, orfs, total=len(orfs))
+
+
+def get_job(job_id):
+    """Status and progress of a job (without results), or None if unknown"""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        status = {k: v for k, v in job.items() if k not in ('results', 'cancelled', 'fields')}
+        status['num_results'] = len(job['results']) if job['results'] is not None else 0
+        return status
+
+
+def get_job_results(job_id, offset=0, limit=100):
+    """One page of a finished job's results, or None if unknown"""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        results = job['results'] if job['results'] is not None else []
+        page = results[offset:offset + limit]
+        if hasattr(page, 'to_records'):
+            # Columnar results (OrfTable) are turned into dicts one page at a time
+            page = page.to_records(job.get('fields'))
+        return {
+            'job_id': job_id,
+            'status': job['status'],
+            'orfs': page,
+            'total': len(results),
+            'offset': offset,
+            'limit': limit
+        }
+
+
+def cancel_job(job_id):
+    """Ask a queued or running job to stop at the next batch boundary"""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return False
+        if job['status'] in ('queued', 'running'):
+            job['cancelled'] = True
+        return True
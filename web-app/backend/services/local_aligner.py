@@ -0,0 +1,246 @@
+"""
+NumPy Smith-Waterman fallback for VFDB searches without BLAST+
+
+Local alignment with BLOSUM62 and BLAST's default affine gap costs
+(open 11, extend 1). The dynamic programming runs one query residue at a
+time, vectorized over all cells of a row and over a batch of length-bucketed
+subjects; horizontal gaps are resolved with a running maximum instead of a
+per-cell loop. Only the best subject is re-aligned with traceback to get
+percent identity. Scores are converted to bit scores and e-values with the
+Karlin-Altschul parameters BLAST uses for BLOSUM62 11/1.
+"""
+
+import math
+
+import numpy as np
+
+from services.features import AMINO_ACIDS, pack_sequences, residue_codes
+
+GAP_OPEN = 11
+GAP_EXTEND = 1
+EVALUE_CUTOFF = 1e-5
+
+# Gapped Karlin-Altschul parameters for BLOSUM62, gap costs 11/1
+KA_LAMBDA = 0.267
+KA_K = 0.041
+
+# Upper bound on DP cells per batch (subjects x padded length)
+BATCH_CELLS = 2_000_000
+
+# Diagonal band for VFDB searches; wide enough for the indels of real homologs
+BAND = 64
+
+_PAD = len(AMINO_ACIDS) + 1
+_matrix = []
+
+
+def substitution_matrix():
+    """BLOSUM62 as a (22, 22) int array indexed by residue code; the last row/column is padding"""
+    if not _matrix:
+        from Bio.Align import substitution_matrices
+
+        blosum = substitution_matrices.load('BLOSUM62')
+        letters = AMINO_ACIDS + 'X'
+        scores = np.full((_PAD + 1, _PAD + 1), -(GAP_OPEN + GAP_EXTEND) * 100, dtype=np.int32)
+        for i, a in enumerate(letters):
+            for j, b in enumerate(letters):
+                scores[i, j] = int(blosum[a, b])
+        _matrix.append(scores)
+    return _matrix[0]
+
+
+def encode_protein(sequence):
+    """Residue codes of a protein (0-19 standard, 20 anything else)"""
+    buffer, _ = pack_sequences([sequence])
+    return residue_codes(buffer).astype(np.uint8)
+
+
+def sw_scores(query, subjects, band=None):
+    """
+    Best local alignment score of an encoded query against each encoded subject.
+
+    subjects is a list of residue-code arrays scored together as one padded
+    batch. With band set, only cells within band of the main diagonal
+    (widened by the length difference) are computed, so a query row costs
+    O(band) instead of O(subject length).
+    """
+    if not len(query) or not subjects:
+        return np.zeros(len(subjects), dtype=np.int32)
+
+    scores = substitution_matrix()
+    length = max(len(s) for s in subjects)
+    padded = np.full((len(subjects), length), _PAD, dtype=np.intp)
+    for row, subject in enumerate(subjects):
+        padded[row, :len(subject)] = subject
+
+    open_extend = GAP_OPEN + GAP_EXTEND
+    col_bonus = GAP_EXTEND * np.arange(1, length + 1, dtype=np.int32)
+    if band is not None:
+        upper = np.maximum(np.array([len(s) for s in subjects]) - len(query), 0)[:, None] + band
+        widest = int(upper.max())
+
+    h_prev = np.zeros((len(subjects), length + 1), dtype=np.int32)
+    f = np.full((len(subjects), length), -open_extend, dtype=np.int32)
+    best = np.zeros(len(subjects), dtype=np.int32)
+
+    for i, residue in enumerate(query):
+        # Subject columns lo..hi (1-based) of this query row; cells outside stay 0
+        lo, hi = 1, length
+        if band is not None:
+            lo, hi = max(i + 1 - band, 1), min(i + 1 + widest, length)
+            if lo > hi:
+                break
+        window = slice(lo - 1, hi)
+
+        # Vertical gaps (along the query) and diagonal moves
+        f[:, window] = np.maximum(h_prev[:, lo:hi + 1] - open_extend, f[:, window] - GAP_EXTEND)
+        h = np.maximum(h_prev[:, lo - 1:hi] + scores[residue][padded[:, window]], f[:, window])
+        np.maximum(h, 0, out=h)
+
+        # Horizontal gaps: E[j] = max_{k<j} H[k] - open - extend * (j - k)
+        bonus = col_bonus[window]
+        reach = np.maximum.accumulate(h + bonus, axis=1)
+        e = np.empty_like(h)
+        e[:, 0] = -open_extend
+        e[:, 1:] = reach[:, :-1] - bonus[1:] - GAP_OPEN
+        np.maximum(h, e, out=h)
+
+        if band is not None:
+            # Subjects shorter than the widest one have a narrower band
+            h[np.arange(lo, hi + 1)[None, :] - (i + 1) > upper] = 0
+        np.maximum(best, h.max(axis=1), out=best)
+        h_prev[:, lo:hi + 1] = h
+    return best
+
+
+def align_pair(query, subject):
+    """
+    Full Smith-Waterman with traceback for one encoded pair.
+
+    Returns (score, identities, alignment_length).
+    """
+    scores = substitution_matrix()
+    open_extend = GAP_OPEN + GAP_EXTEND
+    n, m = len(query), len(subject)
+    H = np.zeros((n + 1, m + 1), dtype=np.int32)
+    E = np.full((n + 1, m + 1), -open_extend, dtype=np.int32)
+    F = np.full((n + 1, m + 1), -open_extend, dtype=np.int32)
+    col_bonus = GAP_EXTEND * np.arange(1, m + 1, dtype=np.int32)
+    subject = subject.astype(np.intp)
+
+    for i in range(1, n + 1):
+        F[i, 1:] = np.maximum(H[i - 1, 1:] - open_extend, F[i - 1, 1:] - GAP_EXTEND)
+        h = np.maximum(H[i - 1, :-1] + scores[query[i - 1]][subject], F[i, 1:])
+        np.maximum(h, 0, out=h)
+        reach = np.maximum.accumulate(h + col_bonus)
+        E[i, 2:] = reach[:-1] - col_bonus[1:] - GAP_OPEN
+        H[i, 1:] = np.maximum(h, E[i, 1:])
+
+    i, j = np.unravel_index(int(np.argmax(H)), H.shape)
+    best = int(H[i, j])
+    identities = columns = 0
+    state = 'H'
+    while i > 0 and j > 0:
+        if state == 'H':
+            if H[i, j] == 0:
+                break
+            if H[i, j] == H[i - 1, j - 1] + scores[query[i - 1], subject[j - 1]]:
+                identities += int(query[i - 1] == subject[j - 1])
+                i, j = i - 1, j - 1
+            elif H[i, j] == E[i, j]:
+                state = 'E'
+                continue
+            else:
+                state = 'F'
+                continue
+        elif state == 'E':
+            if E[i, j] == H[i, j - 1] - open_extend:
+                state = 'H'
+            j -= 1
+        else:
+            if F[i, j] == H[i - 1, j] - open_extend:
+                state = 'H'
+            i -= 1
+        columns += 1
+
+    return best, identities, columns
+
+
+def bit_score(raw_score):
+    """Normalized bit score of a raw alignment score"""
+    return (KA_LAMBDA * raw_score - math.log(KA_K)) / math.log(2)
+
+
+def evalue(raw_score, query_len, db_len):
+    """Expected number of chance hits scoring at least raw_score"""
+    return KA_K * query_len * db_len * math.exp(-KA_LAMBDA * raw_score)
+
+
+def search(sequence, subjects, subject_ids, db_len, band=None, evalue_cutoff=EVALUE_CUTOFF):
+    """
+    Align one protein against candidate subjects and report the best hit.
+
+    subjects are encoded sequences (see encode_protein); the result has the
+    same shape as blast_service.run_blast_vfdb.
+    """
+    from services.blast_service import identity_score, no_hit_result
+
+    query = encode_protein(sequence)
+    if not len(query) or not subjects:
+        return no_hit_result()
+
+    # Length-bucketed batches keep padding (and wasted cells) small
+    order = sorted(range(len(subjects)), key=lambda s: len(subjects[s]))
+    best_scores = np.zeros(len(subjects), dtype=np.int32)
+    start = 0
+    while start < len(order):
+        stop = start + 1
+        while stop < len(order) and (stop - start + 1) * len(subjects[order[stop]]) <= BATCH_CELLS:
+            stop += 1
+        batch = order[start:stop]
+        best_scores[batch] = sw_scores(query, [subjects[s] for s in batch], band)
+        start = stop
+
+    top = int(np.argmax(best_scores))
+    raw = int(best_scores[top])
+    expect = evalue(raw, len(query), db_len)
+    if raw <= 0 or expect > evalue_cutoff:
+        return no_hit_result()
+
+    _, identities, columns = align_pair(query, subjects[top])
+    identity = round(100.0 * identities / columns, 3) if columns else 0.0
+    return {
+        'has_hit': True,
+        'identity': identity,
+        'evalue': float(f"{expect:.2g}"),
+        'bitscore': round(bit_score(raw), 1),
+        'score': identity_score(identity),
+        'top_hit': subject_ids[top]
+    }
+
+
+def search_vfdb(sequences, band=None):
+    """
+    VFDB hits for many proteins without BLAST+.
+
+    Each protein is only aligned against the VFDB subjects the k-mer
+    prefilter nominates. Returns one result per sequence; the VFDB FASTA
+    must exist.
+    """
+    from services import vfdb_prefilter
+    from services.blast_service import no_hit_result
+
+    index = vfdb_prefilter.load_index()
+    if index is None:
+        raise FileNotFoundError(f"VFDB not found at {vfdb_prefilter.VFDB_PATH}")
+
+    residues, offsets, ids = index['residues'], index['offsets'], index['ids']
+    db_len = int(offsets[-1])
+    results = []
+    for sequence, candidates in zip(sequences, vfdb_prefilter.candidate_subjects(sequences, index)):
+        if not len(candidates):
+            results.append(no_hit_result())
+            continue
+        subjects = [np.asarray(residues[offsets[s]:offsets[s + 1]]) for s in candidates]
+        results.append(search(sequence, subjects, [ids[s] for s in candidates], db_len, band))
+    return results
@@ -0,0 +1,181 @@
+"""
+In-process metrics for the scoring pipeline
+
+Counters, gauges and timers keyed by name and labels, rendered in the Prometheus
+text format at /metrics. Timers record a summary (<name>_count and
+<name>_sum seconds) and, when a request is being traced, also add their
+wall time to that request's breakdown (returned as a Server-Timing header).
+
+Only the process that does the work records it: stages run inside the
+shared process pool are timed by the coordinator that dispatches them.
+"""
+
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = 'vf_'
+
+_counters = {}
+_gauges = {}
+_summaries = {}
+_help = {}
+_lock = threading.Lock()
+
+# Per-request {stage: seconds} while a traced request is being handled
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+def _key(name, labels):
+    return PREFIX + name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def describe(name, text):
+    """Attach HELP text to a metric"""
+    _help[PREFIX + name] = text
+
+
+def inc(name, value=1, **labels):
+    """Add to a counter"""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def add_gauge(name, delta, **labels):
+    """Move a gauge (a level such as a queue depth) up or down"""
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = _gauges.get(key, 0) + delta
+
+
+def observe(name, seconds, **labels):
+    """Record one duration in a summary"""
+    key = _key(name, labels)
+    with _lock:
+        count, total = _summaries.get(key, (0, 0.0))
+        _summaries[key] = (count + 1, total + seconds)
+
+
+@contextmanager
+def timer(stage, items=None, **labels):
+    """
+    Time a block as a pipeline stage.
+
+    Records stage_seconds{stage} and, when items is given (or set on the
+    yielded dict), adds it to stage_items_total{stage}.
+    """
+    info = {'items': items}
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        elapsed = time.perf_counter() - start
+        observe('stage_seconds', elapsed, stage=stage, **labels)
+        if info['items'] is not None:
+            inc('stage_items_total', info['items'], stage=stage, **labels)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def timed(stage):
+    """Decorator form of timer(); items is the length of the first argument when it has one"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            items = len(args[0]) if args and hasattr(args[0], '__len__') else None
+            with timer(stage, items):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start_request_timing():
+    """Collect a timing breakdown for the current request; returns the dict being filled"""
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings):
+    """Server-Timing header value for a {stage: seconds} breakdown"""
+    return ', '.join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (k + '="' + v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+               for k, v in labels)
+    return '{' + ','.join(escaped) + '}'
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    with _lock:
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+        summaries = sorted(_summaries.items())
+
+    lines = []
+    seen = set()
+    for (name, labels), value in counters:
+        if name not in seen:
+            seen.add(name)
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), value in gauges:
+        if name not in seen:
+            seen.add(name)
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), (count, total) in summaries:
+        if name not in seen:
+            seen.add(name)
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} summary")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _summaries.clear()
+
+
+describe('stage_seconds', "Wall time spent in each pipeline stage")
+describe('stage_items_total', "Items (contigs, ORFs, sequences) processed per stage")
+describe('blast_cache_hits_total', "VFDB BLAST results served from the cache")
+describe('blast_cache_misses_total', "VFDB BLAST lookups that missed the cache")
+describe('blast_prefiltered_total', "Sequences skipped by the VFDB k-mer prefilter")
+describe('blastdb_cache_hits_total', "Alignment subject BLAST databases reused from the cache")
+describe('blastdb_cache_misses_total', "Alignment subject BLAST databases built with makeblastdb")
+describe('blastdb_cache_evictions_total', "Cached subject BLAST databases removed to stay within the size limit")
+describe('remote_cache_hits_total', "Remote alignment jobs answered from the result cache")
+describe('remote_cache_misses_total', "Remote alignment jobs submitted to EBI/NCBI")
+describe('remote_jobs_deduplicated_total', "Remote alignment requests that joined an identical job in flight")
+describe('subprocess_total', "External tool processes started")
+describe('subprocess_failures_total', "External tool processes that failed or timed out")
+describe('tool_queue_depth', "External tool runs waiting for a free slot")
+describe('tool_running', "External tool processes running")
+describe('tool_queue_seconds', "Time external tool runs waited for a slot")
+describe('tool_run_seconds', "Run time of external tool processes")
+describe('stage_errors_total', "Stage failures answered with fallback results")
+describe('model_loads_total', "Times the ML model was deserialized")
+describe('model_load_failures_total', "ML model loads that failed or were rejected")
+describe('ml_heuristic_predictions_total', "Sequences scored by the heuristic because the ML model failed")
+describe('genome_store_failures_total', "Uploaded genomes that could not be packed into a 2-bit store")
+describe('upload_bytes_total', "Genome upload bytes received, by content encoding")
+describe('http_requests_total', "HTTP requests by route and status")
+describe('http_request_seconds', "HTTP request latency by route")
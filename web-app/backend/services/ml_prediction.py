@@ -1,68 +1,102 @@
 import numpy as np
 import joblib
+import logging
+import threading
 from pathlib import Path
 
-# Amino acid properties
-AMINO_ACIDS = 'ACDEFGHIKLMNPQRSTVWY'
-HYDROPHOBIC = set('AILMFWYV')
+from services import metrics
+from services.features import FEATURE_COLUMNS, composition_features
+
+MODEL_PATH = Path(__file__).parent.parent / 'models' / 'rf_model.pkl'
+
+logger = logging.getLogger(__name__)
+
+# Loaded model shared by all requests (see load_model)
+_registry = {}
+_registry_lock = threading.Lock()
 
 def calculate_features(sequence):
     """Calculate amino acid composition and hydrophobicity"""
-    seq_len = len(sequence)
-    
-    if seq_len == 0:
-        return np.zeros(21)  # 20 AA + 1 hydrophobic ratio
-    
-    # AA composition (20 features)
-    aa_comp = []
-    for aa in AMINO_ACIDS:
-        count = sequence.count(aa)
-        aa_comp.append(count / seq_len)
+    return composition_features([sequence])  # 20 AA + length + hydrophobic ratio
+
+def load_model():
+    """
+    Load the Random Forest into the in-memory registry.
     
-    # Hydrophobic ratio (1 feature)
-    hydrophobic_count = sum(1 for aa in sequence if aa in HYDROPHOBIC)
-    hydrophobic_ratio = hydrophobic_count / seq_len
+    The model is deserialized once and reused; it is only reloaded when
+    rf_model.pkl changes on disk. Returns None if no model file exists.
+    Raises ValueError for a model trained on a different feature layout.
+    """
+    if not MODEL_PATH.exists():
+        return None
     
-    features = aa_comp + [hydrophobic_ratio]
-    return np.array(features).reshape(1, -1)
+    mtime = MODEL_PATH.stat().st_mtime
+    with _registry_lock:
+        if _registry.get('mtime') != mtime:
+            try:
+                with metrics.timer('model_load'):
+                    model = joblib.load(MODEL_PATH)
+                n_features = getattr(model, 'n_features_in_', len(FEATURE_COLUMNS))
+                if n_features != len(FEATURE_COLUMNS):
+                    raise ValueError(f"Model expects {n_features} features, services.features "
+                                     f"computes {len(FEATURE_COLUMNS)} ({', '.join(FEATURE_COLUMNS)})")
+            except Exception:
+                metrics.inc('model_load_failures_total')
+                raise
+            _registry['model'] = model
+            metrics.inc('model_loads_total')
+            _registry['mtime'] = mtime
+        return _registry['model']
 
-def predict_vf_ml(sequence):
-    """Predict virulence factor using ML model"""
-    # Load model (you'll save this from your notebook)
-    model_path = Path(__file__).parent.parent / 'models' / 'rf_model.pkl'
+def model_version():
+    """Version string of the model file (size and modification time), or None without a model"""
+    if not MODEL_PATH.exists():
+        return None
+    stat = MODEL_PATH.stat()
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+def batch_features(sequences):
+    """Feature matrix (N, 22) for a list of sequences, in FEATURE_COLUMNS order"""
+    return composition_features(sequences)
+
+@metrics.timed('ml')
+def predict_vf_ml_batch(sequences):
+    """Predict virulence factors for many sequences with one predict_proba call"""
+    if not MODEL_PATH.exists():
+        # If model doesn't exist yet, return dummy predictions
+        return [{'prediction': 1, 'probability': 0.65, 'features': None} for _ in sequences]
     
-    if not model_path.exists():
-        # If model doesn't exist yet, return dummy prediction
-        # You'll replace this after extracting model from notebook
-        return {
-            'prediction': 1,
-            'probability': 0.65,
-            'features': None
-        }
+    with metrics.timer('features', len(sequences)):
+        features = batch_features(sequences)
+    if not len(features):
+        return []
     
     try:
-        model = joblib.load(model_path)
-        features = calculate_features(sequence)
-        
-        prediction = model.predict(features)[0]
-        probability = model.predict_proba(features)[0][1]  # Probability of VF class
+        model = load_model()
+        proba = model.predict_proba(features)
+        predictions = model.classes_[np.argmax(proba, axis=1)]
+        probabilities = proba[:, 1]  # Probability of VF class
         
-        return {
+        return [{
             'prediction': int(prediction),
             'probability': float(probability),
-            'features': features.tolist()[0]
-        }
+            'features': row
+        } for prediction, probability, row in zip(predictions, probabilities, features.tolist())]
     
     except Exception as e:
-        # Fallback to heuristic if model fails
-        features = calculate_features(sequence)
-        hydrophobic_ratio = features[0][-1]
+        logger.warning("ML model failed, using heuristic for %d sequences: %s", len(features), e)
+        metrics.inc('stage_errors_total', stage='ml')
+        metrics.inc('ml_heuristic_predictions_total', len(features))
+        # Fallback to heuristic if model fails:
+        # high hydrophobic ratio suggests membrane/secreted protein
+        probabilities = np.minimum(features[:, -1] + 0.3, 0.9)
         
-        # Simple heuristic: high hydrophobic ratio suggests membrane/secreted protein
-        probability = min(hydrophobic_ratio + 0.3, 0.9)
-        
-        return {
+        return [{
             'prediction': 1 if probability > 0.5 else 0,
             'probability': float(probability),
             'features': None
-        }
+        } for probability in probabilities]
+
+def predict_vf_ml(sequence):
+    """Predict virulence factor using ML model"""
+    return predict_vf_ml_batch([sequence])[0]
@@ -0,0 +1,213 @@
+"""
+NumPy six-frame ORF engine
+
+The contig is encoded once as a uint8 array of IUPAC codes, every codon is
+turned into a single integer and classified through lookup tables built from
+Biopython's own codon table, so the ORFs (and protein strings) are identical
+to translating each frame with Bio.Seq and scanning it for M...* stretches.
+orf_arrays() returns a contig's ORFs as arrays (for an OrfTable), and
+find_orfs_codes() as the dicts of find_orfs.
+"""
+
+import itertools
+from collections import namedtuple
+
+import numpy as np
+
+# IUPAC nucleotide codes understood by the engine (index = code)
+IUPAC = 'ACGTRYSWKMBDHVN'
+COMPLEMENT = 'TGCAYRSWMKVHDBN'
+INVALID = 255
+
+_N_CODES = len(IUPAC)
+_ENCODE = np.full(256, INVALID, dtype=np.uint8)
+for _code, _base in enumerate(IUPAC):
+    _ENCODE[ord(_base)] = _code
+    _ENCODE[ord(_base.lower())] = _code
+
+_COMPLEMENT_CODES = np.array([IUPAC.index(b) for b in COMPLEMENT], dtype=np.uint8)
+
+_ATG = IUPAC.index('A') * _N_CODES ** 2 + IUPAC.index('T') * _N_CODES + IUPAC.index('G')
+
+_tables = {}
+
+# ORFs of one contig as arrays: DNA start/end, strand (+1/-1), frame, and the
+# protein sequences concatenated as ASCII codes (each is (end - start) // 3 long)
+ContigOrfs = namedtuple('ContigOrfs', 'start end strand frame proteins')
+
+
+def _codon_tables():
+    """Amino-acid and stop lookup tables indexed by codon code (built once)"""
+    if not _tables:
+        from Bio.Seq import translate
+
+        amino_acids = np.full(_N_CODES ** 3, ord('X'), dtype=np.uint8)
+        for idx, codon in enumerate(itertools.product(IUPAC, repeat=3)):
+            amino_acids[idx] = ord(translate(''.join(codon)))
+        _tables['aa'] = amino_acids
+        _tables['stop'] = amino_acids == ord('*')
+    return _tables['aa'], _tables['stop']
+
+
+def encode_sequence(sequence):
+    """Encode a nucleotide sequence as IUPAC codes, or None if it has other symbols"""
+    raw = np.frombuffer(str(sequence).encode('ascii', errors='replace'), dtype=np.uint8)
+    codes = _ENCODE[raw]
+    if codes.size and codes.max() == INVALID:
+        return None
+    return codes
+
+
+def reverse_complement_codes(codes):
+    """Reverse complement of an encoded sequence"""
+    return _COMPLEMENT_CODES[codes[::-1]]
+
+
+def codon_codes(codes):
+    """Codon code starting at every position of an encoded sequence"""
+    if len(codes) < 3:
+        return np.empty(0, dtype=np.int16)
+    c = codes.astype(np.int16)
+    return (c[:-2] * _N_CODES + c[1:-1]) * _N_CODES + c[2:]
+
+
+def frame_orfs(frame_codons, min_aa):
+    """
+    Start/stop codon indices of the ORFs in one reading frame.
+
+    Only the first ATG after each stop (or after the frame start) opens an
+    ORF, which runs to the next stop or to the end of the frame.
+    """
+    starts, ends, _ = chunk_frame_orfs(frame_codons, min_aa)
+    return starts, ends
+
+
+def chunk_frame_orfs(frame_codons, min_aa, head=True, limit=None, complete=True):
+    """
+    ORFs of the segments a chunk of one reading frame is responsible for.
+
+    A segment (the stretch after a stop) belongs to the chunk holding the
+    stop that opens it, i.e. a stop at a codon index below limit; the
+    leading segment belongs to the chunk when head is set. When the chunk
+    does not reach the end of the frame (complete=False) the last owned
+    segment may run past it; its opening codon index is returned as
+    open_from (-1 otherwise) so the caller can resolve it on a longer slice.
+    """
+    _, is_stop = _codon_tables()
+    n = len(frame_codons)
+    limit = n if limit is None else limit
+    starts = np.flatnonzero(frame_codons == _ATG)
+    stops = np.flatnonzero(is_stop[frame_codons])
+
+    open_from = -1
+    if not complete:
+        if len(stops) and stops[-1] < limit:
+            open_from = int(stops[-1]) + 1
+        elif not len(stops) and head:
+            open_from = 0
+
+    if not len(starts):
+        return starts, starts, open_from
+
+    # Segment k lies between stop k-1 and stop k; keep the first start in each
+    segment = np.searchsorted(stops, starts)
+    first = np.ones(len(starts), dtype=bool)
+    first[1:] = segment[1:] != segment[:-1]
+    segment = segment[first]
+
+    opening_stop = np.append(-1, stops)[segment]
+    owned = np.where(segment == 0, head, opening_stop < limit)
+    if not complete:
+        owned &= segment < len(stops)
+
+    orf_starts = starts[first]
+    orf_ends = np.append(stops, n)[segment]
+    keep = owned & (orf_ends - orf_starts >= min_aa)
+    return orf_starts[keep], orf_ends[keep], open_from
+
+
+def find_orfs_numpy(sequence, min_length=100):
+    """
+    Find ORFs in a DNA sequence (all 6 frames) with the vectorized engine.
+
+    Returns the same list of dicts as orf_prediction.find_orfs, or None when
+    the sequence contains symbols outside the IUPAC nucleotide alphabet.
+    """
+    codes = encode_sequence(sequence)
+    if codes is None:
+        return None
+    return find_orfs_codes(codes, min_length)
+
+
+def find_orfs_codes(codes, min_length=100):
+    """find_orfs_numpy() for a sequence already encoded as IUPAC codes"""
+    return orf_dicts(orf_arrays(codes, min_length))
+
+
+def orf_arrays(codes, min_length=100):
+    """
+    ORFs of an encoded sequence as a ContigOrfs of arrays, in find_orfs order.
+
+    Proteins are translated straight into one uint8 buffer; no per-ORF
+    strings or dicts are created.
+    """
+    amino_acids, _ = _codon_tables()
+    min_aa = min_length // 3
+    parts = []
+
+    for strand, strand_codes in [(+1, codes), (-1, reverse_complement_codes(codes))]:
+        codons = codon_codes(strand_codes)
+        for frame in range(3):
+            frame_codons = codons[frame::3]
+            starts, ends = frame_orfs(frame_codons, min_aa)
+            if not len(starts):
+                continue
+            proteins = amino_acids[frame_codons[_range_positions(starts, ends)]]
+            parts.append(ContigOrfs(frame + starts * 3, frame + ends * 3, np.full(len(starts), strand, np.int8),
+                                    np.full(len(starts), frame, np.int8), proteins))
+
+    return join_orf_arrays(parts)
+
+
+def _range_positions(starts, ends):
+    """Indices of every position in the ranges [starts[i], ends[i]), concatenated"""
+    lengths = ends - starts
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+
+
+def join_orf_arrays(parts):
+    """One ContigOrfs from several, in order"""
+    if not parts:
+        return ContigOrfs(np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.int8),
+                          np.empty(0, np.int8), np.empty(0, np.uint8))
+    return ContigOrfs(*(np.concatenate(values) for values in zip(*parts)))
+
+
+def orf_arrays_from_dicts(orfs):
+    """ContigOrfs of raw ORF dicts (as returned by find_orfs)"""
+    return ContigOrfs(np.array([orf['start'] for orf in orfs], dtype=np.int64),
+                      np.array([orf['end'] for orf in orfs], dtype=np.int64),
+                      np.array([orf['strand'] for orf in orfs], dtype=np.int8),
+                      np.array([orf['frame'] for orf in orfs], dtype=np.int8),
+                      np.frombuffer(''.join(orf['sequence'] for orf in orfs).encode('ascii'), dtype=np.uint8))
+
+
+def orf_dicts(orfs):
+    """Raw ORF dicts (find_orfs form) of a ContigOrfs"""
+    proteins = orfs.proteins.tobytes().decode('ascii')
+    result = []
+    offset = 0
+    for start, end, strand, frame in zip(orfs.start.tolist(), orfs.end.tolist(),
+                                         orfs.strand.tolist(), orfs.frame.tolist()):
+        length = (end - start) // 3
+        result.append({
+            'sequence': proteins[offset:offset + length],
+            'length': length,
+            'strand': strand,
+            'frame': frame,
+            'start': start,
+            'end': end
+        })
+        offset += length
+    return result
@@ -0,0 +1,226 @@
+"""
+Process-pool ORF calling
+
+Small contigs are batched together and large contigs are split into
+overlapping chunks per strand; both are farmed out to a shared process pool
+sized to the machine. Chunk edges are handled by segment ownership (see
+orf_engine.chunk_frame_orfs) so the merged output is identical, in order and
+content, to orf_prediction.predict_orfs. For a .2bit genome store, tasks
+carry contig coordinates instead of sequence and workers read their slice
+from the memory-mapped file.
+"""
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from Bio import SeqIO
+from Bio.Seq import Seq
+
+from services.genome_store import StoreSlice, StrandView, is_store, open_store, slice_codes
+from services.orf_engine import (
+    ContigOrfs, encode_sequence, codon_codes, chunk_frame_orfs, join_orf_arrays, orf_arrays, _codon_tables
+)
+from services import metrics
+from services.orf_prediction import find_orf_arrays, orf_result
+from services.orf_table import OrfTable
+
+# Contigs longer than this are split into chunks (nucleotides, multiple of 3)
+CHUNK_SIZE = 1_500_000
+# Extra sequence each chunk reads past its end to close ORFs it owns
+CHUNK_OVERLAP = 30_000
+# Processes in the shared pool; every caller shares this one size
+POOL_WORKERS = os.cpu_count() or 1
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Shared process pool of POOL_WORKERS processes, created on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=POOL_WORKERS)
+        return _pool
+
+
+def shutdown_pool():
+    """Stop the shared process pool (e.g. on application shutdown)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def _sequence_codes(sequence):
+    """IUPAC codes of a sequence string or StoreSlice, None for non-IUPAC sequence"""
+    if isinstance(sequence, StoreSlice):
+        return slice_codes(sequence)
+    return encode_sequence(sequence)
+
+
+def _contig_batch_orfs(contigs, min_length):
+    """Worker: ContigOrfs for a batch of whole contigs, None where the engine declines"""
+    results = []
+    for sequence in contigs:
+        codes = _sequence_codes(sequence)
+        results.append(None if codes is None else orf_arrays(codes, min_length))
+    return results
+
+
+def _chunk_orfs(chunk, min_aa, head, limit, complete):
+    """
+    Worker: ORFs owned by one chunk of a strand, per frame.
+
+    Returns a list of three (starts, ends, proteins, open_from) tuples with
+    codon indices relative to the chunk, or None for non-IUPAC sequence.
+    """
+    codes = _sequence_codes(chunk)
+    if codes is None:
+        return None
+
+    amino_acids, _ = _codon_tables()
+    codons = codon_codes(codes)
+    frames = []
+    for frame in range(3):
+        frame_codons = codons[frame::3]
+        starts, ends, open_from = chunk_frame_orfs(frame_codons, min_aa, head, limit, complete)
+        protein = amino_acids[frame_codons].tobytes()
+        starts, ends = starts.tolist(), ends.tolist()
+        proteins = [protein[s:e].decode('ascii') for s, e in zip(starts, ends)]
+        frames.append((starts, ends, proteins, open_from))
+    return frames
+
+
+def _resolve_segment(strand_seq, frame, open_from, min_aa, window=CHUNK_OVERLAP):
+    """ORF (start, end, protein) of the segment opening at a codon index, if any"""
+    offset = frame + open_from * 3
+    while True:
+        piece = strand_seq[offset:offset + window]
+        complete = offset + window >= len(strand_seq)
+        starts, ends, proteins, unresolved = _chunk_orfs(piece, min_aa, True, 0, complete)[0]
+        if unresolved == -1:
+            if starts:
+                return starts[0] + open_from, ends[0] + open_from, proteins[0]
+            return None
+        window *= 2
+
+
+def _split_strand(strand_seq, min_aa, chunk_size, overlap):
+    """Chunk task arguments covering one strand"""
+    tasks = []
+    for begin in range(0, len(strand_seq), chunk_size):
+        stop = begin + chunk_size + overlap + 2
+        tasks.append((strand_seq[begin:stop], min_aa, begin == 0, chunk_size // 3,
+                      stop >= len(strand_seq)))
+    return tasks
+
+
+def _merge_strand(strand_seq, strand, chunk_results, min_aa, chunk_size):
+    """ContigOrfs of one strand from its chunk results, in find_orfs order"""
+    starts, ends, frames, proteins = [], [], [], []
+    for frame in range(3):
+        for index, chunk_frames in enumerate(chunk_results):
+            base = index * chunk_size // 3
+            chunk_starts, chunk_ends, chunk_proteins, open_from = chunk_frames[frame]
+            found = [(base + s, base + e, p) for s, e, p in zip(chunk_starts, chunk_ends, chunk_proteins)]
+            if open_from != -1:
+                resolved = _resolve_segment(strand_seq, frame, base + open_from, min_aa)
+                if resolved:
+                    found.append(resolved)
+            for start, end, protein in found:
+                starts.append(frame + start * 3)
+                ends.append(frame + end * 3)
+                frames.append(frame)
+                proteins.append(protein)
+    return ContigOrfs(np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64),
+                      np.full(len(starts), strand, dtype=np.int8), np.array(frames, dtype=np.int8),
+                      np.frombuffer(''.join(proteins).encode('ascii'), dtype=np.uint8))
+
+
+def predict_orfs_parallel(fasta_file, min_length=100, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Predict ORFs from FASTA genome file across a process pool"""
+    return orf_result(predict_orf_table_parallel(fasta_file, min_length, chunk_size, overlap))
+
+
+def predict_orf_table_parallel(fasta_file, min_length=100, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """predict_orfs_parallel() as an OrfTable filled from the workers' arrays"""
+    with metrics.timer('orf_prediction', executor='pool') as timing:
+        table = OrfTable.from_contig_orfs(_predict_orfs_parallel(fasta_file, min_length, chunk_size, overlap))
+        timing['items'] = len(table)
+    return table
+
+
+def _predict_orfs_parallel(fasta_file, min_length, chunk_size, overlap):
+    """Yield (contig id, ContigOrfs) per contig, in file order"""
+    chunk_size -= chunk_size % 3
+    overlap -= overlap % 3
+    min_aa = min_length // 3
+    pool = get_pool()
+
+    contigs = []
+    jobs = []
+    batch = []
+    batch_size = 0
+
+    def flush_batch():
+        nonlocal batch, batch_size
+        if batch:
+            # Slicing a StrandView gives a StoreSlice; a string stays as it is
+            future = pool.submit(_contig_batch_orfs, [contigs[i][1][:] for i in batch], min_length)
+            jobs.append(('batch', list(batch), future))
+            batch, batch_size = [], 0
+
+    if is_store(fasta_file):
+        store = open_store(str(fasta_file))
+        contig_source = ((name, StrandView(store.path, name, length)) for name, length in store.lengths.items())
+    else:
+        contig_source = ((record.id, str(record.seq)) for record in SeqIO.parse(fasta_file, "fasta"))
+
+    for contig_id, sequence in contig_source:
+        index = len(contigs)
+        contigs.append((contig_id, sequence))
+
+        if len(sequence) <= chunk_size:
+            batch.append(index)
+            batch_size += len(sequence)
+            if batch_size >= chunk_size:
+                flush_batch()
+            continue
+
+        if isinstance(sequence, StrandView):
+            reverse = StrandView(sequence.path, contig_id, len(sequence), strand=-1)
+        else:
+            reverse = str(Seq(sequence).reverse_complement())
+        strands = []
+        for strand_seq in (sequence, reverse):
+            strands.append([pool.submit(_chunk_orfs, *task)
+                            for task in _split_strand(strand_seq, min_aa, chunk_size, overlap)])
+        jobs.append(('chunks', index, (reverse, strands)))
+    flush_batch()
+
+    contig_orfs = [None] * len(contigs)
+    for kind, target, payload in jobs:
+        if kind == 'batch':
+            for index, orfs in zip(target, payload.result()):
+                contig_orfs[index] = orfs
+            continue
+
+        reverse, strands = payload
+        forward = contigs[target][1]
+        results = [[future.result() for future in futures] for futures in strands]
+        if any(frames is None for chunks in results for frames in chunks):
+            continue
+        contig_orfs[target] = join_orf_arrays([
+            _merge_strand(forward, +1, results[0], min_aa, chunk_size),
+            _merge_strand(reverse, -1, results[1], min_aa, chunk_size)
+        ])
+
+    for (contig_id, sequence), orfs in zip(contigs, contig_orfs):
+        if orfs is None:
+            # Non-IUPAC symbols: same Biopython path as the serial caller
+            orfs = find_orf_arrays(Seq(sequence), min_length)
+        yield contig_id, orfs
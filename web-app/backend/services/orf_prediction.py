@@ -1,8 +1,32 @@
+import json
+
 from Bio import SeqIO
 from Bio.Seq import Seq
 
+from services import metrics
+from services.genome_store import GenomeStore, is_store
+from services.orf_engine import (
+    encode_sequence, find_orfs_numpy, orf_arrays, orf_arrays_from_dicts, orf_dicts
+)
+from services.orf_table import OrfTable
+
 def find_orfs(sequence, min_length=100):
     """Find ORFs in a DNA sequence (all 6 frames)"""
+    orfs = find_orfs_numpy(sequence, min_length)
+    if orfs is None:
+        # Non-IUPAC symbols: let Biopython translate (and report) them
+        orfs = _find_orfs_translate(sequence, min_length)
+    return orfs
+
+def find_orf_arrays(sequence, min_length=100):
+    """find_orfs() as an orf_engine.ContigOrfs of arrays"""
+    codes = encode_sequence(sequence)
+    if codes is None:
+        return orf_arrays_from_dicts(_find_orfs_translate(sequence, min_length))
+    return orf_arrays(codes, min_length)
+
+def _find_orfs_translate(sequence, min_length=100):
+    """Reference ORF finder translating each frame with Biopython"""
     orfs = []
     seq_len = len(sequence)
     
@@ -45,38 +69,93 @@ def find_orfs(sequence, min_length=100):
     
     return orfs
 
+def format_contig_orfs(contig_id, orfs):
+    """Attach ORF ids and contig info to the raw ORFs of one contig"""
+    return [{
+        'orf_id': f"{contig_id}_ORF{idx+1}",
+        'contig': contig_id,
+        'sequence': orf['sequence'],
+        'length': orf['length'],
+        'strand': '+' if orf['strand'] == 1 else '-',
+        'frame': orf['frame'],
+        'start': orf['start'],
+        'end': orf['end']
+    } for idx, orf in enumerate(orfs)]
+
+def iter_contig_orf_arrays(fasta_file, min_length=100):
+    """Lazily yield (contig_id, ContigOrfs) for each contig of a FASTA file or .2bit genome store"""
+    if is_store(fasta_file):
+        # Contigs are unpacked straight into engine codes, one at a time
+        with GenomeStore(fasta_file) as store:
+            for contig_id in store.contigs:
+                yield contig_id, orf_arrays(store.codes(contig_id), min_length)
+        return
+    for record in SeqIO.parse(fasta_file, "fasta"):
+        yield record.id, find_orf_arrays(record.seq, min_length)
+
+def iter_contig_orfs(fasta_file, min_length=100):
+    """Lazily yield (contig_id, orfs) for each contig of a FASTA file or .2bit genome store"""
+    for contig_id, orfs in iter_contig_orf_arrays(fasta_file, min_length):
+        yield contig_id, format_contig_orfs(contig_id, orf_dicts(orfs))
+
+def summarize_orfs(num_contigs, num_orfs, total_length):
+    """Summary statistics returned alongside predicted ORFs"""
+    avg_length = total_length / num_orfs if num_orfs else 0
+    
+    return {
+        'num_contigs': num_contigs,
+        'num_orfs': num_orfs,
+        'avg_orf_length': round(avg_length)
+    }
+
+def table_summary(table):
+    """summarize_orfs() statistics of an OrfTable"""
+    return summarize_orfs(len(table.contigs), len(table), int(table.column('length').sum()))
+
+def orf_result(table):
+    """predict_orfs form of an OrfTable: summary statistics plus the ORF dicts"""
+    result = table_summary(table)
+    result['orfs'] = table.to_records()
+    return result
+
+def predict_orf_table(fasta_file, min_length=100):
+    """
+    Predict ORFs from FASTA genome file (or its .2bit genome store) as an OrfTable.
+    
+    The table's columns are filled from the engine's arrays contig by
+    contig; no per-ORF dicts are created.
+    """
+    with metrics.timer('orf_prediction') as timing:
+        table = OrfTable.from_contig_orfs(iter_contig_orf_arrays(fasta_file, min_length))
+        timing['items'] = len(table)
+    return table
+
 def predict_orfs(fasta_file, min_length=100):
-    """Predict ORFs from FASTA genome file"""
-    all_orfs = []
+    """Predict ORFs from FASTA genome file (or its .2bit genome store)"""
+    return orf_result(predict_orf_table(fasta_file, min_length))
+
+def stream_orfs_ndjson(fasta_file, min_length=100, chunk_size=1000):
+    """
+    Yield predicted ORFs as NDJSON lines, contig by contig.
+    
+    Each line is either {"type": "orfs", "orfs": [...]} holding at most
+    chunk_size ORFs, or the final {"type": "summary", ...} line with the
+    same statistics predict_orfs returns. Only one contig's ORFs are held
+    in memory at a time.
+    """
     contig_count = 0
+    orf_count = 0
+    total_length = 0
     
-    for record in SeqIO.parse(fasta_file, "fasta"):
+    for contig_id, orfs in iter_contig_orfs(fasta_file, min_length):
         contig_count += 1
-        contig_id = record.id
-        
-        # Find ORFs in this contig
-        orfs = find_orfs(record.seq, min_length)
+        orf_count += len(orfs)
+        total_length += sum(orf['length'] for orf in orfs)
         
-        # Add contig info to each ORF
-        for idx, orf in enumerate(orfs):
-            orf_id = f"{contig_id}_ORF{idx+1}"
-            all_orfs.append({
-                'orf_id': orf_id,
-                'contig': contig_id,
-                'sequence': orf['sequence'],
-                'length': orf['length'],
-                'strand': '+' if orf['strand'] == 1 else '-',
-                'frame': orf['frame'],
-                'start': orf['start'],
-                'end': orf['end']
-            })
+        for i in range(0, len(orfs), chunk_size):
+            chunk = {'type': 'orfs', 'contig': contig_id, 'orfs': orfs[i:i + chunk_size]}
+            yield json.dumps(chunk) + "\n"
     
-    # Calculate statistics
-    avg_length = sum(orf['length'] for orf in all_orfs) / len(all_orfs) if all_orfs else 0
-    
-    return {
-        'num_contigs': contig_count,
-        'num_orfs': len(all_orfs),
-        'avg_orf_length': round(avg_length),
-        'orfs': all_orfs
-    }
+    summary = {'type': 'summary'}
+    summary.update(summarize_orfs(contig_count, orf_count, total_length))
+    yield json.dumps(summary) + "\n"
@@ -0,0 +1,310 @@
+"""
+Columnar ORF table
+
+Predicted ORFs held as a struct of NumPy arrays (contig index, ORF number,
+start, end, strand, frame) plus one concatenated protein buffer, instead of
+one Python dict per ORF. Sequences are addressed by (seq_start, seq_end)
+into the shared buffer, so slicing returns views and sorting or filtering
+only gathers the small per-row arrays. Tables are filled straight from
+the ORF engine's per-contig arrays (from_contig_orfs). Score columns can be
+attached; string columns such as the classification are stored as category
+codes.
+
+to_records() gives back the exact dicts the API returns; to_arrow() and
+to_parquet() need pyarrow, which is optional.
+"""
+
+import json
+
+import numpy as np
+
+# Per-row arrays every table has
+BASE_COLUMNS = ('contig_index', 'ordinal', 'start', 'end', 'strand', 'frame', 'seq_start', 'seq_end')
+
+# Field order of orf_prediction.format_contig_orfs
+ORF_FIELDS = ('orf_id', 'contig', 'sequence', 'length', 'strand', 'frame', 'start', 'end')
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Arrow/Parquet export needs pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+class OrfTable:
+    """Struct-of-arrays ORF table sharing one protein sequence buffer"""
+
+    def __init__(self, contigs, columns, buffer, categories=None):
+        self.contigs = contigs
+        self.columns = columns
+        self.buffer = buffer
+        self.categories = categories or {}
+
+    @classmethod
+    def from_orfs(cls, orfs):
+        """Build a table from ORF dicts as returned by predict_orfs"""
+        contig_ids = {}
+        for orf in orfs:
+            contig_ids.setdefault(orf['contig'], len(contig_ids))
+        sequences = ''.join(orf['sequence'] for orf in orfs).encode('ascii')
+        seq_end = np.cumsum([len(orf['sequence']) for orf in orfs], dtype=np.int64)
+
+        columns = {
+            'contig_index': np.array([contig_ids[orf['contig']] for orf in orfs], dtype=np.int32),
+            'ordinal': np.array([int(orf['orf_id'].rsplit('_ORF', 1)[1]) for orf in orfs], dtype=np.int32),
+            'start': np.array([orf['start'] for orf in orfs], dtype=np.int32),
+            'end': np.array([orf['end'] for orf in orfs], dtype=np.int32),
+            'strand': np.array([1 if orf['strand'] == '+' else -1 for orf in orfs], dtype=np.int8),
+            'frame': np.array([orf['frame'] for orf in orfs], dtype=np.int8),
+            'seq_start': seq_end - np.array([len(orf['sequence']) for orf in orfs], dtype=np.int64),
+            'seq_end': seq_end
+        }
+        return cls(list(contig_ids), columns, np.frombuffer(sequences, dtype=np.uint8))
+
+    @classmethod
+    def from_contig_orfs(cls, contig_orfs):
+        """
+        Build a table from (contig id, orf_engine.ContigOrfs) pairs, one per contig.
+
+        Every contig is listed in contigs, including those without ORFs.
+        """
+        contigs = []
+        parts = []
+        for contig_id, orfs in contig_orfs:
+            contigs.append(contig_id)
+            parts.append(orfs)
+        counts = np.array([len(orfs.start) for orfs in parts], dtype=np.int64)
+
+        def concat(values, dtype):
+            return np.concatenate(values).astype(dtype, copy=False) if parts else np.empty(0, dtype)
+
+        start = concat([orfs.start for orfs in parts], np.int32)
+        end = concat([orfs.end for orfs in parts], np.int32)
+        seq_end = np.cumsum((end - start) // 3, dtype=np.int64)
+        columns = {
+            'contig_index': np.repeat(np.arange(len(parts), dtype=np.int32), counts),
+            'ordinal': (np.arange(counts.sum(), dtype=np.int64)
+                        - np.repeat(np.cumsum(counts) - counts, counts) + 1).astype(np.int32),
+            'start': start,
+            'end': end,
+            'strand': concat([orfs.strand for orfs in parts], np.int8),
+            'frame': concat([orfs.frame for orfs in parts], np.int8),
+            'seq_start': seq_end - (end - start) // 3,
+            'seq_end': seq_end
+        }
+        return cls(contigs, columns, concat([orfs.proteins for orfs in parts], np.uint8))
+
+    def __len__(self):
+        return len(self.columns['start'])
+
+    def _with_columns(self, columns):
+        return OrfTable(self.contigs, columns, self.buffer, self.categories)
+
+    def __getitem__(self, key):
+        """Row dict for an int; a table view for a slice; a gathered table for an index array or mask"""
+        if isinstance(key, (int, np.integer)):
+            return self.record(int(key))
+        if isinstance(key, slice):
+            return self._with_columns({name: values[key] for name, values in self.columns.items()})
+        return self.take(key)
+
+    def take(self, indices):
+        """Table of the given rows (integer indices or a boolean mask); sequences stay shared"""
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            indices = np.flatnonzero(indices)
+        return self._with_columns({name: values[indices] for name, values in self.columns.items()})
+
+    def filter(self, mask):
+        """Rows where mask is true"""
+        return self.take(np.asarray(mask, dtype=bool))
+
+    def where(self, name, min_value=None, max_value=None):
+        """Rows whose column value lies in [min_value, max_value]"""
+        values = self.column(name)
+        mask = np.ones(len(self), dtype=bool)
+        if min_value is not None:
+            mask &= values >= min_value
+        if max_value is not None:
+            mask &= values <= max_value
+        return self.filter(mask)
+
+    def sort_by(self, name, descending=False):
+        """Table sorted on a column (stable, so ties keep their order)"""
+        values = self.columns[name] if name in self.columns else self.column(name)
+        if not descending:
+            return self.take(np.argsort(values, kind='stable'))
+        # Reversed stable sort of the reversed column: descending with ties
+        # still in row order, and no negation (which wraps unsigned codes)
+        order = np.argsort(values[::-1], kind='stable')[::-1]
+        return self.take(len(values) - 1 - order)
+
+    @property
+    def score_columns(self):
+        return [name for name in self.columns if name not in BASE_COLUMNS]
+
+    def set_column(self, name, values):
+        """Attach a per-row column; strings become category codes"""
+        values = list(values) if not isinstance(values, np.ndarray) else values
+        if len(values) and isinstance(values[0], str):
+            labels = sorted(set(values))
+            lookup = {label: code for code, label in enumerate(labels)}
+            self.categories = dict(self.categories, **{name: labels})
+            values = np.array([lookup[value] for value in values], dtype=np.uint8)
+        self.columns[name] = np.asarray(values)
+
+    def column(self, name):
+        """Decoded values of a column (also 'length', 'contig' and 'orf_id')"""
+        if name == 'length':
+            return self.columns['seq_end'] - self.columns['seq_start']
+        if name == 'contig':
+            return np.array(self.contigs, dtype=object)[self.columns['contig_index']]
+        if name == 'orf_id':
+            return np.array(self.orf_ids(), dtype=object)
+        if name in self.categories:
+            return np.array(self.categories[name], dtype=object)[self.columns[name]]
+        return self.columns[name]
+
+    def sequence(self, row):
+        start, end = self.columns['seq_start'][row], self.columns['seq_end'][row]
+        return self.buffer[start:end].tobytes().decode('ascii')
+
+    def sequences(self):
+        """Protein sequences of all rows"""
+        data = memoryview(self.buffer)
+        return [str(data[start:end], 'ascii') for start, end in
+                zip(self.columns['seq_start'].tolist(), self.columns['seq_end'].tolist())]
+
+    def orf_ids(self):
+        contigs = self.contigs
+        return [f"{contigs[contig]}_ORF{ordinal}" for contig, ordinal in
+                zip(self.columns['contig_index'].tolist(), self.columns['ordinal'].tolist())]
+
+    def field_values(self, name):
+        if name == 'sequence':
+            return self.sequences()
+        if name == 'strand':
+            return ['+' if strand == 1 else '-' for strand in self.columns['strand'].tolist()]
+        if name == 'orf_id':
+            return self.orf_ids()
+        if name == 'contig':
+            contigs = self.contigs
+            return [contigs[index] for index in self.columns['contig_index'].tolist()]
+        if name in self.categories:
+            labels = self.categories[name]
+            return [labels[code] for code in self.columns[name].tolist()]
+        return self.column(name).tolist()
+
+    def to_records(self, fields=None):
+        """Rows as API dicts (ORF fields then score columns unless fields is given)"""
+        fields = list(fields or ORF_FIELDS + tuple(self.score_columns))
+        values = [self.field_values(name) for name in fields]
+        return [dict(zip(fields, row)) for row in zip(*values)]
+
+    def record(self, row):
+        row = range(len(self))[row]
+        return self[row:row + 1].to_records()[0]
+
+    @property
+    def nbytes(self):
+        """Memory held by the per-row arrays and the sequence buffer"""
+        return self.buffer.nbytes + sum(values.nbytes for values in self.columns.values())
+
+    def compact(self):
+        """Copy with a contiguous buffer holding only this table's sequences, in row order"""
+        lengths = self.columns['seq_end'] - self.columns['seq_start']
+        seq_end = np.cumsum(lengths, dtype=np.int64)
+        seq_start = seq_end - lengths
+        positions = np.repeat(self.columns['seq_start'] - seq_start, lengths) + np.arange(seq_end[-1] if len(self) else 0)
+        columns = dict(self.columns, seq_start=seq_start, seq_end=seq_end)
+        return OrfTable(self.contigs, columns, self.buffer[positions], self.categories)
+
+    def save(self, path):
+        """Write the table to a .npz file (no extra dependencies)"""
+        table = self.compact()
+        np.savez(path, buffer=table.buffer, contigs=np.array(table.contigs, dtype=str),
+                 categories=np.array(json.dumps(table.categories)),
+                 **{f"column_{name}": values for name, values in table.columns.items()})
+
+    @classmethod
+    def load(cls, path):
+        """Read a table written by save()"""
+        with np.load(path) as data:
+            columns = {key[len('column_'):]: data[key] for key in data.files if key.startswith('column_')}
+            return cls(data['contigs'].tolist(), columns, data['buffer'],
+                       json.loads(str(data['categories'])))
+
+    def to_arrow(self):
+        """pyarrow.Table with the JSON fields and score columns (categories as dictionary arrays)"""
+        pa = _require_pyarrow()
+        table = self.compact()
+        offsets = np.concatenate(([0], table.columns['seq_end'])).astype(np.int64)
+        sequence = pa.LargeStringArray.from_buffers(len(table), pa.py_buffer(offsets), pa.py_buffer(table.buffer))
+        contig = pa.DictionaryArray.from_arrays(table.columns['contig_index'], pa.array(table.contigs, pa.string()))
+
+        arrays = {
+            'orf_id': pa.array(table.orf_ids(), pa.string()),
+            'contig': contig,
+            'sequence': sequence,
+            'length': pa.array(table.column('length').astype(np.int32)),
+            'strand': pa.array(table.columns['strand']),
+            'frame': pa.array(table.columns['frame']),
+            'start': pa.array(table.columns['start']),
+            'end': pa.array(table.columns['end'])
+        }
+        for name in table.score_columns:
+            values = table.columns[name]
+            if name in table.categories:
+                arrays[name] = pa.DictionaryArray.from_arrays(values, pa.array(table.categories[name], pa.string()))
+            else:
+                arrays[name] = pa.array(values)
+        return pa.table(arrays)
+
+    @classmethod
+    def from_arrow(cls, arrow_table):
+        """Inverse of to_arrow()"""
+        pa = _require_pyarrow()
+        arrow_table = arrow_table.combine_chunks()
+        contig = arrow_table.column('contig').chunk(0) if arrow_table.num_rows else None
+        sequence = arrow_table.column('sequence').cast(pa.large_string()).combine_chunks()
+        _, offsets_buffer, data_buffer = sequence.buffers()
+        offsets = np.frombuffer(offsets_buffer, dtype=np.int64)[sequence.offset:sequence.offset + len(sequence) + 1]
+        buffer = np.frombuffer(data_buffer, dtype=np.uint8) if data_buffer is not None else np.empty(0, np.uint8)
+
+        columns = {
+            'contig_index': contig.indices.to_numpy().astype(np.int32) if contig is not None else np.empty(0, np.int32),
+            'ordinal': np.array([int(orf_id.rsplit('_ORF', 1)[1]) for orf_id in arrow_table.column('orf_id').to_pylist()],
+                                dtype=np.int32),
+            'start': arrow_table.column('start').to_numpy(),
+            'end': arrow_table.column('end').to_numpy(),
+            'strand': arrow_table.column('strand').to_numpy(),
+            'frame': arrow_table.column('frame').to_numpy(),
+            'seq_start': offsets[:-1].copy(),
+            'seq_end': offsets[1:].copy()
+        }
+        contigs = contig.dictionary.to_pylist() if contig is not None else []
+        categories = {}
+        for name in arrow_table.column_names[len(ORF_FIELDS):]:
+            values = arrow_table.column(name).combine_chunks()
+            if pa.types.is_dictionary(values.type):
+                categories[name] = values.dictionary.to_pylist()
+                columns[name] = values.indices.to_numpy().astype(np.uint8)
+            else:
+                columns[name] = values.to_numpy()
+        return cls(contigs, columns, buffer, categories)
+
+    def to_parquet(self, path):
+        """Write the table as Parquet (needs pyarrow)"""
+        _require_pyarrow()
+        import pyarrow.parquet as pq
+
+        pq.write_table(self.to_arrow(), path)
+
+    @classmethod
+    def read_parquet(cls, path):
+        _require_pyarrow()
+        import pyarrow.parquet as pq
+
+        return cls.from_arrow(pq.read_table(path))
@@ -0,0 +1,125 @@
+"""
+All-vs-all percent identity with Bio.Align.PairwiseAligner
+
+Global alignment scored like pairwise2's globalxx (match 1, mismatch and
+gaps 0), so an alignment's score is its number of identical positions and
+the matrix needs scores only: PairwiseAligner.score() runs the dynamic
+programming without traceback or enumerating co-optimal alignments.
+Identity is matches over the shorter sequence, which makes the matrix
+symmetric; only the upper triangle is computed. Rows are grouped into
+blocks of roughly equal pair counts and scored on the shared process pool,
+and each block's rows are yielded as soon as it finishes.
+"""
+
+from concurrent.futures import as_completed
+
+import numpy as np
+from Bio import SeqIO
+from Bio.Align import PairwiseAligner
+
+from services import metrics
+from services.orf_parallel import POOL_WORKERS, get_pool
+
+# Blocks per pool worker, so uneven rows still balance across workers
+BLOCKS_PER_WORKER = 4
+# Below this many pairs the matrix is computed in-process
+MIN_PARALLEL_PAIRS = 200
+
+_aligners = {}
+
+
+def make_aligner():
+    """Global aligner scoring identical positions only (globalxx)"""
+    if 'global' not in _aligners:
+        aligner = PairwiseAligner()
+        aligner.mode = 'global'
+        aligner.match_score = 1
+        aligner.mismatch_score = 0
+        aligner.gap_score = 0
+        _aligners['global'] = aligner
+    return _aligners['global']
+
+
+def pair_identity(seq1, seq2, aligner=None):
+    """Percent identity of two sequences: matches over the shorter length"""
+    shorter = min(len(seq1), len(seq2))
+    if not shorter:
+        return 0.0
+    return 100.0 * (aligner or make_aligner()).score(seq1, seq2) / shorter
+
+
+def best_alignment(seq1, seq2):
+    """First optimal global alignment of two sequences (co-optimal ones are not enumerated)"""
+    return next(iter(make_aligner().align(seq1, seq2)))
+
+
+def _score_rows(sequences, first, rows):
+    """Worker: rows first..first+rows-1 of the upper triangle; sequences begins at row first"""
+    aligner = make_aligner()
+    return [(first + i, np.array([pair_identity(sequences[i], other, aligner)
+                                  for other in sequences[i + 1:]], dtype=np.float32))
+            for i in range(rows)]
+
+
+def row_blocks(n, num_blocks):
+    """(first row, row count) blocks of the upper triangle with about equal pairs each"""
+    total = n * (n - 1) // 2
+    target = max(total / max(num_blocks, 1), 1)
+    blocks = []
+    first = pairs = 0
+    for i in range(n - 1):
+        pairs += n - 1 - i
+        if pairs >= target:
+            blocks.append((first, i + 1 - first))
+            first, pairs = i + 1, 0
+    if first < n - 1:
+        blocks.append((first, n - 1 - first))
+    return blocks
+
+
+def iter_identity_rows(sequences):
+    """
+    Upper-triangle rows (i, identities of i against i+1..n-1) as they finish.
+
+    Rows come back in completion order, not index order.
+    """
+    sequences = [str(sequence) for sequence in sequences]
+    n = len(sequences)
+    if n * (n - 1) // 2 < MIN_PARALLEL_PAIRS:
+        yield from _score_rows(sequences, 0, max(n - 1, 0))
+        return
+
+    pool = get_pool()
+    blocks = row_blocks(n, POOL_WORKERS * BLOCKS_PER_WORKER)
+    # A block only needs the sequences from its first row on
+    futures = [pool.submit(_score_rows, sequences[first:], first, rows) for first, rows in blocks]
+    try:
+        for future in as_completed(futures):
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def identity_matrix(sequences):
+    """N x N float32 percent identity matrix (diagonal 100) of the sequences"""
+    n = len(sequences)
+    matrix = np.zeros((n, n), dtype=np.float32)
+    with metrics.timer('identity_matrix', n * (n - 1) // 2):
+        for i, row in iter_identity_rows(sequences):
+            matrix[i, i + 1:] = row
+            matrix[i + 1:, i] = row
+    np.fill_diagonal(matrix, 100.0)
+    return matrix
+
+
+def fasta_identity_matrix(*fasta_paths, max_sequences=None):
+    """
+    (record ids, identity matrix) over every record of one or more multi-FASTA files.
+
+    Raises ValueError for more than max_sequences records.
+    """
+    records = [record for path in fasta_paths for record in SeqIO.parse(str(path), 'fasta')]
+    if max_sequences and len(records) > max_sequences:
+        raise ValueError(f"{len(records)} sequences; at most {max_sequences} can be compared")
+    return [record.id for record in records], identity_matrix([record.seq for record in records])
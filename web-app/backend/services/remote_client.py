@@ -0,0 +1,185 @@
+"""
+Shared HTTP client for the remote alignment services (EBI, NCBI)
+
+One aiohttp session with a bounded connection pool is reused for every
+request instead of a new session per alignment. Remote jobs are polled with
+exponential backoff rather than at a fixed interval. Identical submissions
+(same tool, parameters and sequences) are run once: callers that arrive
+while a job is in flight wait for the same job, and successful results are
+kept in a local SQLite cache so a repeat submission returns without
+contacting the service. The least recently used cache entries are evicted
+beyond MAX_ENTRIES, and entries older than MAX_AGE are not served.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import aiohttp
+
+from services import metrics
+
+CACHE_PATH = Path(__file__).parent.parent / 'temp' / 'cache' / 'remote_alignments.sqlite'
+MAX_ENTRIES = 10_000
+# Remote databases (nt, nr) change, so cached results expire
+MAX_AGE = 30 * 24 * 3600
+
+# Connection pool of the shared session
+MAX_CONNECTIONS = 20
+MAX_CONNECTIONS_PER_HOST = 8
+REQUEST_TIMEOUT = 60
+
+_sessions = {}
+_in_flight = {}
+_lock = threading.Lock()
+_connections = {}
+
+
+async def get_session():
+    """The shared client session of the running event loop"""
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS, limit_per_host=MAX_CONNECTIONS_PER_HOST,
+                                         ttl_dns_cache=300)
+        session = aiohttp.ClientSession(connector=connector,
+                                        timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT))
+        _sessions[loop] = session
+    return session
+
+
+async def close_session():
+    """Close the running loop's shared session (on application shutdown)"""
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+class PollTimeout(TimeoutError):
+    """A remote job had no result by the polling deadline"""
+
+
+async def poll(check, initial_delay=1.0, max_delay=15.0, factor=1.5, timeout=60.0):
+    """
+    Call check() until it returns something other than None.
+
+    Waits initial_delay before the first call and multiplies the delay by
+    factor after each one, up to max_delay. Raises PollTimeout once
+    timeout seconds have passed (a single request timing out raises the
+    client's own timeout error instead).
+    """
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise PollTimeout(f"No result after {timeout:g} seconds")
+        await asyncio.sleep(min(delay, remaining))
+        result = await check()
+        if result is not None:
+            return result
+        delay = min(delay * factor, max_delay)
+
+
+def job_key(tool, params, sequences):
+    """Cache key of a remote job: tool, parameters and a SHA-256 of the submitted sequences"""
+    sequence_hash = hashlib.sha256(sequences.encode()).hexdigest()
+    text = json.dumps({'tool': tool, 'params': params, 'sequences': sequence_hash}, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _connect(path):
+    path = path or CACHE_PATH
+    key = (os.getpid(), str(path))
+    if key not in _connections:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS remote_results (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS remote_results_last_used ON remote_results (last_used)")
+        conn.commit()
+        _connections[key] = conn
+    return _connections[key]
+
+
+def lookup(key, path=None, max_age=None):
+    """Cached result of a job, or None"""
+    max_age = max_age or MAX_AGE
+    with _lock:
+        conn = _connect(path)
+        now = time.time()
+        row = conn.execute("SELECT result FROM remote_results WHERE key = ? AND created > ?",
+                           (key, now - max_age)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE remote_results SET last_used = ? WHERE key = ?", (now, key))
+        conn.commit()
+    return json.loads(row[0])
+
+
+def store(key, result, path=None, max_entries=None):
+    """Save a job result and evict least recently used entries over max_entries"""
+    max_entries = max_entries or MAX_ENTRIES
+    with _lock:
+        conn = _connect(path)
+        now = time.time()
+        conn.execute("INSERT OR REPLACE INTO remote_results (key, result, created, last_used) "
+                     "VALUES (?, ?, ?, ?)", (key, json.dumps(result), now, now))
+        (count,) = conn.execute("SELECT COUNT(*) FROM remote_results").fetchone()
+        if count > max_entries:
+            conn.execute("DELETE FROM remote_results WHERE key IN "
+                         "(SELECT key FROM remote_results ORDER BY last_used LIMIT ?)", (count - max_entries,))
+        conn.commit()
+
+
+def clear(path=None):
+    """Remove every cached result"""
+    with _lock:
+        conn = _connect(path)
+        conn.execute("DELETE FROM remote_results")
+        conn.commit()
+
+
+async def cached_job(tool, params, sequences, run):
+    """
+    Result of await run() for a job, shared with identical jobs.
+
+    A cached result is returned with 'cached': True. Otherwise a job
+    already in flight with the same key is awaited, or run() is started.
+    Only results with 'success' set are cached.
+    """
+    key = job_key(tool, params, sequences)
+    cached = await asyncio.to_thread(lookup, key)
+    if cached is not None:
+        metrics.inc('remote_cache_hits_total', tool=tool)
+        return dict(cached, cached=True)
+
+    task = _in_flight.get(key)
+    if task is None:
+        metrics.inc('remote_cache_misses_total', tool=tool)
+        task = asyncio.ensure_future(_run_and_store(key, run))
+        _in_flight[key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    else:
+        metrics.inc('remote_jobs_deduplicated_total', tool=tool)
+    # One caller giving up must not cancel the job for the others
+    return dict(await asyncio.shield(task))
+
+
+async def _run_and_store(key, run):
+    result = await run()
+    if result.get('success'):
+        await asyncio.to_thread(store, key, result)
+    return result
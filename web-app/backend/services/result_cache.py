@@ -0,0 +1,146 @@
+"""
+On-disk cache of genome pipeline runs
+
+Every run lives in its own directory named by a SHA-256 over the genome hash
+(uploads are content-addressed), the pipeline version, the model and VFDB
+versions and the run parameters. A run is complete once its result.json has
+been written (atomically), so a repeat submission only has to read that
+file. Entries unused for MAX_AGE are removed, then the least recently used
+ones until the cache fits in MAX_BYTES. The content-addressed uploads the
+runs are keyed by get the same policy (evict_uploads, UPLOADS_MAX_BYTES).
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+
+CACHE_DIR = Path(__file__).parent.parent / 'temp' / 'cache' / 'pipeline'
+MAX_BYTES = 2 * 1024 ** 3
+MAX_AGE = 7 * 24 * 3600
+RESULT_FILE = 'result.json'
+UPLOADS_MAX_BYTES = 5 * 1024 ** 3
+# Uploads used this recently may still be read by a running job and are not evicted for size
+UPLOAD_BUSY_SECONDS = 3600
+
+
+def file_digest(handle, chunk_size=1 << 20):
+    """SHA-256 of a binary file object, read in chunks"""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: handle.read(chunk_size), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def run_key(**parts):
+    """Cache key for a run from its inputs and versions"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+def entry_dir(key, cache_dir=None):
+    """Directory holding one cached run"""
+    return Path(cache_dir or CACHE_DIR) / key
+
+
+def load(run_dir):
+    """Stored result of a completed run (marking it as recently used), or None"""
+    path = Path(run_dir) / RESULT_FILE
+    try:
+        result = json.loads(path.read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+    os.utime(run_dir)
+    return result
+
+
+def save(run_dir, result, cache_dir=None):
+    """Write a run's result, completing the entry, then evict old entries"""
+    run_dir = Path(run_dir)
+    tmp_path = run_dir / f"{RESULT_FILE}.{os.getpid()}.tmp"
+    tmp_path.write_text(json.dumps(result))
+    os.replace(tmp_path, run_dir / RESULT_FILE)
+    os.utime(run_dir)
+    evict(cache_dir, keep=run_dir.name)
+
+
+def _entry_size(run_dir):
+    return sum(path.stat().st_size for path in run_dir.iterdir() if path.is_file())
+
+
+def evict(cache_dir=None, max_bytes=None, max_age=None, keep=None):
+    """Remove entries unused for max_age seconds, then LRU entries beyond max_bytes"""
+    cache_dir = Path(cache_dir or CACHE_DIR)
+    max_bytes = max_bytes or MAX_BYTES
+    max_age = max_age or MAX_AGE
+    if not cache_dir.exists():
+        return 0
+
+    now = time.time()
+    entries = []
+    for run_dir in cache_dir.iterdir():
+        try:
+            entries.append((run_dir.stat().st_mtime, _entry_size(run_dir), run_dir))
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+    entries.sort(key=lambda entry: entry[0])
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for used, size, run_dir in entries:
+        expired = now - used > max_age
+        if not expired and total <= max_bytes:
+            break
+        # Runs still in progress have no result yet and are only removed once expired
+        if run_dir.name == keep or not (expired or (run_dir / RESULT_FILE).exists()):
+            continue
+        shutil.rmtree(run_dir, ignore_errors=True)
+        total -= size
+        removed += 1
+    return removed
+
+
+def evict_uploads(upload_dir, max_bytes=None, max_age=None, keep=None):
+    """
+    Remove uploads unused for max_age seconds, then LRU uploads beyond max_bytes.
+
+    The files of one upload (FASTA, 2-bit store, failure marker) start with
+    its file ID and are removed together; other files (part files of
+    abandoned uploads) only once they expire. keep is a file ID to spare.
+    """
+    upload_dir = Path(upload_dir)
+    max_bytes = max_bytes or UPLOADS_MAX_BYTES
+    max_age = max_age or MAX_AGE
+    if not upload_dir.exists():
+        return 0
+
+    groups = {}
+    for path in upload_dir.iterdir():
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        match = re.match(r'[0-9a-f]{64}', path.name)
+        key = match.group(0) if match else path.name
+        used, size, paths = groups.get(key, (0, 0, []))
+        groups[key] = (max(used, stat.st_mtime), size + stat.st_size, paths + [path])
+    entries = sorted(((used, size, key, paths) for key, (used, size, paths) in groups.items()),
+                     key=lambda entry: entry[0])
+
+    now = time.time()
+    total = sum(size for _, size, _, _ in entries)
+    removed = 0
+    for used, size, key, paths in entries:
+        expired = now - used > max_age
+        if not expired and total <= max_bytes:
+            break
+        is_upload = re.fullmatch(r'[0-9a-f]{64}', key) is not None
+        if key == keep or not (expired or (is_upload and now - used > UPLOAD_BUSY_SECONDS)):
+            continue
+        for path in paths:
+            path.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    return removed
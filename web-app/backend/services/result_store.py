@@ -0,0 +1,186 @@
+"""
+Queryable store of a pipeline run's scored ORFs
+
+Each finished run gets a SQLite file next to its other outputs with one row
+per scored ORF (row_id = position in the pipeline output) and indexes on
+vf_score, classification, contig and length, so pages can be sorted and
+filtered on the server. Pagination is keyset-based: the cursor carries the
+sort value and row_id of the last row returned, and the next page starts
+right after it instead of skipping OFFSET rows.
+"""
+
+import base64
+import json
+import sqlite3
+from pathlib import Path
+
+STORE_FILE = 'scores.sqlite'
+
+# Columns of the orfs table (also the fields of a returned row)
+COLUMNS = {
+    'orf_id': 'TEXT',
+    'vf_score': 'INTEGER',
+    'classification': 'TEXT',
+    'ml_score': 'INTEGER',
+    'ml_probability': 'REAL',
+    'blast_score': 'INTEGER',
+    'blast_identity': 'REAL',
+    'signalp_score': 'INTEGER',
+    'length': 'INTEGER',
+    'contig': 'TEXT',
+    'start': 'INTEGER',
+    'end': 'INTEGER',
+    'strand': 'TEXT',
+    'frame': 'INTEGER'
+}
+
+INDEXES = {
+    'idx_vf_score': ('vf_score',),
+    'idx_classification': ('classification', 'vf_score'),
+    'idx_contig': ('contig',),
+    'idx_length': ('length',),
+    'idx_ml_score': ('ml_score',),
+    'idx_blast_score': ('blast_score',)
+}
+
+# Sort keys accepted by query_orfs ('row' keeps pipeline order)
+SORT_COLUMNS = {'row', 'vf_score', 'ml_score', 'ml_probability', 'blast_score',
+                'signalp_score', 'length', 'contig'}
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidQuery(ValueError):
+    pass
+
+
+def store_path(run_dir):
+    return Path(run_dir) / STORE_FILE
+
+
+def build_store(run_dir, table):
+    """Write a run's scored OrfTable to its SQLite store (replacing any previous one)"""
+    path = store_path(run_dir)
+    tmp_path = path.with_suffix('.tmp')
+    tmp_path.unlink(missing_ok=True)
+
+    fields = list(COLUMNS)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        columns = ', '.join(f'"{name}" {kind}' for name, kind in COLUMNS.items())
+        conn.execute(f"CREATE TABLE orfs (row_id INTEGER PRIMARY KEY, {columns})")
+        values = [table.field_values(name) for name in fields]
+        placeholders = ', '.join('?' * (len(fields) + 1))
+        conn.executemany(f"INSERT INTO orfs VALUES ({placeholders})", zip(range(len(table)), *values))
+        # Indexes are cheaper to build once after the bulk insert
+        for name, index_columns in INDEXES.items():
+            conn.execute(f"CREATE INDEX {name} ON orfs ({', '.join(index_columns)})")
+        conn.commit()
+    finally:
+        conn.close()
+    tmp_path.replace(path)
+
+
+def _connect(run_dir):
+    path = store_path(run_dir)
+    if not path.exists():
+        return None
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def encode_cursor(value, row_id):
+    return base64.urlsafe_b64encode(json.dumps([value, row_id]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return value, int(row_id)
+    except (ValueError, TypeError):
+        raise InvalidQuery("Invalid cursor")
+
+
+def _filters(classification=None, min_score=None, max_score=None, contig=None,
+             min_length=None, max_length=None):
+    clauses, params = [], []
+    if classification:
+        labels = [classification] if isinstance(classification, str) else list(classification)
+        clauses.append(f"classification IN ({', '.join('?' * len(labels))})")
+        params.extend(labels)
+    for column, op, value in [('vf_score', '>=', min_score), ('vf_score', '<=', max_score),
+                              ('length', '>=', min_length), ('length', '<=', max_length),
+                              ('contig', '=', contig)]:
+        if value is not None:
+            clauses.append(f"{column} {op} ?")
+            params.append(value)
+    return clauses, params
+
+
+def query_orfs(run_dir, sort='vf_score', order='desc', limit=100, cursor=None, **filters):
+    """
+    One page of a run's scored ORFs.
+
+    Ties are broken by pipeline order (reversed for descending sorts). Returns {'orfs', 'total', 'next_cursor'}
+    (next_cursor is None on the last page), or None when the run has no store.
+    """
+    if sort not in SORT_COLUMNS:
+        raise InvalidQuery(f"Cannot sort by {sort}")
+    if order not in ('asc', 'desc'):
+        raise InvalidQuery(f"Invalid order {order}")
+    limit = min(max(int(limit), 1), MAX_PAGE_SIZE)
+    column = 'row_id' if sort == 'row' else sort
+
+    conn = _connect(run_dir)
+    if conn is None:
+        return None
+    try:
+        clauses, params = _filters(**filters)
+        total = conn.execute(f"SELECT COUNT(*) FROM orfs {_where(clauses)}", params).fetchone()[0]
+
+        if cursor:
+            value, row_id = decode_cursor(cursor)
+            op = '<' if order == 'desc' else '>'
+            if column == 'row_id':
+                clauses = clauses + [f"row_id {op} ?"]
+                params = params + [row_id]
+            else:
+                # Row-value comparison, so SQLite can seek in the (column, rowid) index
+                clauses = clauses + [f"({column}, row_id) {op} (?, ?)"]
+                params = params + [value, row_id]
+
+        direction = 'DESC' if order == 'desc' else 'ASC'
+        tie_break = '' if column == 'row_id' else f", row_id {direction}"
+        rows = conn.execute(
+            f"SELECT * FROM orfs {_where(clauses)} ORDER BY {column} {direction}{tie_break} LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+    finally:
+        conn.close()
+
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = page[-1]
+        next_cursor = encode_cursor(last['row_id'] if column == 'row_id' else last[column], last['row_id'])
+    return {
+        'orfs': [{name: row[name] for name in COLUMNS} for row in page],
+        'total': total,
+        'next_cursor': next_cursor
+    }
+
+
+def _where(clauses):
+    return f"WHERE {' AND '.join(clauses)}" if clauses else ''
+
+
+def run_stats(run_dir):
+    """ORF counts per classification for a run, or None when it has no store"""
+    conn = _connect(run_dir)
+    if conn is None:
+        return None
+    try:
+        counts = dict(conn.execute("SELECT classification, COUNT(*) FROM orfs GROUP BY classification"))
+    finally:
+        conn.close()
+    return {'total': sum(counts.values()), 'by_classification': counts}
@@ -0,0 +1,172 @@
+"""
+Response encodings for large ORF and score payloads
+
+Endpoints that return {'orfs': [...], ...} pick their encoding from the
+request's Accept and Accept-Encoding headers:
+
+- application/json (default), serialized with json.dumps directly instead
+  of FastAPI's jsonable_encoder pass
+- application/vnd.apache.arrow.stream: the rows as an Arrow IPC stream
+  (needs pyarrow); the other top-level fields go in the schema metadata
+  under b'summary' as JSON
+- application/msgpack: the same structure as the JSON (needs msgpack)
+
+JSON and MessagePack bodies above MIN_COMPRESS_BYTES are compressed with
+zstd (needs zstandard) or gzip when the client accepts it.
+"""
+
+import gzip
+import json
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+from services import metrics
+
+JSON = 'application/json'
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+MSGPACK = 'application/msgpack'
+MEDIA_ALIASES = {'application/x-msgpack': MSGPACK, 'application/vnd.msgpack': MSGPACK}
+
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 5
+ZSTD_LEVEL = 3
+
+
+def _module(name):
+    try:
+        return __import__(name)
+    except ImportError:
+        return None
+
+
+def available_media_types():
+    """Response media types the installed packages can produce, JSON first"""
+    types = [JSON]
+    if _module('pyarrow'):
+        types.append(ARROW_STREAM)
+    if _module('msgpack'):
+        types.append(MSGPACK)
+    return types
+
+
+def available_encodings():
+    encodings = ['gzip']
+    if _module('zstandard'):
+        encodings.insert(0, 'zstd')
+    return encodings
+
+
+def _parse_header(value):
+    """[(token, q)] from an Accept-style header, highest q first (stable)"""
+    items = []
+    for part in (value or '').split(','):
+        token, *params = [piece.strip() for piece in part.split(';')]
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        items.append((token.lower(), q))
+    return sorted(items, key=lambda item: -item[1])
+
+
+def negotiate(accept=None, accept_encoding=None):
+    """
+    (media_type, content_encoding) for a request.
+
+    Missing or wildcard Accept gives JSON; content_encoding is None when no
+    supported compression is accepted. Returns media_type None if nothing in
+    Accept can be produced.
+    """
+    media_type = JSON if not accept else None
+    supported = available_media_types()
+    for token, q in _parse_header(accept):
+        token = MEDIA_ALIASES.get(token, token)
+        if q <= 0:
+            continue
+        if token in ('*/*', 'application/*'):
+            media_type = JSON
+            break
+        if token in supported:
+            media_type = token
+            break
+
+    encoding = None
+    if media_type in (JSON, MSGPACK):
+        accepted = {token: q for token, q in _parse_header(accept_encoding)}
+        for candidate in available_encodings():
+            if accepted.get(candidate, accepted.get('*', 0)) > 0:
+                encoding = candidate
+                break
+    return media_type, encoding
+
+
+def encode_json(payload):
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+
+
+def encode_msgpack(payload):
+    import msgpack
+
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def encode_arrow(payload, rows_key='orfs'):
+    """Arrow IPC stream of payload[rows_key]; remaining fields as JSON metadata"""
+    import pyarrow as pa
+
+    table = pa.Table.from_pylist(payload.get(rows_key) or [])
+    summary = {key: value for key, value in payload.items() if key != rows_key}
+    table = table.replace_schema_metadata({b'summary': json.dumps(summary).encode()})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def decode_arrow(body):
+    """(pyarrow.Table, summary dict) from an encode_arrow() body"""
+    import pyarrow as pa
+
+    table = pa.ipc.open_stream(body).read_all()
+    summary = json.loads((table.schema.metadata or {}).get(b'summary', b'{}'))
+    return table, summary
+
+
+ENCODERS = {JSON: encode_json, MSGPACK: encode_msgpack, ARROW_STREAM: encode_arrow}
+
+
+def compress(body, encoding):
+    if encoding == 'zstd':
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def encode_payload(payload, media_type=JSON, encoding=None):
+    """(body, content_encoding) for a payload; small bodies are left uncompressed"""
+    with metrics.timer('encode', format=media_type.rsplit('/', 1)[-1]):
+        body = ENCODERS[media_type](payload)
+    if encoding and len(body) >= MIN_COMPRESS_BYTES:
+        with metrics.timer('compress', encoding=encoding):
+            return compress(body, encoding), encoding
+    return body, None
+
+
+def encoded_response(payload, headers):
+    """Response for a payload in the format the request headers ask for"""
+    media_type, encoding = negotiate(headers.get('accept'), headers.get('accept-encoding'))
+    if media_type is None:
+        raise HTTPException(status_code=406, detail=f"Supported formats: {', '.join(available_media_types())}")
+
+    body, encoding = encode_payload(payload, media_type, encoding)
+    response_headers = {'Vary': 'Accept, Accept-Encoding'}
+    if encoding:
+        response_headers['Content-Encoding'] = encoding
+    return Response(content=body, media_type=media_type, headers=response_headers)
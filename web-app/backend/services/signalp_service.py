@@ -1,3 +1,7 @@
+import numpy as np
+
+from services import metrics
+
 def predict_signal_peptide(sequence, cutoff=20):
     """
     Simple heuristic-based signal peptide prediction.
@@ -62,3 +66,58 @@ def predict_signal_peptide(sequence, cutoff=20):
         'positive_charge': positive_count,
         'small_cleavage': small_count
     }
+
+def _residue_table(residues):
+    """Lookup table flagging the given residues by byte value"""
+    table = np.zeros(256, dtype=np.int8)
+    table[np.frombuffer(residues.encode(), dtype=np.uint8)] = 1
+    return table
+
+_HYDROPHOBIC_TABLE = _residue_table('AILMFWYV')
+_POSITIVE_TABLE = _residue_table('KR')
+_SMALL_TABLE = _residue_table('AGS')
+
+@metrics.timed('signalp')
+def predict_signal_peptides(sequences, cutoff=20):
+    """
+    Batch version of predict_signal_peptide.
+
+    The N-terminal windows of all sequences are sliced into one 2D uint8
+    matrix and residue classes are counted with lookup tables, giving the
+    same values as calling predict_signal_peptide on each sequence.
+    """
+    n = len(sequences)
+    width = max(cutoff, 20)
+    # Padding byte 0 belongs to no residue class
+    windows = np.zeros((n, width), dtype=np.uint8)
+    lengths = np.zeros(n, dtype=np.int64)
+    for row, sequence in enumerate(sequences):
+        head = sequence[:width].encode('ascii', errors='replace')
+        windows[row, :len(head)] = np.frombuffer(head, dtype=np.uint8)
+        lengths[row] = len(sequence)
+
+    has_window = lengths >= cutoff
+    hydrophobic_count = _HYDROPHOBIC_TABLE[windows[:, :cutoff]].sum(axis=1)
+    hydrophobic_ratio = hydrophobic_count / max(cutoff, 1)
+    positive_count = _POSITIVE_TABLE[windows[:, :5]].sum(axis=1)
+    small_count = np.where(lengths >= 20, _SMALL_TABLE[windows[:, 15:20]].sum(axis=1), 0)
+
+    # Accumulate in the same order as the scalar heuristic so floats match exactly
+    score = np.zeros(n)
+    score += np.where(hydrophobic_ratio > 0.4, 0.5, np.where(hydrophobic_ratio > 0.3, 0.3, 0.0))
+    score += np.where(positive_count >= 2, 0.3, np.where(positive_count >= 1, 0.2, 0.0))
+    score += np.where(small_count >= 2, 0.2, np.where(small_count >= 1, 0.1, 0.0))
+
+    results = []
+    for row in range(n):
+        if not has_window[row]:
+            results.append({'has_signal': False, 'score': 0.0})
+            continue
+        results.append({
+            'has_signal': bool(score[row] >= 0.5),
+            'score': float(score[row]),
+            'hydrophobic_ratio': float(hydrophobic_ratio[row]),
+            'positive_charge': int(positive_count[row]),
+            'small_cleavage': int(small_count[row])
+        })
+    return results
@@ -0,0 +1,227 @@
+"""
+Bounded execution of external tools (blastp, blastn, makeblastdb, mafft)
+
+Every tool process is started with asyncio on one event loop owned by this
+module and running in a background thread, so async endpoints can await a
+tool without blocking the server loop and worker threads can wait for one
+with run_tool_sync(). Each tool has its own budget of slots, one per core
+by default; a call takes as many slots as the threads it asks the tool to
+use, so a burst of requests queues instead of oversubscribing the CPUs.
+
+Input is written to the tool's stdin and stdout is read line by line as the
+tool writes it (handed to an on_line callback, or collected), so callers do
+not need temporary query or output files. A run can be limited by the time
+spent queued and the time spent running. A run that ends early for any
+reason (timeout, cancellation, a failing on_line callback) kills the
+process before its slots are released. Queue depth, running processes and
+queue/run times are exported through services.metrics.
+"""
+
+import asyncio
+import contextlib
+import os
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+
+from services import metrics
+
+DEFAULT_SLOTS = os.cpu_count() or 1
+# Slots per tool where one per core is not right
+TOOL_SLOTS = {}
+# Longest stdout line accepted (tools like mafft can write long lines)
+LINE_LIMIT = 16 * 1024 * 1024
+
+ToolResult = namedtuple('ToolResult', 'returncode stdout stderr')
+
+
+class ToolError(RuntimeError):
+    """A tool exited with a non-zero status"""
+
+    def __init__(self, tool, returncode, stderr):
+        super().__init__(stderr.strip() or f"{tool} exited with status {returncode}")
+        self.tool = tool
+        self.returncode = returncode
+        self.stderr = stderr
+
+
+class ToolTimeout(TimeoutError):
+    """A tool waited in its queue or ran longer than allowed"""
+
+
+class _Slots:
+    """Weighted semaphore: a call holds n of the tool's slots while it runs"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.used = 0
+        self.waiting = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, n):
+        async with self._condition:
+            self.waiting += 1
+            try:
+                await self._condition.wait_for(lambda: self.used + n <= self.capacity)
+            finally:
+                self.waiting -= 1
+            self.used += n
+
+    async def release(self, n):
+        async with self._condition:
+            self.used -= n
+            self._condition.notify_all()
+
+
+class _Executor:
+    """Event loop thread and per-tool slots of one process"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.slots = {}
+        self.thread = threading.Thread(target=self.loop.run_forever, name='tool-executor', daemon=True)
+        self.thread.start()
+
+    def tool_slots(self, tool):
+        if tool not in self.slots:
+            self.slots[tool] = _Slots(TOOL_SLOTS.get(tool, DEFAULT_SLOTS))
+        return self.slots[tool]
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def _executor():
+    # The loop thread does not survive a fork, so each process starts its own
+    with _executors_lock:
+        pid = os.getpid()
+        if pid not in _executors:
+            _executors[pid] = _Executor()
+        return _executors[pid]
+
+
+async def _read_lines(stream, on_line):
+    async for line in stream:
+        on_line(line.decode(errors='replace').rstrip('\r\n'))
+
+
+async def _write_stdin(stream, data):
+    try:
+        if data:
+            stream.write(data)
+            await stream.drain()
+        stream.close()
+    except (BrokenPipeError, ConnectionResetError):
+        # The tool exited without reading all of its input; its status says why
+        pass
+
+
+async def _run(cmd, stdin, on_line, threads, timeout, queue_timeout, check):
+    tool = Path(cmd[0]).name
+    slots = _executor().tool_slots(tool)
+    n = min(max(threads, 1), slots.capacity)
+
+    queued = time.perf_counter()
+    metrics.add_gauge('tool_queue_depth', 1, tool=tool)
+    try:
+        await asyncio.wait_for(slots.acquire(n), queue_timeout)
+    except asyncio.TimeoutError:
+        metrics.inc('subprocess_failures_total', tool=tool)
+        raise ToolTimeout(f"{tool} still queued after {queue_timeout} seconds")
+    finally:
+        metrics.add_gauge('tool_queue_depth', -1, tool=tool)
+    metrics.observe('tool_queue_seconds', time.perf_counter() - queued, tool=tool)
+
+    metrics.add_gauge('tool_running', 1, tool=tool)
+    started = time.perf_counter()
+    process = None
+    try:
+        metrics.inc('subprocess_total', tool=tool)
+        process = await asyncio.create_subprocess_exec(
+            *map(str, cmd), stdin=asyncio.subprocess.PIPE if stdin is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, limit=LINE_LIMIT)
+
+        stdout = []
+        stderr = []
+        tasks = [asyncio.ensure_future(_read_lines(process.stdout, on_line or stdout.append)),
+                 asyncio.ensure_future(_read_lines(process.stderr, stderr.append))]
+        if stdin is not None:
+            tasks.append(asyncio.ensure_future(
+                _write_stdin(process.stdin, stdin.encode() if isinstance(stdin, str) else stdin)))
+
+        async def communicate():
+            await asyncio.gather(*tasks)
+            return await process.wait()
+
+        # One deadline covers reading the output and waiting for the exit
+        try:
+            returncode = await asyncio.wait_for(communicate(), timeout)
+        except asyncio.TimeoutError:
+            raise ToolTimeout(f"{tool} timed out after {timeout} seconds")
+
+        result = ToolResult(returncode, '\n'.join(stdout) + '\n' if stdout else '', '\n'.join(stderr))
+        if returncode != 0:
+            metrics.inc('subprocess_failures_total', tool=tool)
+            if check:
+                raise ToolError(tool, returncode, result.stderr)
+        return result
+
+    except ToolError:
+        raise
+
+    except BaseException:
+        metrics.inc('subprocess_failures_total', tool=tool)
+        raise
+
+    finally:
+        # Whatever ended the run (timeout, cancellation, an on_line callback
+        # raising, a line over LINE_LIMIT), the process must not outlive its slots
+        if process is not None:
+            for task in tasks:
+                task.cancel()
+            if process.returncode is None:
+                with contextlib.suppress(ProcessLookupError):
+                    process.kill()
+                await process.wait()
+        metrics.observe('tool_run_seconds', time.perf_counter() - started, tool=tool)
+        metrics.add_gauge('tool_running', -1, tool=tool)
+        await slots.release(n)
+
+
+def _submit(cmd, stdin, on_line, threads, timeout, queue_timeout, check):
+    executor = _executor()
+    if threading.current_thread() is executor.thread:
+        raise RuntimeError("Tools cannot be waited for from the tool executor thread")
+    return asyncio.run_coroutine_threadsafe(
+        _run(cmd, stdin, on_line, threads, timeout, queue_timeout, check), executor.loop)
+
+
+async def run_tool(cmd, stdin=None, on_line=None, threads=1, timeout=None, queue_timeout=None,
+                   check=True):
+    """
+    Run an external tool under its slot budget and return a ToolResult.
+
+    stdin (str or bytes) is written to the tool's standard input. Each
+    stdout line (without its newline) goes to on_line as it is read, in the
+    executor thread; without on_line stdout is collected into the result.
+    threads is the number of slots held. Raises ToolTimeout when queued
+    longer than queue_timeout or running longer than timeout seconds, and
+    ToolError for a non-zero exit when check is set. Cancelling the caller
+    kills the process.
+    """
+    return await asyncio.wrap_future(_submit(cmd, stdin, on_line, threads, timeout, queue_timeout, check))
+
+
+def run_tool_sync(cmd, stdin=None, on_line=None, threads=1, timeout=None, queue_timeout=None,
+                  check=True):
+    """run_tool() for worker threads and processes; blocks until the tool has finished"""
+    return _submit(cmd, stdin, on_line, threads, timeout, queue_timeout, check).result()
+
+
+def queue_state():
+    """{tool: {'capacity', 'used', 'waiting'}} of the slots in this process"""
+    executor = _executor()
+    return {tool: {'capacity': slots.capacity, 'used': slots.used, 'waiting': slots.waiting}
+            for tool, slots in executor.slots.items()}
@@ -0,0 +1,66 @@
+"""
+VF scoring pipeline shared by the API endpoints and background jobs
+
+Each evidence source runs as one batched stage over all ORF sequences
+(ML -> BLAST -> SignalP) before the per-ORF scores are combined.
+"""
+
+from services.ml_prediction import predict_vf_ml_batch
+from services.blast_service import run_blast_vfdb_batch
+from services.signalp_service import predict_signal_peptides
+from services.scoring import calculate_vf_score, classify_vf
+
+# (name, batch function) in execution order
+STAGES = [
+    ('ml', predict_vf_ml_batch),
+    ('blast', run_blast_vfdb_batch),
+    ('signalp', predict_signal_peptides),
+]
+# Fields of a VF score row, in order
+SCORE_FIELDS = ('orf_id', 'vf_score', 'classification', 'ml_score', 'ml_probability',
+                'blast_score', 'blast_identity', 'signalp_score', 'length')
+
+def ml_points(probability):
+    """ML score (0-2) from the predicted VF probability"""
+    return 2 if probability >= 0.7 else (1 if probability >= 0.5 else 0)
+
+def combine_scores(orfs, ml_results, blast_results, signalp_results):
+    """Per-ORF VF score rows from the results of every stage"""
+    return score_records(scored_columns([orf['orf_id'] for orf in orfs], [orf['sequence'] for orf in orfs],
+                                        ml_results, blast_results, signalp_results))
+
+def scored_columns(orf_ids, sequences, ml_results, blast_results, signalp_results):
+    """The SCORE_FIELDS of every ORF as column lists"""
+    return dict(score_columns(ml_results, blast_results, signalp_results),
+                orf_id=orf_ids, length=[len(sequence) for sequence in sequences])
+
+def score_records(columns):
+    """VF score rows (SCORE_FIELDS dicts) of scored_columns()"""
+    return [dict(zip(SCORE_FIELDS, row)) for row in zip(*(columns[name] for name in SCORE_FIELDS))]
+
+def score_columns(ml_results, blast_results, signalp_results):
+    """The per-ORF score fields of combine_scores as column lists (for an OrfTable)"""
+    ml_score = [ml_points(result['probability']) for result in ml_results]
+    blast_score = [result['score'] for result in blast_results]
+    signalp_score = [1 if result['has_signal'] else 0 for result in signalp_results]
+    vf_score = [calculate_vf_score(*scores) for scores in zip(ml_score, blast_score, signalp_score)]
+
+    return {
+        'vf_score': vf_score,
+        'classification': [classify_vf(score) for score in vf_score],
+        'ml_score': ml_score,
+        'ml_probability': [result['probability'] for result in ml_results],
+        'blast_score': blast_score,
+        'blast_identity': [float(result.get('identity', 0)) for result in blast_results],
+        'signalp_score': signalp_score
+    }
+
+def score_orf_columns(orfs):
+    """Run every stage over the ORFs and return their scored_columns()"""
+    orf_ids = [orf['orf_id'] for orf in orfs]
+    sequences = [orf['sequence'] for orf in orfs]
+    return scored_columns(orf_ids, sequences, *[run(sequences) for _, run in STAGES])
+
+def score_orfs(orfs):
+    """Run every stage over the ORFs and return their VF score rows"""
+    return score_records(score_orf_columns(orfs))
@@ -0,0 +1,298 @@
+"""
+K-mer prefilter over VFDB
+
+An inverted index from amino-acid k-mers to the VFDB proteins containing
+them is built once from VFDB_setB_pro.fas and memory-mapped from disk. ORFs
+that do not share at least min_shared distinct k-mers with any single VFDB
+protein cannot produce a meaningful hit and are not sent to BLAST.
+
+Usage:
+    python -m services.vfdb_prefilter build
+    python -m services.vfdb_prefilter report genome.fasta
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+from Bio import SeqIO
+
+from services.features import AMINO_ACIDS, pack_sequences, residue_codes
+
+VFDB_PATH = Path(__file__).parent.parent / 'databases' / 'vfdb' / 'VFDB_setB_pro.fas'
+KMER_SIZE = 5
+# Distinct k-mers an ORF must share with one VFDB protein; 2 halves BLAST work
+# further but drops divergent homologs that share a single seed
+MIN_SHARED = 1
+INDEX_DIR = VFDB_PATH.parent / 'prefilter'
+# K-mer codes times the subject or query count must fit an int64
+MAX_KMER_SIZE = 10
+
+_ALPHABET = len(AMINO_ACIDS)
+_indexes = {}
+_index_lock = threading.Lock()
+
+
+def check_kmer_size(k):
+    """Raise ValueError unless k is a usable k-mer size"""
+    if not 1 <= k <= MAX_KMER_SIZE:
+        raise ValueError(f"k-mer size must be between 1 and {MAX_KMER_SIZE}, got {k}")
+
+
+def kmer_dtype(k):
+    """Smallest unsigned dtype holding every base-20 code of a k-mer"""
+    return np.uint32 if _ALPHABET ** k <= 2 ** 32 else np.uint64
+
+
+def kmer_codes(sequences, k=KMER_SIZE):
+    """
+    Integer codes of all k-mers of standard residues in a batch of proteins.
+
+    Returns (rows, codes): the sequence index and code of every k-mer; k-mers
+    spanning a non-standard residue or a sequence boundary are dropped.
+    """
+    buffer, offsets = pack_sequences(sequences)
+    residues = residue_codes(buffer)
+    n = len(residues) - k + 1
+    if n <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    codes = np.zeros(n, dtype=np.int64)
+    for j in range(k):
+        codes = codes * _ALPHABET + residues[j:j + n]
+
+    # A window is valid if it has no non-standard residue and ends in its own sequence
+    bad = np.concatenate(([0], np.cumsum(residues >= _ALPHABET)))
+    valid = bad[k:k + n] == bad[:n]
+    rows = np.repeat(np.arange(len(sequences)), np.diff(offsets))
+    valid &= rows[:n] == rows[k - 1:k - 1 + n]
+    return rows[:n][valid], codes[valid]
+
+
+INDEX_FORMAT = 3
+INDEX_FILES = ('kmers', 'indptr', 'subjects', 'residues', 'offsets')
+
+
+def _index_meta(fasta_path, k):
+    stat = Path(fasta_path).stat()
+    return {'format': INDEX_FORMAT, 'k': k, 'fasta_size': stat.st_size,
+            'fasta_mtime_ns': stat.st_mtime_ns}
+
+
+def _read_meta(index_dir):
+    try:
+        return json.loads((Path(index_dir) / 'meta.json').read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def build_index(fasta_path=None, index_dir=None, k=KMER_SIZE):
+    """
+    Build the k-mer -> subject inverted index (CSR layout) and save it as .npy files.
+
+    Each build writes a new build-* directory and then switches meta.json
+    to it with an atomic replace, so files another process has mapped are
+    never rewritten and a reader never sees a half-written index. Older
+    builds except the one just replaced are removed. Raises ValueError for
+    a k outside 1..MAX_KMER_SIZE.
+    """
+    check_kmer_size(k)
+    fasta_path = fasta_path or VFDB_PATH
+    index_dir = Path(index_dir or INDEX_DIR)
+    records = list(SeqIO.parse(str(fasta_path), 'fasta'))
+    sequences = [str(rec.seq) for rec in records]
+    rows, codes = kmer_codes(sequences, k)
+
+    # Distinct (k-mer, subject) pairs, sorted by k-mer then subject
+    n_subjects = max(len(records), 1)
+    pairs = np.unique(codes * n_subjects + rows)
+    kmers, counts = np.unique(pairs // n_subjects, return_counts=True)
+    indptr = np.zeros(len(kmers) + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+
+    index_dir.mkdir(parents=True, exist_ok=True)
+    build_dir = Path(tempfile.mkdtemp(prefix='build-', dir=index_dir))
+    np.save(build_dir / 'kmers.npy', kmers.astype(kmer_dtype(k)))
+    np.save(build_dir / 'indptr.npy', indptr)
+    np.save(build_dir / 'subjects.npy', (pairs % n_subjects).astype(np.int32))
+    # Subject sequences as residue codes, for in-process alignment of candidates
+    buffer, offsets = pack_sequences(sequences)
+    np.save(build_dir / 'residues.npy', residue_codes(buffer).astype(np.uint8))
+    np.save(build_dir / 'offsets.npy', offsets)
+    (build_dir / 'ids.txt').write_text(''.join(f"{rec.id}\n" for rec in records))
+
+    previous = (_read_meta(index_dir) or {}).get('build')
+    meta_tmp = build_dir / 'meta.json'
+    meta_tmp.write_text(json.dumps(dict(_index_meta(fasta_path, k), build=build_dir.name)))
+    os.replace(meta_tmp, index_dir / 'meta.json')
+
+    # The replaced build may still be in use by a reader that just read the old meta.json
+    for path in index_dir.glob('build-*'):
+        if path.name not in (build_dir.name, previous):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def load_index(fasta_path=None, index_dir=None, k=None):
+    """
+    Memory-mapped prefilter index, (re)built if missing or older than the FASTA.
+
+    k defaults to the k-mer size the index on disk was built with (see
+    build --kmer-size), or KMER_SIZE when there is none. Returns None when
+    the VFDB FASTA is not available.
+    """
+    fasta_path = fasta_path or VFDB_PATH
+    index_dir = Path(index_dir or INDEX_DIR)
+    if not Path(fasta_path).exists():
+        return None
+
+    with _index_lock:
+        stored = _read_meta(index_dir)
+        if k is None:
+            k = stored['k'] if stored and stored.get('format') == INDEX_FORMAT else KMER_SIZE
+        meta = _index_meta(fasta_path, k)
+
+        cached = _indexes.get(str(index_dir))
+        if cached is not None and cached['meta'] == meta and stored and cached['build'] == stored.get('build'):
+            return cached
+
+        if stored is None or {key: stored.get(key) for key in meta} != meta:
+            build_index(fasta_path, index_dir, k)
+            stored = _read_meta(index_dir)
+
+        build_dir = index_dir / stored['build']
+        index = {
+            'meta': meta,
+            'build': stored['build'],
+            'k': k,
+            **{name: np.load(build_dir / f"{name}.npy", mmap_mode='r') for name in INDEX_FILES},
+            'ids': (build_dir / 'ids.txt').read_text().splitlines()
+        }
+        _indexes[str(index_dir)] = index
+        return index
+
+
+def candidate_subjects(sequences, index, min_shared=MIN_SHARED):
+    """
+    VFDB subject indices sharing at least min_shared distinct k-mers with each sequence.
+
+    Returns one sorted int array per sequence; an empty array means the
+    sequence can be skipped.
+    """
+    rows, codes = kmer_codes(sequences, index['k'])
+    kmers = index['kmers']
+    indptr = index['indptr']
+    subjects = index['subjects']
+
+    # Distinct k-mers per query that occur anywhere in VFDB
+    space = _ALPHABET ** index['k']
+    pairs = np.unique(rows * space + codes)
+    rows, codes = pairs // space, pairs % space
+    if len(kmers):
+        # Same dtype as the index, so searchsorted does not compare as float
+        codes = codes.astype(kmers.dtype)
+        pos = np.minimum(np.searchsorted(kmers, codes), len(kmers) - 1)
+        present = kmers[pos] == codes
+    else:
+        pos = present = np.zeros(len(codes), dtype=bool)
+    rows, pos = rows[present], pos[present]
+
+    candidates = [np.empty(0, dtype=np.int32) for _ in sequences]
+    if not len(pos):
+        return candidates
+
+    bounds = np.searchsorted(rows, np.arange(len(sequences) + 1))
+    for i in range(len(sequences)):
+        query_pos = pos[bounds[i]:bounds[i + 1]]
+        if len(query_pos) < min_shared:
+            continue
+        starts = indptr[query_pos]
+        lengths = indptr[query_pos + 1] - starts
+        # Concatenated posting lists of this query's k-mers
+        flat = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+        flat += np.arange(lengths.sum())
+        hits, shared = np.unique(subjects[flat], return_counts=True)
+        candidates[i] = hits[shared >= min_shared].astype(np.int32)
+    return candidates
+
+
+def prefilter(sequences, min_shared=MIN_SHARED):
+    """
+    Which sequences are worth sending to BLAST.
+
+    Returns a list of booleans, or None when no index is available (in which
+    case everything should be searched).
+    """
+    index = load_index()
+    if index is None:
+        return None
+    return [len(c) > 0 for c in candidate_subjects(sequences, index, min_shared)]
+
+
+def recall_report(fasta_file, min_length=100, min_shared=MIN_SHARED):
+    """
+    Compare the prefilter with unfiltered BLAST on the ORFs of a genome.
+
+    Recall is the fraction of ORFs with a BLAST hit that the prefilter
+    keeps; reduction is the fraction of ORFs it saves from BLAST.
+    """
+    from services.blast_service import run_blast_vfdb_batch
+    from services.orf_prediction import predict_orf_table
+
+    index = load_index()
+    if index is None:
+        raise FileNotFoundError(f"VFDB not found at {VFDB_PATH}")
+
+    sequences = predict_orf_table(fasta_file, min_length).sequences()
+    blast = run_blast_vfdb_batch(sequences, use_cache=False, use_prefilter=False)
+    keep = [len(c) > 0 for c in candidate_subjects(sequences, index, min_shared)]
+
+    hits = [r['has_hit'] for r in blast]
+    scored = [r['score'] > 0 for r in blast]
+    kept_hits = sum(1 for h, k in zip(hits, keep) if h and k)
+    kept_scored = sum(1 for s, k in zip(scored, keep) if s and k)
+
+    return {
+        'genome': str(fasta_file),
+        'kmer_size': index['k'],
+        'min_shared': min_shared,
+        'num_orfs': len(sequences),
+        'num_candidates': sum(keep),
+        'reduction': round(1 - sum(keep) / len(sequences), 4) if sequences else 0,
+        'blast_hits': sum(hits),
+        'hits_kept': kept_hits,
+        'recall': round(kept_hits / sum(hits), 4) if any(hits) else 1.0,
+        'scoring_hits': sum(scored),
+        'scoring_recall': round(kept_scored / sum(scored), 4) if any(scored) else 1.0,
+        'blast_errors': sum(1 for r in blast if 'error' in r)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VFDB k-mer prefilter")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help="build the index from VFDB_setB_pro.fas")
+    build.add_argument('--kmer-size', type=int, default=KMER_SIZE)
+    report = sub.add_parser('report', help="recall against unfiltered BLAST on a genome")
+    report.add_argument('genome')
+    report.add_argument('--min-shared', type=int, default=MIN_SHARED)
+    report.add_argument('--min-length', type=int, default=100)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        try:
+            check_kmer_size(args.kmer_size)
+        except ValueError as e:
+            parser.error(str(e))
+        build_index(k=args.kmer_size)
+        print(f"Index (k={args.kmer_size}) written to {INDEX_DIR}; later loads use this k")
+    else:
+        print(json.dumps(recall_report(args.genome, args.min_length, args.min_shared), indent=2))
+
+
+if __name__ == '__main__':
+    main()
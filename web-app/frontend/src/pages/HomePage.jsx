@@ -375,7 +375,7 @@ function HomePage() {
           <input
             id="fileInput"
             type="file"
-            accept=".fasta,.fa,.fna"
+            accept=".fasta,.fa,.fna,.gz,.bgz"
             style={{ display: 'none' }}
             onChange={handleChange}
           />
@@ -424,7 +424,7 @@ function HomePage() {
                 Drop genome file here or click to browse
               </p>
               <p style={{ color: '#718096', marginTop: '0.5rem' }}>
-                Supported: .fasta, .fa, .fna
+                Supported: .fasta, .fa, .fna (optionally gzipped: .gz, .bgz)
               </p>
             </div>
           )}
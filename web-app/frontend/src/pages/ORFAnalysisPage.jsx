@@ -12,49 +12,63 @@ function ORFAnalysisPage({ setResults }) {
   const [stage, setStage] = useState('')
   const [orfData, setOrfData] = useState(null)
 
+  const stageLabels = {
+    queued: 'Waiting for a worker...',
+    orfs: 'Predicting ORFs...',
+    ml: 'Running ML predictions...',
+    blast: 'Running BLAST analysis...',
+    signalp: 'Detecting signal peptides...',
+    scoring: 'Calculating VF scores...'
+  }
+
   const handleAnalysis = async () => {
-    if (!file) {
+    if (!file && !location.state?.fileId) {
       alert('Please upload a genome file')
       return
     }
     
     setLoading(true)
-    const formData = new FormData()
-    formData.append('file', file)
     
     try {
-      // Step 1: ORF Prediction
-      setStage('Predicting ORFs...')
-      setProgress(20)
-      const orfResponse = await axios.post('/api/predict_orfs', formData, {
-        headers: { 'Content-Type': 'multipart/form-data' }
-      })
-      setOrfData(orfResponse.data)
-      
-      // Step 2: VF Scoring
-      setStage('Running ML predictions...')
-      setProgress(40)
-      await new Promise(resolve => setTimeout(resolve, 1000))
-      
-      setStage('Running BLAST analysis...')
-      setProgress(60)
-      await new Promise(resolve => setTimeout(resolve, 1500))
+      // Step 1: Start the pipeline. A new file is streamed to the server,
+      // which calls ORFs on its contigs while the rest is still uploading;
+      // a genome the home page already uploaded is referenced by its ID
+      let run
+      if (file) {
+        setStage('Uploading genome...')
+        setProgress(5)
+        const formData = new FormData()
+        formData.append('file', file)
+        run = (await axios.post('/api/pipeline/stream', formData, {
+          headers: { 'Content-Type': 'multipart/form-data' }
+        })).data
+      } else {
+        run = (await axios.post('/api/pipeline', { file_id: location.state.fileId })).data
+      }
       
-      setStage('Detecting virulence domains...')
-      setProgress(80)
-      await new Promise(resolve => setTimeout(resolve, 500))
+      // Step 2: The whole pipeline runs on the server (or comes from its
+      // cache for a genome analysed before); poll its progress
+      let job = (await axios.get(`/api/jobs/${run.job_id}`)).data
+      while (job.status === 'queued' || job.status === 'running') {
+        const stageIndex = Math.max(job.stages.indexOf(job.stage), 0)
+        const stageDone = job.orfs_total ? job.orfs_done / job.orfs_total : 0
+        setStage(stageLabels[job.stage] || job.stage)
+        setProgress(Math.round(10 + 85 * (stageIndex + stageDone) / job.stages.length))
+        if (job.summary) setOrfData(job.summary)
+        await new Promise(resolve => setTimeout(resolve, 1000))
+        job = (await axios.get(`/api/jobs/${run.job_id}`)).data
+      }
+      if (job.summary) setOrfData(job.summary)
       
-      setStage('Calculating VF scores...')
-      setProgress(90)
-      const scoreResponse = await axios.post('/api/vf_score', {
-        orfs: orfResponse.data.orfs
-      })
+      if (job.status !== 'done') {
+        throw new Error(job.error || `Pipeline ${job.status}`)
+      }
       
       setProgress(100)
       setStage('Analysis complete!')
       
-      // Save results and navigate
-      setResults(scoreResponse.data)
+      // Save the run and navigate; the results page queries it page by page
+      setResults({ run_id: run.run_id, total: job.num_results, summary: job.summary })
       setTimeout(() => navigate('/results'), 1000)
       
     } catch (error) {
@@ -213,7 +227,7 @@ function ORFAnalysisPage({ setResults }) {
         <h2>📤 Upload Genome</h2>
         <input 
           type="file" 
-          accept=".fasta,.fa,.fna"
+          accept=".fasta,.fa,.fna,.gz,.bgz"
           onChange={(e) => setFile(e.target.files[0])}
           style={{ 
             display: 'block', 
@@ -234,7 +248,7 @@ function ORFAnalysisPage({ setResults }) {
         <button 
           className="btn btn-primary"
           onClick={handleAnalysis}
-          disabled={!file || loading}
+          disabled={(!file && !location.state?.fileId) || loading}
           style={{ marginTop: '1.5rem', width: '100%', fontSize: '1.1rem' }}
         >
           {loading ? '⏳ Analyzing...' : '🚀 Start VF Analysis'}
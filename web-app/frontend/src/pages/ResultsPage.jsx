@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react'
 import { Bar, Pie } from 'react-chartjs-2'
 import { Chart as ChartJS, ArcElement, Tooltip, Legend, CategoryScale, LinearScale, BarElement, Title } from 'chart.js'
+import axios from 'axios'
 import InfoIcon from '../components/InfoIcon'
 
 ChartJS.register(ArcElement, Tooltip, Legend, CategoryScale, LinearScale, BarElement, Title)
@@ -9,8 +10,43 @@ function ResultsPage({ results }) {
   const [filter, setFilter] = useState('all')
   const [sortBy, setSortBy] = useState('score')
   const [sortOrder, setSortOrder] = useState('desc')
+  const [stats, setStats] = useState(null)
+  const [page, setPage] = useState({ orfs: [], total: 0, next_cursor: null })
+  const [cursors, setCursors] = useState([null])
 
-  if (!results || !results.orfs) {
+  // Pipeline runs are queried page by page; the server sorts and filters
+  const runId = results?.run_id
+  const sortColumns = { score: 'vf_score', ml: 'ml_score', blast: 'blast_score' }
+
+  const fetchPage = (cursor, extra = {}) => axios.get(`/api/pipeline/${runId}/orfs`, {
+    params: {
+      sort: sortColumns[sortBy],
+      order: sortOrder,
+      classification: filter === 'all' ? undefined : filter,
+      limit: 50,
+      cursor: cursor || undefined,
+      ...extra
+    }
+  }).then(response => response.data)
+
+  const loadPage = async (cursorStack) => {
+    setPage(await fetchPage(cursorStack[cursorStack.length - 1]))
+    setCursors(cursorStack)
+  }
+
+  useEffect(() => {
+    if (runId) {
+      axios.get(`/api/pipeline/${runId}/stats`).then(response => setStats(response.data))
+    }
+  }, [runId])
+
+  useEffect(() => {
+    if (runId) {
+      loadPage([null])
+    }
+  }, [runId, filter, sortBy, sortOrder])
+
+  if (!results || (!results.orfs && !runId)) {
     return (
       <div className="card">
         <h1>📊 Results</h1>
@@ -21,8 +57,8 @@ function ResultsPage({ results }) {
     )
   }
 
-  // Filter and sort ORFs
-  let filteredOrfs = results.orfs
+  // Filter and sort ORFs (results held in the browser)
+  let filteredOrfs = results.orfs || []
   if (filter !== 'all') {
     filteredOrfs = filteredOrfs.filter(orf => orf.classification === filter)
   }
@@ -40,12 +76,18 @@ function ResultsPage({ results }) {
   })
 
   // Calculate statistics
+  const countOf = (label) => runId
+    ? (stats?.by_classification[label] || 0)
+    : results.orfs.filter(o => o.classification === label).length
   const classificationCounts = {
-    'High-confidence VF': results.orfs.filter(o => o.classification === 'High-confidence VF').length,
-    'Putative VF': results.orfs.filter(o => o.classification === 'Putative VF').length,
-    'Low-confidence VF': results.orfs.filter(o => o.classification === 'Low-confidence VF').length,
-    'Non-VF': results.orfs.filter(o => o.classification === 'Non-VF').length
+    'High-confidence VF': countOf('High-confidence VF'),
+    'Putative VF': countOf('Putative VF'),
+    'Low-confidence VF': countOf('Low-confidence VF'),
+    'Non-VF': countOf('Non-VF')
   }
+  const totalOrfs = runId ? (stats?.total ?? results.total) : results.orfs.length
+  const shownOrfs = runId ? page.orfs : filteredOrfs.slice(0, 50)
+  const matchingOrfs = runId ? page.total : filteredOrfs.length
 
   // Chart data
   const pieData = {
@@ -74,10 +116,22 @@ function ResultsPage({ results }) {
     return 'badge-non'
   }
 
-  const downloadResults = () => {
+  const downloadResults = async () => {
+    let orfs = results.orfs
+    if (runId) {
+      // Only fetched when asked for, in pipeline order
+      orfs = []
+      let cursor = null
+      do {
+        const data = await fetchPage(cursor, { sort: 'row', order: 'asc', classification: undefined, limit: 1000 })
+        orfs.push(...data.orfs)
+        cursor = data.next_cursor
+      } while (cursor)
+    }
+    
     const csv = [
       ['ORF_ID', 'VF_Score', 'Classification', 'ML_Score', 'BLAST_Score', 'HMM_Score', 'ML_Probability', 'Length'].join(','),
-      ...results.orfs.map(orf => [
+      ...orfs.map(orf => [
         orf.orf_id,
         orf.vf_score,
         orf.classification,
@@ -108,7 +162,7 @@ function ResultsPage({ results }) {
           />
         </h1>
         <p style={{ color: '#718096', marginBottom: '1rem' }}>
-          Virulence factor predictions for {results.orfs.length} ORFs
+          Virulence factor predictions for {totalOrfs} ORFs
         </p>
         
         <button className="btn btn-primary" onClick={downloadResults}>
@@ -248,7 +302,7 @@ function ResultsPage({ results }) {
               </tr>
             </thead>
             <tbody>
-              {filteredOrfs.slice(0, 50).map((orf, idx) => (
+              {shownOrfs.map((orf, idx) => (
                 <tr key={idx}>
                   <td style={{ fontFamily: 'monospace', fontSize: '0.9rem' }}>{orf.orf_id}</td>
                   <td>
@@ -275,11 +329,33 @@ function ResultsPage({ results }) {
           </table>
         </div>
         
-        {filteredOrfs.length > 50 && (
+        {!runId && matchingOrfs > 50 && (
           <p style={{ marginTop: '1rem', color: '#718096', textAlign: 'center' }}>
-            Showing top 50 of {filteredOrfs.length} ORFs
+            Showing top 50 of {matchingOrfs} ORFs
           </p>
         )}
+        
+        {runId && (
+          <div style={{ display: 'flex', justifyContent: 'center', alignItems: 'center', gap: '1rem', marginTop: '1rem' }}>
+            <button
+              className="btn"
+              onClick={() => loadPage(cursors.slice(0, -1))}
+              disabled={cursors.length < 2}
+            >
+              ← Previous
+            </button>
+            <span style={{ color: '#718096' }}>
+              Page {cursors.length} of {Math.max(Math.ceil(matchingOrfs / 50), 1)} ({matchingOrfs} ORFs)
+            </span>
+            <button
+              className="btn"
+              onClick={() => loadPage([...cursors, page.next_cursor])}
+              disabled={!page.next_cursor}
+            >
+              Next →
+            </button>
+          </div>
+        )}
       </div>
 
       {/* Interpretation Guide */}